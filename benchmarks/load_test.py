@@ -0,0 +1,312 @@
+"""
+End-to-end ingestion load test against a running collector.
+
+Drives concurrent Socket.IO `capture_event` clients and/or HTTP
+`POST /collect` clients with synthetic PNG frames, discards a warmup
+period, then reports throughput, ack latency percentiles and an error
+breakdown as JSON:
+
+    uv run python -m benchmarks.load_test --transport both \\
+        --socket-clients 8 --http-clients 4 --frame-size 200000 \\
+        --warmup 5 --duration 30 --output load-test.json
+
+Every frame is unique, so the content-addressed blob store stores each one
+instead of deduplicating. Unlike mock_data.py, no image folder or
+pre-existing game/session rows are needed.
+"""
+
+import argparse
+import json
+import os
+import struct
+import subprocess
+import threading
+import time
+import uuid
+import zlib
+from collections import Counter
+from datetime import datetime, timezone
+
+import requests
+import socketio
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+
+def _png_chunk(kind, data):
+    return (
+        struct.pack(">I", len(data))
+        + kind
+        + data
+        + struct.pack(">I", zlib.crc32(kind + data))
+    )
+
+
+class FrameFactory:
+    """
+    Builds valid PNGs of roughly `size` bytes. The random pixel data is
+    generated once, and each frame only differs in a small tEXt chunk, so
+    making a frame costs little more than a copy.
+    """
+
+    def __init__(self, size):
+        width = max(1, int((max(size, 64) / 3) ** 0.5))
+        height = max(1, size // (width * 3 + 1))
+        scanline = width * 3
+        # Filter byte 0 per scanline, stored uncompressed so the frame size
+        # tracks `size`.
+        raw = b"".join(b"\x00" + os.urandom(scanline) for _ in range(height))
+        self._head = (
+            PNG_SIGNATURE
+            + _png_chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0))
+            + _png_chunk(b"IDAT", zlib.compress(raw, 0))
+        )
+        self._tail = _png_chunk(b"IEND", b"")
+        self.width, self.height = width, height
+
+    def frame(self, tag):
+        return (
+            self._head + _png_chunk(b"tEXt", b"frame\x00" + tag.encode()) + self._tail
+        )
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    rank = max(1, round(pct / 100 * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+class ClientStats:
+    """Samples of one client thread. Only the thread itself writes to it."""
+
+    def __init__(self, transport):
+        self.transport = transport
+        self.latencies = []
+        self.errors = Counter()
+        self.bytes_sent = 0
+
+    def record(self, started, elapsed, error, nbytes, measure_from):
+        # Requests started during warmup are discarded.
+        if started < measure_from:
+            return
+        if error:
+            self.errors[error] += 1
+        else:
+            self.latencies.append(elapsed)
+            self.bytes_sent += nbytes
+
+
+def _capture_fields(game_id, session_id, index, frames):
+    return {
+        "game_id": game_id,
+        "session_id": session_id,
+        "captured_at": datetime.now(timezone.utc).isoformat(),
+        "capture_index": index,
+        "image_width": frames.width,
+        "image_height": frames.height,
+    }
+
+
+def socket_client(url, game_id, session_id, frames, stats, measure_from, deadline):
+    sio = socketio.Client()
+    try:
+        sio.connect(url, transports=["websocket"])
+    except Exception as e:
+        stats.errors[f"connect:{type(e).__name__}"] += 1
+        return
+
+    index = 0
+    try:
+        while time.monotonic() < deadline:
+            image = frames.frame(f"{session_id}:{index}")
+            payload = {
+                **_capture_fields(game_id, session_id, index, frames),
+                "image_data": image,
+            }
+            started = time.monotonic()
+            try:
+                ack = sio.call("capture_event", payload, timeout=30)
+                error = None
+                if not isinstance(ack, dict) or ack.get("status") != "ok":
+                    error = (ack or {}).get("type") or "ack:error"
+            except socketio.exceptions.TimeoutError:
+                error = "timeout"
+            except Exception as e:
+                error = type(e).__name__
+            stats.record(
+                started, time.monotonic() - started, error, len(image), measure_from
+            )
+            index += 1
+    finally:
+        sio.disconnect()
+
+
+def http_client(url, game_id, session_id, frames, stats, measure_from, deadline):
+    index = 0
+    with requests.Session() as session:
+        while time.monotonic() < deadline:
+            image = frames.frame(f"{session_id}:{index}")
+            started = time.monotonic()
+            try:
+                response = session.post(
+                    f"{url}/api/v1/collect",
+                    data=_capture_fields(game_id, session_id, index, frames),
+                    files={"file": (f"frame_{index}.png", image, "image/png")},
+                    timeout=30,
+                )
+                error = None
+                if response.status_code != 200:
+                    try:
+                        error = response.json().get("type")
+                    except ValueError:
+                        error = None
+                    error = error or f"http:{response.status_code}"
+            except requests.Timeout:
+                error = "timeout"
+            except requests.RequestException as e:
+                error = type(e).__name__
+            stats.record(
+                started, time.monotonic() - started, error, len(image), measure_from
+            )
+            index += 1
+
+
+def summarize(client_stats, duration):
+    latencies = sorted(latency for stats in client_stats for latency in stats.latencies)
+    errors = Counter()
+    for stats in client_stats:
+        errors.update(stats.errors)
+    ok = len(latencies)
+    failed = sum(errors.values())
+
+    def ms(value):
+        return round(value * 1000, 3) if value is not None else None
+
+    return {
+        "clients": len(client_stats),
+        "requests": ok + failed,
+        "ok": ok,
+        "failed": failed,
+        "throughput_per_s": round(ok / duration, 2),
+        "mb_per_s": round(
+            sum(stats.bytes_sent for stats in client_stats) / duration / 1e6, 3
+        ),
+        "latency_ms": {
+            "p50": ms(percentile(latencies, 50)),
+            "p95": ms(percentile(latencies, 95)),
+            "p99": ms(percentile(latencies, 99)),
+            "max": ms(latencies[-1] if latencies else None),
+            "mean": ms(sum(latencies) / ok if ok else None),
+        },
+        "errors": dict(errors.most_common()),
+    }
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(args):
+    frames = FrameFactory(args.frame_size)
+    run_id = uuid.uuid4().hex[:8]
+    game_id = f"load-test-{run_id}"
+
+    workers = []
+    if args.transport in ("socket", "both"):
+        workers += [("socket", socket_client)] * args.socket_clients
+    if args.transport in ("http", "both"):
+        workers += [("http", http_client)] * args.http_clients
+    if not workers:
+        raise SystemExit("no clients to run")
+
+    started = time.monotonic()
+    measure_from = started + args.warmup
+    deadline = measure_from + args.duration
+
+    threads, all_stats = [], []
+    for n, (transport, target) in enumerate(workers):
+        stats = ClientStats(transport)
+        all_stats.append(stats)
+        threads.append(
+            threading.Thread(
+                target=target,
+                args=(
+                    args.url,
+                    game_id,
+                    f"{game_id}-{transport}-{n}",
+                    frames,
+                    stats,
+                    measure_from,
+                    deadline,
+                ),
+                daemon=True,
+            )
+        )
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    transports = sorted({stats.transport for stats in all_stats})
+    return {
+        "commit": _git_commit(),
+        "started_at": datetime.now(timezone.utc).isoformat(),
+        "config": {
+            "url": args.url,
+            "transport": args.transport,
+            "socket_clients": args.socket_clients,
+            "http_clients": args.http_clients,
+            "frame_size": len(frames.frame("0")),
+            "warmup_s": args.warmup,
+            "duration_s": args.duration,
+            "game_id": game_id,
+        },
+        "total": summarize(all_stats, args.duration),
+        "transports": {
+            transport: summarize(
+                [stats for stats in all_stats if stats.transport == transport],
+                args.duration,
+            )
+            for transport in transports
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="End-to-end ingestion load test against a running collector."
+    )
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument(
+        "--transport", choices=("socket", "http", "both"), default="socket"
+    )
+    parser.add_argument("--socket-clients", type=int, default=4)
+    parser.add_argument("--http-clients", type=int, default=4)
+    parser.add_argument(
+        "--frame-size", type=int, default=100_000, help="approximate bytes per frame"
+    )
+    parser.add_argument("--warmup", type=float, default=5, help="seconds, discarded")
+    parser.add_argument("--duration", type=float, default=30, help="seconds measured")
+    parser.add_argument("--output", help="also write the JSON report to this file")
+    args = parser.parse_args()
+
+    report = run(args)
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,574 @@
+"""
+In-process micro-benchmarks of per-request CPU overhead.
+
+Every blueprint endpoint and Socket.IO handler runs through the real app
+(src.api, with its metrics hooks and error handlers) against a fake
+connection swapped in through `DatabaseConnection.get_connection`, like the
+tests do. The blob store is kept in memory, the capture writer acks
+immediately, and the lookup cache is off. What is left is framework and
+handler cost, plus the hot helpers (`validate_data`, `_parse_timestamp`,
+JSON decoding, base64 encoding of image rows, image header sniffing) on
+their own. `zlib inflate 1080p` times only the decompression step of
+decoding a 1080p PNG, a floor for what reading dimensions by decoding the
+image would cost:
+
+    uv run python -m benchmarks.micro              # compare with baselines
+    uv run python -m benchmarks.micro --save       # record new baselines
+
+Exits with status 1 if any case is more than --threshold slower than its
+baseline in benchmarks/micro_baselines.json. Baselines are machine
+specific, so record them on the machine that runs the check.
+"""
+
+import argparse
+import base64
+import contextlib
+import io
+import json
+import logging
+import os
+import platform
+import struct
+import sys
+import timeit
+import zlib
+from concurrent.futures import Future
+from dataclasses import astuple, dataclass, fields
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable
+from unittest import mock
+
+from psycopg import pq
+
+from src import repository
+from src.db import DatabaseConnection
+from src.ingestion.writer import StoredCapture
+from src.storage.blob import BlobStore, content_hash
+
+BASELINES_PATH = Path(__file__).with_name("micro_baselines.json")
+
+
+def _png_chunk(chunk_type, data):
+    return (
+        struct.pack(">I", len(data))
+        + chunk_type
+        + data
+        + struct.pack(">I", zlib.crc32(chunk_type + data))
+    )
+
+
+# A 1080p PNG header. Its pixel data is noise, only the header is parsed.
+FRAME = (
+    b"\x89PNG\r\n\x1a\n"
+    + _png_chunk(b"IHDR", struct.pack(">IIBBBBB", 1920, 1080, 8, 2, 0, 0, 0))
+    + _png_chunk(b"IDAT", os.urandom(64 * 1024))
+    + _png_chunk(b"IEND", b"")
+)
+# A camera-style JPEG, with a 16 KB EXIF segment before the frame header.
+JPEG_FRAME = (
+    b"\xff\xd8\xff\xe0\x00\x10JFIF\x00\x01\x01\x00\x00\x01\x00\x01\x00\x00"
+    + b"\xff\xe1"
+    + struct.pack(">H", 16 * 1024 + 2)
+    + os.urandom(16 * 1024)
+    + b"\xff\xc0"
+    + struct.pack(">HBHHB", 17, 8, 1080, 1920, 3)
+    + bytes(9)
+    + b"\xff\xda"
+    + os.urandom(64 * 1024)
+)
+# Raw 1080p RGB scanlines of a flat-ish game frame, deflated like PNG IDAT.
+PIXELS_1080P = zlib.compress(
+    b"".join(b"\0" + bytes([row % 251, 40, 80]) * 1920 for row in range(1080))
+)
+CAPTURED_AT = "2026-03-02T10:30:00Z"
+CAPTURE_FIELDS = {
+    "game_id": "g1",
+    "session_id": "s1",
+    "run_id": "r1",
+    "captured_at": CAPTURED_AT,
+    "capture_index": 7,
+    "mouse_x": 10,
+    "mouse_y": 20,
+    "image_width": 1920,
+    "image_height": 1080,
+}
+COLLECTION_ROWS = 10
+
+
+class _FakeResult:
+    """Just enough of a PGresult for psycopg's row factories."""
+
+    status = pq.ExecStatus.TUPLES_OK
+
+    def __init__(self, names):
+        self.nfields = len(names)
+        self._names = [name.encode() for name in names]
+
+    def fname(self, index):
+        return self._names[index]
+
+
+class _FakeCursor:
+    def __init__(self, conn, name=None, row_factory=None):
+        self._conn = conn
+        self._name = name
+        self._row_factory = row_factory
+        self._rows = []
+        self.pgresult = None
+        self._encoding = "utf-8"
+        self.itersize = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def execute(self, query, params=None, prepare=None):
+        # Named cursors of statements without canned rows are /collect/stream.
+        key = query if query in self._conn.results or not self._name else "stream"
+        names, rows = self._conn.results.get(key, (["id"], [(1,)]))
+        self.pgresult = _FakeResult(names)
+        make_row = self._row_factory(self) if self._row_factory else tuple
+        self._rows = [make_row(row) for row in rows]
+        return self
+
+    def fetchone(self):
+        return self._rows[0] if self._rows else None
+
+    def fetchall(self):
+        return list(self._rows)
+
+    def __iter__(self):
+        return iter(self.fetchall())
+
+
+class _FakeConnection:
+    """Returns canned rows per SQL statement. Unknown statements return id 1."""
+
+    def __init__(self, results):
+        self.results = results
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def cursor(self, name=None, row_factory=None, **kwargs):
+        return _FakeCursor(self, name, row_factory)
+
+    def commit(self):
+        pass
+
+
+def _result(*rows):
+    names = [field.name for field in fields(rows[0])]
+    return names, [astuple(row) for row in rows]
+
+
+class _MemoryBlobStore(BlobStore):
+    def __init__(self):
+        self.blobs = {}
+
+    def put(self, data):
+        key = content_hash(data)
+        self.blobs.setdefault(key, data)
+        return key
+
+    def put_as(self, key, data):
+        self.blobs[key] = data
+
+    def open(self, key):
+        return io.BytesIO(self.blobs[key])
+
+    def exists(self, key):
+        return key in self.blobs
+
+    def iter_keys(self, written_before):
+        return iter(())
+
+    def delete(self, key, written_before):
+        return False
+
+
+class _ImmediateWriter:
+    """Acks every row at once, the batching delay is not CPU time."""
+
+    def submit(self, row):
+        future = Future()
+        future.set_result(StoredCapture(row[0], False, row[3], 0, ()))
+        return future
+
+    def submit_many(self, rows):
+        return [self.submit(row) for row in rows]
+
+
+def _fake_results(frame_ref):
+    collection = [
+        repository.RawCapture(
+            datetime(2026, 3, 2, 10, 30, i), "g1", "r1", FRAME, None, 1080, 1920
+        )
+        for i in range(COLLECTION_ROWS)
+    ]
+    stream_names = [
+        "capture_id",
+        "captured_at",
+        "capture_index",
+        "game_id",
+        "run_id",
+        "screenshot_ref",
+        "image_height",
+        "image_width",
+    ]
+    stream_rows = [
+        (f"c{i}", datetime(2026, 3, 2, 10, 30, i), i, "g1", "r1", frame_ref, 1080, 1920)
+        for i in range(COLLECTION_ROWS)
+    ]
+    return {
+        repository.SELECT_GAME: _result(
+            repository.Game(1, 1, "bench", "1.0", datetime(2026, 3, 2))
+        ),
+        repository.SELECT_RUN: _result(repository.Run(1, 1, 12.5)),
+        repository.SELECT_CHOICES: _result(
+            *(repository.Choice(i, 1, ["a", "b", "c"], "a") for i in range(5))
+        ),
+        repository.SELECT_USER: _result(repository.User(1, "bench")),
+        repository.SELECT_RAW_COLLECTION: _result(*collection),
+        repository.SELECT_ARCHIVE_SEGMENTS: (["segment_id"], []),
+        repository.SELECT_CAPTURE_IMAGE: _result(
+            repository.CaptureImage(frame_ref, frame_ref, None, None)
+        ),
+        "stream": (stream_names, stream_rows),
+    }
+
+
+@dataclass(frozen=True)
+class Case:
+    name: str
+    run: Callable[[], Any]
+    # Checked once before timing, so a broken case fails loudly instead of
+    # benchmarking an error path.
+    check: Callable[[Any], bool] = lambda result: True
+
+
+def _status(expected):
+    return lambda response: response.status_code == expected
+
+
+def _ack_ok(ack):
+    return isinstance(ack, dict) and ack.get("status") == "ok"
+
+
+@contextlib.contextmanager
+def benchmark_cases():
+    """Patches the app's I/O and yields the list of cases."""
+    with contextlib.ExitStack() as stack:
+        # src.api refuses to start without a connection string.
+        if not os.environ.get("PGSQL_CONN"):
+            stack.enter_context(
+                mock.patch.dict(os.environ, {"PGSQL_CONN": "postgresql://benchmark"})
+            )
+        stack.enter_context(mock.patch.object(DatabaseConnection, "initialize"))
+        # Importing src.api builds the production app.
+        from src import cache
+        from src.api import app
+        from src.ingestion import collector, image
+        from src.socketio_ext import socketio
+        from src.util import sniff_image, validate_data
+
+        blobs = _MemoryBlobStore()
+        frame_ref = blobs.put(FRAME)
+        conn = _FakeConnection(_fake_results(frame_ref))
+
+        stack.enter_context(
+            mock.patch.object(
+                DatabaseConnection, "get_connection", classmethod(lambda cls: conn)
+            )
+        )
+        stack.enter_context(mock.patch.object(collector, "blob_store", blobs))
+        stack.enter_context(mock.patch.object(image, "blob_store", blobs))
+        stack.enter_context(
+            mock.patch.object(collector, "capture_writer", _ImmediateWriter())
+        )
+        stack.enter_context(mock.patch.object(cache, "lookup_cache", cache.NullCache()))
+
+        # Socket.IO logs every event. Keep that cost, but not the terminal.
+        devnull = stack.enter_context(open(os.devnull, "w"))
+        for logger in (socketio.server.logger, socketio.server.eio.logger):
+            for handler in logger.handlers:
+                if isinstance(handler, logging.StreamHandler):
+                    stack.enter_context(mock.patch.object(handler, "stream", devnull))
+
+        http = app.test_client()
+        sio = socketio.test_client(app, flask_test_client=http)
+        stack.callback(sio.disconnect)
+
+        capture = {**CAPTURE_FIELDS, "image_data": FRAME}
+        batch = {"captures": [dict(capture, capture_index=i) for i in range(16)]}
+        capture_json = json.dumps(CAPTURE_FIELDS)
+        api = "/api/v1"
+
+        def post_capture():
+            return http.post(
+                f"{api}/collect",
+                data={**CAPTURE_FIELDS, "file": (io.BytesIO(FRAME), "frame.png")},
+                content_type="multipart/form-data",
+            )
+
+        def stream():
+            response = http.get(
+                f"{api}/collect/stream?game_id=g1&session_id=s1&include_images=false"
+            )
+            response.get_data()
+            return response
+
+        def image_get():
+            response = http.get(f"{api}/collect/c1/image")
+            response.get_data()
+            return response
+
+        def collect_as(mimetype):
+            def run():
+                response = http.get(
+                    f"{api}/collect?game_id=g1&session_id=s1",
+                    headers={"Accept": mimetype},
+                )
+                response.get_data()
+                return response
+
+            return run
+
+        def encode_rows():
+            return [
+                base64.b64encode(row.image_data).decode("utf-8")
+                for row in repository.get_raw_collection("g1", "s1")
+            ]
+
+        yield [
+            Case(
+                "validate_data",
+                lambda: validate_data(
+                    ["session_id", "game_id", "captured_at", "capture_index"],
+                    CAPTURE_FIELDS,
+                ),
+            ),
+            Case(
+                "_parse_timestamp",
+                lambda: collector._parse_timestamp(CAPTURED_AT, "captured_at"),
+                lambda value: isinstance(value, datetime),
+            ),
+            Case("json_decode capture", lambda: json.loads(capture_json)),
+            Case(
+                "sniff_image png",
+                lambda: sniff_image(FRAME),
+                lambda info: info.width == 1920,
+            ),
+            Case(
+                "sniff_image jpeg",
+                lambda: sniff_image(JPEG_FRAME),
+                lambda info: info.height == 1080,
+            ),
+            Case(
+                "zlib inflate 1080p",
+                lambda: zlib.decompress(PIXELS_1080P),
+                lambda pixels: len(pixels) == 1080 * (1 + 1920 * 3),
+            ),
+            Case(
+                "base64 image rows",
+                encode_rows,
+                lambda rows: len(rows) == COLLECTION_ROWS,
+            ),
+            Case(
+                "build_capture_row",
+                lambda: collector.build_capture_row(CAPTURE_FIELDS, FRAME),
+            ),
+            Case(
+                "POST /collect/game",
+                lambda: http.post(
+                    f"{api}/collect/game",
+                    json={"game_name": "bench", "user_id": 1, "game_version": "1.0"},
+                ),
+                _status(200),
+            ),
+            Case(
+                "GET /collect/game",
+                lambda: http.get(f"{api}/collect/game?game_id=1"),
+                _status(200),
+            ),
+            Case(
+                "POST /collect/run",
+                lambda: http.post(
+                    f"{api}/collect/run", json={"game_id": 1, "duration": 12.5}
+                ),
+                _status(200),
+            ),
+            Case(
+                "GET /collect/run",
+                lambda: http.get(f"{api}/collect/run?run_id=1"),
+                _status(200),
+            ),
+            Case(
+                "POST /collect/choice",
+                lambda: http.post(
+                    f"{api}/collect/choice",
+                    json={"run_id": 1, "choice_options": ["a", "b"], "selected": "a"},
+                ),
+                _status(200),
+            ),
+            Case(
+                "GET /collect/choice",
+                lambda: http.get(f"{api}/collect/choice?run_id=1"),
+                _status(200),
+            ),
+            Case(
+                "POST /user/insert",
+                lambda: http.post(
+                    f"{api}/user/insert", json={"username": "bench", "password": "pw"}
+                ),
+                _status(200),
+            ),
+            Case(
+                "GET /user",
+                lambda: http.get(f"{api}/user?username=bench"),
+                _status(200),
+            ),
+            Case("POST /collect", post_capture, _status(200)),
+            Case(
+                "GET /collect",
+                lambda: http.get(f"{api}/collect?game_id=g1&session_id=s1"),
+                _status(200),
+            ),
+            Case(
+                "GET /collect (msgpack)",
+                collect_as("application/msgpack"),
+                _status(200),
+            ),
+            Case(
+                "GET /collect (arrow)",
+                collect_as("application/vnd.apache.arrow.stream"),
+                _status(200),
+            ),
+            Case("GET /collect/stream", stream, _status(200)),
+            Case("GET /collect/<id>/image", image_get, _status(200)),
+            Case(
+                "socket capture_event",
+                lambda: sio.emit("capture_event", capture, callback=True),
+                _ack_ok,
+            ),
+            Case(
+                "socket capture_batch x16",
+                lambda: sio.emit("capture_batch", batch, callback=True),
+                _ack_ok,
+            ),
+            Case(
+                "socket hello_world",
+                lambda: sio.emit("hello_world", {"msg": "ping"}),
+            ),
+            Case(
+                "socket join_session",
+                lambda: sio.emit("join_session", {"session_id": "s1"}, callback=True),
+                _ack_ok,
+            ),
+            Case(
+                "socket leave_session",
+                lambda: sio.emit("leave_session", {"session_id": "s1"}, callback=True),
+                _ack_ok,
+            ),
+        ]
+
+
+def measure(case, rounds):
+    """Returns the best per-call time of `case` in microseconds."""
+    timer = timeit.Timer(case.run)
+    number, _ = timer.autorange()
+    return min(timer.repeat(repeat=rounds, number=number)) / number * 1e6
+
+
+def load_baselines(path=BASELINES_PATH):
+    if not path.exists():
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_baselines(results, path=BASELINES_PATH):
+    with open(path, "w") as f:
+        json.dump(
+            {
+                "python": platform.python_version(),
+                "machine": platform.machine(),
+                "cases": {name: round(us, 3) for name, us in results.items()},
+            },
+            f,
+            indent=2,
+        )
+        f.write("\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="In-process micro-benchmarks of per-request overhead."
+    )
+    parser.add_argument("--rounds", type=int, default=10)
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.5,
+        help="allowed slowdown over the baseline (0.5 = 50%%). Lower it on a "
+        "quiet machine, shared hosts easily vary by 20%% between runs",
+    )
+    parser.add_argument("--filter", help="only run cases containing this text")
+    parser.add_argument("--save", action="store_true", help="record new baselines")
+    args = parser.parse_args()
+
+    baselines = load_baselines()
+    if baselines and baselines.get("python") != platform.python_version():
+        print(
+            f"warning: baselines were recorded on Python {baselines.get('python')}",
+            file=sys.stderr,
+        )
+    baseline_cases = baselines.get("cases", {})
+
+    results = {}
+    regressions = []
+    with benchmark_cases() as cases, open(os.devnull, "w") as devnull:
+        print(f"{'case':<28}{'us/call':>12}{'baseline':>12}{'change':>10}")
+        for case in cases:
+            if args.filter and args.filter not in case.name:
+                continue
+            # Handlers that print (hello_world) would time the terminal.
+            with contextlib.redirect_stdout(devnull):
+                if not case.check(case.run()):
+                    raise RuntimeError(f"{case.name} did not succeed")
+                us = measure(case, args.rounds)
+            baseline = baseline_cases.get(case.name)
+            if baseline is None:
+                results[case.name] = us
+                print(f"{case.name:<28}{us:>12.1f}{'-':>12}{'new':>10}")
+                continue
+
+            if us / baseline - 1 > args.threshold:
+                # Measure a suspected regression again before trusting it, a
+                # single noisy run should not fail the check.
+                with contextlib.redirect_stdout(devnull):
+                    us = min(us, measure(case, args.rounds))
+            results[case.name] = us
+            change = us / baseline - 1
+            flag = ""
+            if change > args.threshold:
+                regressions.append(case.name)
+                flag = "  REGRESSION"
+            print(f"{case.name:<28}{us:>12.1f}{baseline:>12.1f}{change:>+9.1%}{flag}")
+
+    if args.save:
+        save_baselines({**baseline_cases, **results})
+        print(f"saved baselines to {BASELINES_PATH}")
+    elif regressions:
+        print(f"{len(regressions)} case(s) regressed: {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
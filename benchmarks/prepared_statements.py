@@ -0,0 +1,121 @@
+"""
+Per-call cost of the repository statements with and without server-side
+prepared statements.
+
+Runs against PGSQL_CONN inside a single transaction that is rolled back at
+the end, so it leaves no data behind:
+
+    uv run python -m benchmarks.prepared_statements --iterations 2000
+"""
+
+import argparse
+import os
+import statistics
+import uuid
+from datetime import datetime, timezone
+from time import perf_counter
+
+import psycopg
+from dotenv import load_dotenv
+from psycopg.types.json import Json
+
+from src import repository
+
+
+def _capture_row(game_id, session_id, index):
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    ref = uuid.uuid4().hex
+    return (
+        str(uuid.uuid4()),
+        ref,
+        game_id,
+        session_id,
+        now,
+        now,
+        None,
+        10,
+        20,
+        ref,
+        1080,
+        1920,
+        index,
+    )
+
+
+def _time_calls(cur, query, params_for, iterations, prepare):
+    # Warm up outside the measurement, this also prepares the statement.
+    cur.execute(query, params_for(-1), prepare=prepare)
+    samples = []
+    for i in range(iterations):
+        params = params_for(i)
+        started = perf_counter()
+        cur.execute(query, params, prepare=prepare)
+        if cur.description:
+            cur.fetchall()
+        samples.append(perf_counter() - started)
+    return samples
+
+
+def _seed(cur):
+    user_id = cur.execute(
+        repository.INSERT_USER, ("bench-user", "bench-password")
+    ).fetchone()[0]
+    game_id = cur.execute(repository.INSERT_GAME, (user_id, "bench", "1")).fetchone()[0]
+    run_id = cur.execute(repository.INSERT_RUN, (game_id, 1.0)).fetchone()[0]
+    cur.execute(repository.INSERT_CHOICE, (run_id, Json(["a", "b"]), "a"))
+    return user_id, game_id, run_id
+
+
+def main():
+    load_dotenv()
+
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=2000)
+    args = parser.parse_args()
+
+    conn_str = os.environ.get("PGSQL_CONN")
+    if not conn_str:
+        raise ValueError("PGSQL_CONN environment variable is not set")
+
+    # prepare=False keeps psycopg from preparing the baseline statements after
+    # its default 5 executions, so they are parsed and planned on every call.
+    with psycopg.connect(conn_str) as conn:
+        with conn.cursor() as cur:
+            _, game_id, run_id = _seed(cur)
+            capture_game = f"bench-{uuid.uuid4().hex[:8]}"
+            collect_game = f"bench-{uuid.uuid4().hex[:8]}"
+            cur.executemany(
+                repository.INSERT_RAW_CAPTURE,
+                [_capture_row(collect_game, "bench", i) for i in range(50)],
+            )
+
+            cases = [
+                ("GET game", repository.SELECT_GAME, lambda i: (game_id,)),
+                ("GET run", repository.SELECT_RUN, lambda i: (run_id,)),
+                ("GET choice", repository.SELECT_CHOICES, lambda i: (run_id,)),
+                (
+                    "GET collect",
+                    repository.SELECT_RAW_COLLECTION,
+                    lambda i: (collect_game, "bench"),
+                ),
+                (
+                    "capture insert",
+                    repository.INSERT_RAW_CAPTURE,
+                    lambda i: _capture_row(capture_game, "bench", i),
+                ),
+            ]
+
+            print(f"{'statement':<16}{'plain us':>12}{'prepared us':>14}{'saved':>10}")
+            for name, query, params_for in cases:
+                plain = _time_calls(cur, query, params_for, args.iterations, False)
+                prepared = _time_calls(cur, query, params_for, args.iterations, True)
+                plain_us = statistics.median(plain) * 1e6
+                prepared_us = statistics.median(prepared) * 1e6
+                saved = (plain_us - prepared_us) / plain_us * 100
+                print(f"{name:<16}{plain_us:>12.1f}{prepared_us:>14.1f}{saved:>9.1f}%")
+
+        conn.rollback()
+
+
+if __name__ == "__main__":
+    main()
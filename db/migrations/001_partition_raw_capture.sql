@@ -0,0 +1,99 @@
+-- Range-partitions raw_capture by captured_at.
+--
+-- The existing table is not copied. It is renamed to raw_capture_legacy
+-- and attached as the partition for everything before the start of next
+-- month. New months get their own partitions from
+-- `python -m src.maintenance.partitions`. Rows that fit no partition land
+-- in raw_capture_default.
+--
+-- A partitioned table's unique keys must include the partition key, so the
+-- primary key becomes (capture_id, captured_at). Foreign keys to
+-- raw_capture(capture_id) are dropped, since a unique capture_id can no
+-- longer be enforced on its own. capture_ids are server-generated UUIDs.
+--
+-- On a large table, first build the new secondary indexes on raw_capture
+-- with CREATE INDEX CONCURRENTLY, using the same definitions as below. ATTACH
+-- then adopts them instead of building them while holding its lock. The
+-- primary key is still rebuilt inside the migration.
+--
+-- Run with: psql -v ON_ERROR_STOP=1 -f db/migrations/001_partition_raw_capture.sql
+
+BEGIN;
+
+ALTER TABLE raw_capture ADD COLUMN IF NOT EXISTS capture_index integer;
+
+ALTER TABLE IF EXISTS pipeline_job DROP CONSTRAINT IF EXISTS pipeline_job_capture_id_fkey;
+ALTER TABLE IF EXISTS event DROP CONSTRAINT IF EXISTS event_source_capture_id_fkey;
+
+DO $$
+DECLARE
+    cutoff timestamp := date_trunc('month', now() AT TIME ZONE 'UTC') + interval '1 month';
+    idx record;
+    pkey name;
+BEGIN
+    IF (SELECT relkind FROM pg_class WHERE oid = 'raw_capture'::regclass) = 'p' THEN
+        RAISE NOTICE 'raw_capture is already partitioned';
+        RETURN;
+    END IF;
+
+    ALTER TABLE raw_capture RENAME TO raw_capture_legacy;
+
+    -- Free the raw_capture_* names for the partitioned table's indexes.
+    FOR idx IN
+        SELECT indexrelid::regclass::text AS name
+        FROM pg_index
+        WHERE indrelid = 'raw_capture_legacy'::regclass
+    LOOP
+        IF idx.name LIKE 'raw_capture\_%' THEN
+            EXECUTE format(
+                'ALTER INDEX %I RENAME TO %I',
+                idx.name,
+                'raw_capture_legacy_' || substr(idx.name, length('raw_capture_') + 1)
+            );
+        END IF;
+    END LOOP;
+
+    -- The partition's primary key has to match the parent's.
+    SELECT conname INTO pkey
+    FROM pg_constraint
+    WHERE conrelid = 'raw_capture_legacy'::regclass AND contype = 'p';
+    IF pkey IS NOT NULL THEN
+        EXECUTE format('ALTER TABLE raw_capture_legacy DROP CONSTRAINT %I', pkey);
+    END IF;
+    ALTER TABLE raw_capture_legacy
+        ADD CONSTRAINT raw_capture_legacy_pkey PRIMARY KEY (capture_id, captured_at);
+
+    CREATE TABLE raw_capture (LIKE raw_capture_legacy INCLUDING DEFAULTS)
+        PARTITION BY RANGE (captured_at);
+
+    ALTER TABLE raw_capture
+        ADD CONSTRAINT raw_capture_pkey PRIMARY KEY (capture_id, captured_at);
+
+    -- GET /collect and /collect/stream: one session in (captured_at,
+    -- capture_id) order. INCLUDE lets the stream skip the heap when images
+    -- are not requested.
+    CREATE INDEX raw_capture_game_id_session_id_captured_at_idx
+        ON raw_capture (game_id, session_id, captured_at, capture_id)
+        INCLUDE (capture_index, run_id, screenshot_ref, image_height, image_width);
+
+    CREATE INDEX raw_capture_run_id_captured_at_idx
+        ON raw_capture (run_id, captured_at);
+
+    CREATE TABLE raw_capture_default PARTITION OF raw_capture DEFAULT;
+
+    -- Rows captured after the cutoff, e.g. from skewed client clocks, would
+    -- fail the ATTACH check.
+    WITH moved AS (
+        DELETE FROM raw_capture_legacy WHERE captured_at >= cutoff RETURNING *
+    )
+    INSERT INTO raw_capture_default SELECT * FROM moved;
+
+    EXECUTE format(
+        'ALTER TABLE raw_capture ATTACH PARTITION raw_capture_legacy '
+        'FOR VALUES FROM (MINVALUE) TO (%L)',
+        cutoff
+    );
+END
+$$;
+
+COMMIT;
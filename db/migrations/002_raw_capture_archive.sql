@@ -0,0 +1,32 @@
+-- Catalog of captures moved from raw_capture to the cold tier by
+-- `python -m src.maintenance.archive`.
+--
+-- The captures themselves live in segment files in the archive store. Each
+-- segment holds captures of one (game_id, session_id). Postgres keeps one
+-- row per segment, and a capture_id -> segment_id row for each capture so
+-- GET /collect/<capture_id>/image can find an archived frame.
+--
+-- Run with: psql -v ON_ERROR_STOP=1 -f db/migrations/002_raw_capture_archive.sql
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS raw_capture_segment (
+    segment_id varchar PRIMARY KEY,
+    game_id varchar NOT NULL,
+    session_id varchar NOT NULL,
+    first_captured_at timestamp NOT NULL,
+    last_captured_at timestamp NOT NULL,
+    capture_count integer NOT NULL,
+    byte_size bigint NOT NULL,
+    archived_at timestamp NOT NULL DEFAULT (now() AT TIME ZONE 'UTC')
+);
+
+CREATE INDEX IF NOT EXISTS raw_capture_segment_game_id_session_id_idx
+    ON raw_capture_segment (game_id, session_id, first_captured_at);
+
+CREATE TABLE IF NOT EXISTS raw_capture_archive (
+    capture_id varchar PRIMARY KEY,
+    segment_id varchar NOT NULL REFERENCES raw_capture_segment (segment_id)
+);
+
+COMMIT;
@@ -0,0 +1,18 @@
+-- Indexes for GET /export/session/<session_id>, which looks sessions up
+-- without a game_id. The existing (game_id, session_id, ...) indexes cannot
+-- serve those lookups.
+--
+-- On the partitioned raw_capture the index is created on every partition,
+-- and partitions created later get it too.
+--
+-- Run with: psql -v ON_ERROR_STOP=1 -f db/migrations/003_session_export_indexes.sql
+
+BEGIN;
+
+CREATE INDEX IF NOT EXISTS raw_capture_session_id_captured_at_idx
+    ON raw_capture (session_id, captured_at, capture_id);
+
+CREATE INDEX IF NOT EXISTS raw_capture_segment_session_id_idx
+    ON raw_capture_segment (session_id, first_captured_at);
+
+COMMIT;
@@ -0,0 +1,53 @@
+-- Idempotent ingest: one capture per (session_id, capture_index).
+--
+-- raw_capture is partitioned by captured_at, so it cannot have a unique
+-- index without captured_at in it, and retries may carry another
+-- captured_at. capture_key is the unpartitioned ledger of stored keys. The
+-- capture writer claims keys here with ON CONFLICT DO NOTHING in the same
+-- transaction as the raw_capture COPY, and acks duplicates with the
+-- original capture_id.
+--
+-- capture_session tracks, per session, how many distinct indices arrived
+-- and their range, so an ack can report how many are missing without
+-- scanning the ledger.
+--
+-- Existing captures are backfilled from raw_capture. Archived captures are
+-- not: their capture_index lives in the segment files.
+--
+-- Run with: psql -v ON_ERROR_STOP=1 -f db/migrations/004_capture_key.sql
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS capture_key (
+    session_id varchar NOT NULL,
+    capture_index integer NOT NULL,
+    capture_id varchar NOT NULL,
+    created_at timestamp NOT NULL DEFAULT (now() AT TIME ZONE 'UTC'),
+    PRIMARY KEY (session_id, capture_index)
+);
+
+CREATE TABLE IF NOT EXISTS capture_session (
+    session_id varchar PRIMARY KEY,
+    received bigint NOT NULL,
+    first_index integer NOT NULL,
+    last_index integer NOT NULL
+);
+
+-- The earliest received row of a key is the one retries are acked with.
+INSERT INTO capture_key (session_id, capture_index, capture_id)
+SELECT DISTINCT ON (session_id, capture_index) session_id, capture_index, capture_id
+FROM raw_capture
+WHERE capture_index IS NOT NULL
+ORDER BY session_id, capture_index, received_at, capture_id
+ON CONFLICT DO NOTHING;
+
+INSERT INTO capture_session (session_id, received, first_index, last_index)
+SELECT session_id, count(*), min(capture_index), max(capture_index)
+FROM capture_key
+GROUP BY session_id
+ON CONFLICT (session_id) DO UPDATE SET
+    received = EXCLUDED.received,
+    first_index = EXCLUDED.first_index,
+    last_index = EXCLUDED.last_index;
+
+COMMIT;
@@ -0,0 +1,35 @@
+-- Preview rendering queue.
+--
+-- The capture writer queues one job per new screenshot_ref, in the same
+-- transaction as the capture. Jobs are keyed by image, so a frame shared by
+-- many captures is rendered once. `python -m src.pipeline.previews` claims
+-- them with FOR UPDATE SKIP LOCKED, like pipeline_job.
+--
+-- Images already in the blob store are queued too, so they get previews once
+-- a preview worker runs.
+--
+-- Run with: psql -v ON_ERROR_STOP=1 -f db/migrations/005_preview_job.sql
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS preview_job (
+    screenshot_ref varchar PRIMARY KEY,
+    status varchar NOT NULL,
+    attempts integer NOT NULL DEFAULT 0,
+    locked_by varchar,
+    locked_at timestamp,
+    created_at timestamp NOT NULL DEFAULT (now() AT TIME ZONE 'UTC')
+);
+
+-- Claims only look at jobs still waiting, keep that scan small.
+CREATE INDEX IF NOT EXISTS preview_job_waiting_idx
+    ON preview_job (status)
+    WHERE status IN ('pending', 'retry');
+
+INSERT INTO preview_job (screenshot_ref, status, attempts)
+SELECT DISTINCT screenshot_ref, 'pending', 0
+FROM raw_capture
+WHERE screenshot_ref IS NOT NULL
+ON CONFLICT DO NOTHING;
+
+COMMIT;
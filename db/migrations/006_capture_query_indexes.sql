@@ -0,0 +1,26 @@
+-- Covering indexes for the /query endpoints, so their filters and aggregates
+-- run as index-only scans and never read the heap.
+--
+-- The session index replaces the one from 003: same keys, so it still serves
+-- GET /export/session/<session_id>, plus the columns the per-minute, ingest
+-- lag and per-run aggregates read. The game index serves game-wide time
+-- ranges, which the (game_id, session_id, ...) index can only filter through.
+--
+-- On the partitioned raw_capture the indexes are created on every partition,
+-- and partitions created later get them too.
+--
+-- Run with: psql -v ON_ERROR_STOP=1 -f db/migrations/006_capture_query_indexes.sql
+
+BEGIN;
+
+CREATE INDEX IF NOT EXISTS raw_capture_session_id_captured_at_covering_idx
+    ON raw_capture (session_id, captured_at, capture_id)
+    INCLUDE (capture_index, run_id, received_at);
+
+DROP INDEX IF EXISTS raw_capture_session_id_captured_at_idx;
+
+CREATE INDEX IF NOT EXISTS raw_capture_game_id_captured_at_idx
+    ON raw_capture (game_id, captured_at)
+    INCLUDE (session_id, capture_index, run_id, received_at);
+
+COMMIT;
@@ -0,0 +1,51 @@
+-- Per-run summaries, kept up to date as runs, choices and captures arrive.
+--
+-- POST /collect/run and POST /collect/choice upsert a run's row in the same
+-- statement that inserts the run or choice. The capture writer adds each
+-- batch's new captures, one upsert per run, in the batch's transaction.
+-- Counts never go down: archiving captures leaves capture_count as is.
+--
+-- db/GameLens-Schema.sql defines a run_summary for its own run table, which
+-- nothing fills. If that table is present it is kept as run_summary_legacy.
+--
+-- Existing runs are not backfilled here. Run
+-- `python -m src.maintenance.run_summary` once this is applied.
+--
+-- Run with: psql -v ON_ERROR_STOP=1 -f db/migrations/007_run_summary.sql
+
+BEGIN;
+
+DO $$
+BEGIN
+    IF to_regclass('run_summary') IS NOT NULL AND NOT EXISTS (
+        SELECT 1
+        FROM information_schema.columns
+        WHERE table_schema = current_schema()
+            AND table_name = 'run_summary'
+            AND column_name = 'capture_count'
+    ) THEN
+        ALTER TABLE run_summary RENAME TO run_summary_legacy;
+        ALTER INDEX IF EXISTS run_summary_game_id_started_at_idx
+            RENAME TO run_summary_legacy_game_id_started_at_idx;
+    END IF;
+END $$;
+
+-- run_id is raw_capture's varchar run_id, the text form of run.id.
+CREATE TABLE IF NOT EXISTS run_summary (
+    run_id varchar PRIMARY KEY,
+    game_id integer,
+    duration double precision,
+    choice_count integer NOT NULL DEFAULT 0,
+    capture_count bigint NOT NULL DEFAULT 0,
+    first_captured_at timestamp,
+    last_captured_at timestamp,
+    updated_at timestamp NOT NULL DEFAULT (now() AT TIME ZONE 'UTC')
+);
+
+CREATE INDEX IF NOT EXISTS run_summary_game_id_run_id_idx
+    ON run_summary (game_id, run_id);
+
+-- For GET /collect/choice and the rebuild, which look choices up by run.
+CREATE INDEX IF NOT EXISTS choice_run_id_idx ON choice (run_id);
+
+COMMIT;
@@ -0,0 +1,23 @@
+-- Records when a pipeline or preview job last failed.
+--
+-- Retries back off from failed_at. They used to back off from locked_at,
+-- the time the job was claimed, so an attempt that ran longer than its
+-- backoff was retried as soon as it failed.
+--
+-- Jobs already waiting to be retried back off from their last claim, as
+-- before.
+--
+-- Run with: psql -v ON_ERROR_STOP=1 -f db/migrations/008_job_failed_at.sql
+
+BEGIN;
+
+ALTER TABLE pipeline_job ADD COLUMN IF NOT EXISTS failed_at timestamp;
+ALTER TABLE preview_job ADD COLUMN IF NOT EXISTS failed_at timestamp;
+
+UPDATE pipeline_job SET failed_at = locked_at
+WHERE status = 'retry' AND failed_at IS NULL;
+
+UPDATE preview_job SET failed_at = locked_at
+WHERE status = 'retry' AND failed_at IS NULL;
+
+COMMIT;
@@ -0,0 +1,15 @@
+-- Index for GET /export/session/<session_id>, which streams a session in
+-- (capture_index, capture_id) order, the order `from_index` resumes in.
+-- Without it every export sorts the whole session before the first byte.
+--
+-- On the partitioned raw_capture the index is created on every partition,
+-- and partitions created later get it too.
+--
+-- Run with: psql -v ON_ERROR_STOP=1 -f db/migrations/009_session_export_order.sql
+
+BEGIN;
+
+CREATE INDEX IF NOT EXISTS raw_capture_session_id_capture_index_idx
+    ON raw_capture (session_id, capture_index, capture_id);
+
+COMMIT;
@@ -0,0 +1,34 @@
+import multiprocessing
+import os
+import shutil
+
+# Workers write their metric samples here so /metrics can aggregate all of
+# them. prometheus_client reads it on import, so it is set before anything
+# imports it.
+os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", "/tmp/gamelens-metrics")
+
+# eventlet workers are single-threaded, so one per core uses the machine.
+# Without a Socket.IO message queue an emit only reaches the clients of the
+# worker that sent it, so more than one worker needs SOCKETIO_MESSAGE_QUEUE.
+workers = int(
+    os.environ.get(
+        "GUNICORN_WORKERS",
+        multiprocessing.cpu_count() if os.environ.get("SOCKETIO_MESSAGE_QUEUE") else 1,
+    )
+)
+
+
+def on_starting(server):
+    # Samples from a previous run would otherwise be summed into the new one.
+    path = os.environ["PROMETHEUS_MULTIPROC_DIR"]
+    shutil.rmtree(path, ignore_errors=True)
+    os.makedirs(path, exist_ok=True)
+    # The final count, after any --workers flag. Workers read it to pick their
+    # Socket.IO transports, see src/socketio_ext.py.
+    os.environ["GUNICORN_WORKERS"] = str(server.cfg.workers)
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+
+    multiprocess.mark_process_dead(worker.pid)
@@ -12,7 +12,10 @@ SIO_URL = "http://localhost:8000"
 FOLDER_PATH = "test_images/"
 EXTENSIONS = {".png", ".jpg", ".jpeg"}
 
-# Limit concurrent uploads to prevent socket buffer overflow
+# Number of captures sent per capture_batch emit
+BATCH_SIZE = 16
+
+# Limit concurrent batches to prevent socket buffer overflow
 MAX_CONCURRENT = 50
 semaphore = threading.BoundedSemaphore(MAX_CONCURRENT)
 
@@ -21,15 +24,22 @@ success_count = 0
 error_count = 0
 
 
-def ack_callback(data=None):
-    """This runs when the server returns the dictionary from handle_capture."""
-    global success_count, error_count
-    # Check if data exists and contains the 'ok' status
-    if data and isinstance(data, dict) and data.get("status") == "ok":
-        success_count += 1
-    else:
-        error_count += 1
-    semaphore.release()  # Open a slot for the next image
+def make_ack_callback(batch_len):
+    def ack_callback(data=None):
+        """Runs when the server acks a capture_batch emit."""
+        global success_count, error_count
+        if data and isinstance(data, dict) and "results" in data:
+            for result in data["results"]:
+                if result.get("status") == "ok":
+                    success_count += 1
+                else:
+                    error_count += 1
+        else:
+            # The whole batch was rejected
+            error_count += batch_len
+        semaphore.release()  # Open a slot for the next batch
+
+    return ack_callback
 
 
 def setup_test_environment():
@@ -114,39 +124,54 @@ if __name__ == "__main__":
         exit(0)
 
     game_id, session_id,run_id = setup_test_environment()
-    sio.connect(SIO_URL)
+    # Long-polling needs sticky sessions, websocket works with any worker count.
+    sio.connect(SIO_URL, transports=["websocket"])
+
+    batches = [
+        files_to_upload[i : i + BATCH_SIZE]
+        for i in range(0, len(files_to_upload), BATCH_SIZE)
+    ]
 
-    # Iterate through all files in the folder
+    # Iterate through the folder one batch at a time
     with tqdm(total=len(files_to_upload), desc="Uploading", unit="img") as pbar:
-        for filename in files_to_upload:
+        for batch in batches:
             semaphore.acquire()
-            file_path = os.path.join(FOLDER_PATH, filename)
-
-            try:
-                if os.path.isfile(file_path):
-                    print(f"Processing: {filename}")
-
-                    capture_index = extract_serial_number(filename)
-                    with open(file_path, "rb") as f:
-                        image_bytes = f.read()
-
-                    payload = {
-                        "game_id": game_id,
-                        "session_id": session_id,
-                        "run_id": run_id,
-                        "captured_at": datetime.now(timezone.utc).isoformat(),
-                        "capture_index": capture_index,
-                        "image_data": image_bytes,
-                        "screenshot_hash": f"hash_{filename}",
-                    }
-
-                    sio.emit("capture_event", payload, callback=ack_callback)
-                    # Update progress bar UI
-                    pbar.update(1)
-                    pbar.set_postfix({"Success": success_count, "Errors": error_count})
-            except Exception as e:
-                error_count += 1
-                pbar.write(f"Failed to read {filename}: {e}")
+            captures = []
+
+            for filename in batch:
+                file_path = os.path.join(FOLDER_PATH, filename)
+                try:
+                    if os.path.isfile(file_path):
+                        capture_index = extract_serial_number(filename)
+                        with open(file_path, "rb") as f:
+                            image_bytes = f.read()
+
+                        captures.append(
+                            {
+                                "game_id": game_id,
+                                "session_id": session_id,
+                                "run_id": run_id,
+                                "captured_at": datetime.now(timezone.utc).isoformat(),
+                                "capture_index": capture_index,
+                                "image_data": image_bytes,
+                            }
+                        )
+                except Exception as e:
+                    error_count += 1
+                    pbar.write(f"Failed to read {filename}: {e}")
+
+            if not captures:
+                semaphore.release()
+                continue
+
+            sio.emit(
+                "capture_batch",
+                {"captures": captures},
+                callback=make_ack_callback(len(captures)),
+            )
+            # Update progress bar UI
+            pbar.update(len(batch))
+            pbar.set_postfix({"Success": success_count, "Errors": error_count})
 
     for _ in range(MAX_CONCURRENT):
         semaphore.acquire()
@@ -5,9 +5,23 @@ from flask import Flask, jsonify
 # Don't remove "useless" import, decorator registration is at runtime.
 import src.ingestion.capture  # noqa: F401
 from src.choice.choice import Choice
-from src.errors import FileUploadError, MissingCollectorParam
+from src.errors import (
+    BlobStorageError,
+    FileUploadError,
+    InvalidMediaFormatError,
+    MissingCollectorParam,
+    UnsupportedResponseFormatError,
+    UploadConflictError,
+    UploadNotFoundError,
+    UploadTooLargeError,
+)
+from src.export.export import Export
 from src.game.game import Game
 from src.ingestion.collector import Collector
+from src.ingestion.spool import capture_spool
+from src.ingestion.upload import Uploads
+from src.metrics import init_metrics
+from src.query.query import Query
 from src.run.run import Run
 from src.socketio_ext import init_socketio, socketio
 from src.user.user import User
@@ -20,6 +34,8 @@ app = Flask(__name__)
 print("initialized flask app.", flush=True)
 init_socketio(app)
 print("initialized flask socket.io.", flush=True)
+init_metrics(app)
+print("initialized metrics.", flush=True)
 
 app.config["UPLOAD_FOLDER"] = UPLOAD_DIR
 app.config["MAX_CONTENT_LENGTH"] = UPLOAD_SIZE
@@ -27,16 +43,31 @@ app.config["MAX_CONTENT_LENGTH"] = UPLOAD_SIZE
 with app.app_context():
     init_db()
     print("initialized db.", flush=True)
+if capture_spool is not None:
+    # Replays what an earlier run left in the spool without waiting for traffic.
+    capture_spool.start()
+    print("started capture spool.", flush=True)
 swagger = Swagger(app)
 app.register_blueprint(Collector, url_prefix="/api/v1")
 app.register_blueprint(Choice, url_prefix="/api/v1")
 app.register_blueprint(Game, url_prefix="/api/v1")
 app.register_blueprint(Run, url_prefix="/api/v1")
 app.register_blueprint(User, url_prefix="/api/v1/")
+app.register_blueprint(Export, url_prefix="/api/v1")
+app.register_blueprint(Uploads, url_prefix="/api/v1")
+app.register_blueprint(Query, url_prefix="/api/v1")
 
 
+# Flask looks handlers up per status code, so FileUploadError subclasses with
+# their own code are registered on their own.
 @app.errorhandler(MissingCollectorParam)
+@app.errorhandler(UnsupportedResponseFormatError)
 @app.errorhandler(FileUploadError)
+@app.errorhandler(InvalidMediaFormatError)
+@app.errorhandler(BlobStorageError)
+@app.errorhandler(UploadNotFoundError)
+@app.errorhandler(UploadConflictError)
+@app.errorhandler(UploadTooLargeError)
 def handle_collection_error(e):
     """
     handles error exceptions, and returns to the user a json response with the error metadata.
@@ -0,0 +1,190 @@
+"""
+asyncio entry point: python-socketio's AsyncServer on psycopg's
+AsyncConnectionPool. Serve it with:
+
+    uvicorn src.asgi:app --host 0.0.0.0 --port 8000
+
+It handles the same Socket.IO events as the Flask app in src/api.py, with the
+same validation and SQL.
+"""
+
+import asyncio
+import os
+
+import socketio
+from dotenv import load_dotenv
+
+from src import metrics
+from src.db import AsyncDatabaseConnection, DatabaseConnection
+from src.ingestion.capture import (
+    batch_ack,
+    batch_captures,
+    capture_ack,
+    capture_image_bytes,
+    hello_world_response,
+    session_room,
+    stored_notifications,
+)
+from src.ingestion.collector import (
+    build_capture_row,
+    capture_error_payload,
+    stored_payload,
+)
+from src.ingestion.error import socket_error_payload
+from src.ingestion.spool import capture_spool
+from src.ingestion.writer import CAPTURE_ACK_TIMEOUT, AsyncCaptureWriter
+from src.socketio_ext import (
+    SOCKETIO_CHANNEL,
+    SOCKETIO_MESSAGE_QUEUE,
+    SOCKETIO_TRANSPORTS,
+)
+
+load_dotenv()
+
+sio = socketio.AsyncServer(
+    async_mode="asgi",
+    cors_allowed_origins="*",
+    transports=SOCKETIO_TRANSPORTS,
+    client_manager=(
+        socketio.AsyncRedisManager(SOCKETIO_MESSAGE_QUEUE, channel=SOCKETIO_CHANNEL)
+        if SOCKETIO_MESSAGE_QUEUE
+        else None
+    ),
+)
+capture_writer = AsyncCaptureWriter()
+
+
+def submit_rows(rows):
+    """Queues rows and returns one awaitable ack per row."""
+    if capture_spool is not None:
+        # The spool acks from its own thread.
+        return [asyncio.wrap_future(f) for f in capture_spool.submit_many(rows)]
+    return capture_writer.submit_many(rows)
+
+
+async def collect_capture(data, image_bytes):
+    # Validation and the blob store write are sync, keep them off the loop.
+    row = await asyncio.to_thread(build_capture_row, data, image_bytes)
+
+    try:
+        (future,) = submit_rows([row])
+        with metrics.phase(metrics.PHASE_DB):
+            stored = await asyncio.wait_for(future, CAPTURE_ACK_TIMEOUT)
+    except Exception as e:
+        return capture_error_payload(e)
+
+    if stored.duplicate is False:
+        metrics.record_ingested(len(image_bytes))
+    return stored_payload(stored), 200
+
+
+async def collect_capture_batch(items):
+    results = [None] * len(items)
+    pending = []
+
+    for index, data in enumerate(items):
+        try:
+            if not isinstance(data, dict):
+                raise ValueError("capture must be an object")
+            image_bytes = data.get("image_data")
+            if not image_bytes:
+                raise ValueError("image_data is required")
+            row = await asyncio.to_thread(build_capture_row, data, image_bytes)
+            pending.append((index, row, len(image_bytes)))
+        except Exception as e:
+            results[index] = capture_error_payload(e)
+
+    futures = submit_rows([row for _, row, _ in pending])
+
+    for (index, _, nbytes), future in zip(pending, futures):
+        try:
+            with metrics.phase(metrics.PHASE_DB):
+                stored = await asyncio.wait_for(future, CAPTURE_ACK_TIMEOUT)
+        except Exception as e:
+            results[index] = capture_error_payload(e)
+        else:
+            if stored.duplicate is False:
+                metrics.record_ingested(nbytes)
+            results[index] = stored_payload(stored), 200
+
+    return results
+
+
+@sio.on("capture_event")
+@metrics.instrument_event("capture_event")
+async def handle_capture(sid, json):
+    try:
+        image_bytes = capture_image_bytes(json)
+        payload, status = await collect_capture(json, image_bytes=image_bytes)
+        for room, notification in stored_notifications([json], [(payload, status)]):
+            await sio.emit("capture_stored", notification, to=room)
+        return capture_ack(payload, status)
+    except Exception as e:
+        return socket_error_payload(e)
+
+
+@sio.on("capture_batch")
+@metrics.instrument_event("capture_batch")
+async def handle_capture_batch(sid, json):
+    try:
+        captures = batch_captures(json)
+        batch_results = await collect_capture_batch(captures)
+        for room, notification in stored_notifications(captures, batch_results):
+            await sio.emit("capture_stored", notification, to=room)
+        return batch_ack(batch_results)
+    except Exception as e:
+        return socket_error_payload(e)
+
+
+@sio.on("hello_world")
+@metrics.instrument_event("hello_world")
+async def handle_hello_world(sid, json):
+    await sio.emit("response", hello_world_response(json))
+
+
+@sio.on("join_session")
+@metrics.instrument_event("join_session")
+async def handle_join_session(sid, json):
+    try:
+        room = session_room(json)
+        await sio.enter_room(sid, room)
+        return {"status": "ok", "room": room}
+    except Exception as e:
+        return socket_error_payload(e)
+
+
+@sio.on("leave_session")
+@metrics.instrument_event("leave_session")
+async def handle_leave_session(sid, json):
+    try:
+        room = session_room(json)
+        await sio.leave_room(sid, room)
+        return {"status": "ok", "room": room}
+    except Exception as e:
+        return socket_error_payload(e)
+
+
+async def startup():
+    conn_str = os.environ.get("PGSQL_CONN")
+    if not conn_str:
+        raise ValueError("PGSQL_CONN environment variable is not set")
+
+    await AsyncDatabaseConnection.initialize(conn_str)
+    print("initialized async db.", flush=True)
+    if capture_spool is not None:
+        # The drainer replays through the sync pool, from its own thread.
+        DatabaseConnection.initialize(conn_str)
+        capture_spool.start()
+        print("started capture spool.", flush=True)
+
+
+async def shutdown():
+    await AsyncDatabaseConnection.close()
+
+
+app = socketio.ASGIApp(
+    sio,
+    other_asgi_app=metrics.metrics_asgi_app(),
+    on_startup=startup,
+    on_shutdown=shutdown,
+)
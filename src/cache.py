@@ -0,0 +1,152 @@
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+
+import redis
+from flask import Response
+
+from src import metrics
+
+CACHE_BACKEND = os.environ.get("CACHE_BACKEND", "memory")
+CACHE_TTL = float(os.environ.get("CACHE_TTL", "300"))
+CACHE_MAX_ENTRIES = int(os.environ.get("CACHE_MAX_ENTRIES", "4096"))
+CACHE_REDIS_URL = os.environ.get("CACHE_REDIS_URL", "redis://localhost:6379/0")
+
+
+class Cache(ABC):
+    """
+    Read-through cache for the serialized bodies of GET lookups.
+
+    Keys are `<namespace>:<id>` (e.g. `game:42`). Only found rows are cached.
+    Misses are not, so a lookup never hides a row inserted after it. Games,
+    runs and users are never updated, so no write can leave an entry stale.
+    """
+
+    name = "none"
+
+    def get(self, key):
+        value = self._get(key)
+        metrics.CACHE_LOOKUPS.labels(
+            self.name, key.split(":", 1)[0], "miss" if value is None else "hit"
+        ).inc()
+        return value
+
+    @abstractmethod
+    def set(self, key, value):
+        pass
+
+    @abstractmethod
+    def _get(self, key):
+        """Returns the cached value of `key`, or None on a miss."""
+
+
+class NullCache(Cache):
+    """Disables caching, every lookup is a miss."""
+
+    def set(self, key, value):
+        pass
+
+    def _get(self, key):
+        return None
+
+
+class MemoryCache(Cache):
+    """
+    Per-process LRU with a TTL. Once `max_entries` is reached, the least
+    recently used entry is evicted.
+    """
+
+    name = "memory"
+
+    def __init__(self, max_entries=CACHE_MAX_ENTRIES, ttl=CACHE_TTL, clock=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._clock = clock or time.monotonic
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (self._clock() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at <= self._clock():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class RedisCache(Cache):
+    """
+    Shared cache for all workers and hosts. Entries expire with Redis' own
+    TTL. If Redis is unreachable, lookups fall through to the database
+    instead of failing the request.
+    """
+
+    name = "redis"
+
+    def __init__(self, client, ttl=CACHE_TTL, prefix="gamelens:cache:"):
+        self.client = client
+        self.ttl = ttl
+        self.prefix = prefix
+
+    def set(self, key, value):
+        try:
+            self.client.set(self.prefix + key, value, ex=max(1, int(self.ttl)))
+        except redis.RedisError as e:
+            print(f"[cache] redis set failed: {e}", flush=True)
+
+    def _get(self, key):
+        try:
+            return self.client.get(self.prefix + key)
+        except redis.RedisError as e:
+            print(f"[cache] redis get failed: {e}", flush=True)
+            return None
+
+
+_BACKENDS = {
+    "none": NullCache,
+    "memory": MemoryCache,
+    "redis": lambda: RedisCache(
+        redis.Redis.from_url(
+            CACHE_REDIS_URL, socket_timeout=0.5, socket_connect_timeout=0.5
+        )
+    ),
+}
+
+
+def create_cache(backend=CACHE_BACKEND):
+    if backend not in _BACKENDS:
+        raise ValueError(f"Unknown CACHE_BACKEND: {backend}")
+    return _BACKENDS[backend]()
+
+
+lookup_cache = create_cache()
+
+
+def cached_response(key):
+    """Returns the cached JSON response for `key`, or None on a miss."""
+    body = lookup_cache.get(key)
+    if body is None:
+        return None
+    return Response(body, status=200, mimetype="application/json")
+
+
+def cache_response(key, response):
+    """Caches the body of a successful JSON response and returns it."""
+    lookup_cache.set(key, response.get_data())
+    return response
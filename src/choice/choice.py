@@ -1,15 +1,22 @@
 from flasgger import swag_from
 from flask import Blueprint, jsonify, request
-from psycopg.rows import dict_row
-from psycopg.types.json import Json
 
+from src import formats, repository
 from src.db import DatabaseConnection
 from src.errors import MissingCollectorParam
 from src.util import validate_data
 
+CHOICE_FETCH_SIZE = 1000
+
 Choice = Blueprint("choice", __name__)
 
 
+def _choice_rows(run_id):
+    with DatabaseConnection.get_connection() as conn:
+        yield from repository.iter_choices(conn, run_id, CHOICE_FETCH_SIZE)
+        conn.commit()
+
+
 @Choice.route("/collect/choice", methods=["POST"])
 @swag_from("../docs/choice.yml")
 def insert_choice():
@@ -21,22 +28,7 @@ def insert_choice():
     validate_data(["run_id", "choice_options", "selected"], data)
 
     try:
-        with DatabaseConnection.get_connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute(
-                    """INSERT INTO choice (
-                        run_id,
-                        choice_options,
-                        selected
-                        )
-                        VALUES (%s, %s, %s)
-                        RETURNING id;
-                        """,
-                    (run_id, Json(choice_options), selected),
-                )
-                choice_id = cur.fetchone()[0]
-                conn.commit()
-
+        choice_id = repository.insert_choice(run_id, choice_options, selected)
     except Exception as e:
         return jsonify(
             {"error": "Client Side Error", "message": str(e), "type": type(e).__name__}
@@ -54,21 +46,23 @@ def get_choice():
     if not run_id:
         raise MissingCollectorParam("run_id is required")
 
-    try:
-        with DatabaseConnection.get_connection() as conn:
-            with conn.cursor(row_factory=dict_row) as cur:
-                choices = cur.execute(
-                    """SELECT
-                        id AS choice_id,
-                        run_id,
-                        choice_options,
-                        selected
-                    FROM choice
-                    WHERE run_id = %s;
-                    """,
-                    (run_id,),
-                ).fetchall()
+    mimetype = formats.negotiate()
+    if mimetype != formats.JSON:
+        try:
+            return formats.stream_response(
+                mimetype, _choice_rows(run_id), formats.CHOICE_SCHEMA, CHOICE_FETCH_SIZE
+            )
+        except Exception as e:
+            return jsonify(
+                {
+                    "error": "Client Side Error",
+                    "message": str(e),
+                    "type": type(e).__name__,
+                }
+            ), 400
 
+    try:
+        choices = repository.get_choices(run_id)
     except Exception as e:
         return jsonify(
             {"error": "Client Side Error", "message": str(e), "type": type(e).__name__}
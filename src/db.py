@@ -1,4 +1,39 @@
-from psycopg_pool import ConnectionPool
+import sys
+from contextlib import contextmanager
+from time import perf_counter
+
+from psycopg import waiting
+from psycopg_pool import AsyncConnectionPool, ConnectionPool
+
+from src import metrics
+
+
+def use_green_wait():
+    """
+    psycopg only detects gevent monkey-patching. Under eventlet it keeps its C
+    wait loop, which blocks the whole hub (and every Socket.IO client on the
+    worker) for as long as a query runs. When eventlet has patched `select`,
+    switch to psycopg's select() based wait, which yields to the hub while the
+    connection socket is not ready.
+
+    Returns True when the green wait was installed.
+    """
+    patcher = sys.modules.get("eventlet.patcher")
+    if patcher is None or not patcher.is_monkey_patched("select"):
+        return False
+
+    waiting.wait = waiting.wait_select
+    return True
+
+
+@contextmanager
+def _timed_connection(pool):
+    # Checkout and queries count as the request's DB time.
+    with metrics.phase(metrics.PHASE_DB):
+        started = perf_counter()
+        with pool.connection() as conn:
+            metrics.POOL_WAIT.labels("sync").observe(perf_counter() - started)
+            yield conn
 
 
 class DatabaseConnection:
@@ -11,6 +46,8 @@ class DatabaseConnection:
     @classmethod
     def initialize(cls, conn_string):
         if cls._pool is None:
+            if use_green_wait():
+                print("Using green-aware psycopg wait for eventlet.")
             print("Initializing Connection Pool...")
             cls._pool = ConnectionPool(
                 conn_string,
@@ -18,6 +55,7 @@ class DatabaseConnection:
                 max_size=25,
                 open=True,  # Pre-open connections to avoid boot-time hangs
             )
+            metrics.register_pool("sync", cls._pool)
 
     @classmethod
     def get_connection(cls):
@@ -30,7 +68,7 @@ class DatabaseConnection:
             )
 
         # Usage: with Database.get_connection() as conn: ...
-        return cls._pool.connection()
+        return _timed_connection(cls._pool)
 
     @classmethod
     def close(cls):
@@ -40,3 +78,45 @@ class DatabaseConnection:
         if cls._pool:
             cls._pool.close()
             print("Connection Pool closed.")
+
+
+class AsyncDatabaseConnection:
+    """
+    The asyncio counterpart of DatabaseConnection, used by the ASGI entry point.
+    """
+
+    _pool = None
+
+    @classmethod
+    async def initialize(cls, conn_string):
+        if cls._pool is None:
+            print("Initializing Async Connection Pool...")
+            # AsyncConnectionPool must be opened from within the running loop.
+            cls._pool = AsyncConnectionPool(
+                conn_string,
+                min_size=1,
+                max_size=25,
+                open=False,
+            )
+            await cls._pool.open()
+            metrics.register_pool("async", cls._pool)
+
+    @classmethod
+    def get_connection(cls):
+        """
+        Returns an async context manager that yields a connection from the pool.
+        """
+        if cls._pool is None:
+            raise Exception(
+                "Database not initialized. Call AsyncDatabase.initialize() first."
+            )
+
+        # Usage: async with AsyncDatabaseConnection.get_connection() as conn: ...
+        return cls._pool.connection()
+
+    @classmethod
+    async def close(cls):
+        if cls._pool:
+            await cls._pool.close()
+            cls._pool = None
+            print("Async Connection Pool closed.")
@@ -22,8 +22,43 @@ class InvalidMediaFormatError(FileUploadError):
     description = "Only PNG and JPG files are supported."
 
 
+class BlobStorageError(FileUploadError):
+    """Failure while persisting an uploaded image"""
+
+    code = 500
+    description = "Failed to store the uploaded image."
+
+
+class UploadNotFoundError(FileUploadError):
+    """Unknown or expired resumable upload"""
+
+    code = 404
+    description = "Upload not found."
+
+
+class UploadConflictError(FileUploadError):
+    """Resumable upload is in a state that does not allow the request"""
+
+    code = 409
+    description = "Upload offset does not match."
+
+
+class UploadTooLargeError(FileUploadError):
+    """Resumable upload would grow past its allowed length"""
+
+    code = 413
+    description = "Upload is too large."
+
+
 class MissingCollectorParam(HTTPException):
     """Missing Collector Parameter Error"""
 
     code = 400
     description = "Missing required collector parameter."
+
+
+class UnsupportedResponseFormatError(HTTPException):
+    """None of the formats in the Accept header can be served"""
+
+    code = 406
+    description = "Requested response format is not supported."
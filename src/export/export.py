@@ -0,0 +1,194 @@
+"""
+Session dataset export: a tar with every frame of a session as its own
+file, followed by `manifest.jsonl` (one line per capture) and
+`choices.jsonl` (the choices of the session's runs).
+
+The tar is written member by member as rows come off a server-side cursor.
+Blob-store frames are copied in chunks, and the manifest is spooled to a
+temporary file until the frames are done, so memory stays flat however
+large the session is.
+
+Frames are named `frames/<capture_index>_<capture_id>.<ext>` and ordered by
+capture_index. An interrupted download resumes with `from_index` set to one
+past the last capture_index received.
+"""
+
+import io
+import json
+import os
+import tarfile
+import tempfile
+from datetime import timezone
+
+from flasgger import swag_from
+from flask import Blueprint, Response, jsonify, request
+from werkzeug.utils import secure_filename
+
+from src import repository
+from src.db import DatabaseConnection
+from src.errors import MissingCollectorParam
+from src.storage.blob import blob_store
+from src.util import guess_image_mimetype
+
+EXPORT_FETCH_SIZE = int(os.environ.get("EXPORT_FETCH_SIZE", "50"))
+# Manifests larger than this move from memory to a temporary file.
+EXPORT_SPOOL_SIZE = int(os.environ.get("EXPORT_SPOOL_SIZE", str(8 * 1024 * 1024)))
+EXPORT_CHUNK_SIZE = 1024 * 1024
+
+_EXTENSIONS = {"image/png": "png", "image/jpeg": "jpg"}
+
+Export = Blueprint("export", __name__)
+
+
+def _timestamp(value):
+    # Stored timestamps are naive UTC.
+    return value.replace(tzinfo=timezone.utc).timestamp() if value else 0
+
+
+def _member_header(name, size, mtime):
+    info = tarfile.TarInfo(name)
+    info.size = size
+    info.mtime = mtime
+    info.mode = 0o644
+    # PAX, so long session or capture ids never hit the ustar name limit.
+    return info.tobuf(tarfile.PAX_FORMAT)
+
+
+def _member(name, file, size, mtime):
+    """Yields a tar member whose content is read from `file` in chunks."""
+    yield _member_header(name, size, mtime)
+    while chunk := file.read(EXPORT_CHUNK_SIZE):
+        yield chunk
+    yield b"\0" * (-size % tarfile.BLOCKSIZE)
+
+
+def _open_frame(row):
+    """Returns (file, size) for the capture's image, or None if it has none."""
+    if row["image_data"]:
+        return io.BytesIO(row["image_data"]), len(row["image_data"])
+    if row["screenshot_ref"] and blob_store.exists(row["screenshot_ref"]):
+        file = blob_store.open(row["screenshot_ref"])
+        size = file.seek(0, io.SEEK_END)
+        file.seek(0)
+        return file, size
+    return None
+
+
+def _frame_name(row, file):
+    header = file.read(16)
+    file.seek(0)
+    extension = _EXTENSIONS.get(guess_image_mimetype(header), "bin")
+    index = row["capture_index"]
+    prefix = f"{index:08d}_" if index is not None else ""
+    return f"frames/{prefix}{row['capture_id']}.{extension}"
+
+
+def _manifest_line(row, name):
+    return (
+        json.dumps(
+            {
+                "file": name,
+                "capture_id": row["capture_id"],
+                "game_id": row["game_id"],
+                "run_id": row["run_id"],
+                "captured_at": row["captured_at"].isoformat(),
+                "capture_index": row["capture_index"],
+                "mouse_x": row["mouse_x"],
+                "mouse_y": row["mouse_y"],
+                "image_width": row["image_width"],
+                "image_height": row["image_height"],
+                "screenshot_hash": row["screenshot_hash"],
+            }
+        )
+        + "\n"
+    ).encode()
+
+
+def _spooled_member(name, spool, mtime):
+    size = spool.tell()
+    spool.seek(0)
+    yield from _member(name, spool, size, mtime)
+
+
+def _capture_rows(session_id, game_id, from_index):
+    with DatabaseConnection.get_connection() as conn:
+        yield from repository.iter_session_export(
+            conn, session_id, game_id, from_index, EXPORT_FETCH_SIZE
+        )
+        conn.commit()
+
+
+def _choice_lines(run_ids):
+    with DatabaseConnection.get_connection() as conn:
+        for row in repository.iter_runs_choices(conn, run_ids, EXPORT_FETCH_SIZE):
+            yield (json.dumps(row) + "\n").encode()
+        conn.commit()
+
+
+def _export_tar(rows):
+    with (
+        tempfile.SpooledTemporaryFile(EXPORT_SPOOL_SIZE) as manifest,
+        tempfile.SpooledTemporaryFile(EXPORT_SPOOL_SIZE) as choices,
+    ):
+        run_ids = set()
+        mtime = 0
+        for row in rows:
+            mtime = _timestamp(row["captured_at"])
+            if row["run_id"] and row["run_id"].isdigit():
+                run_ids.add(int(row["run_id"]))
+
+            frame = _open_frame(row)
+            if frame is None:
+                # Listed in the manifest without a file.
+                manifest.write(_manifest_line(row, None))
+                continue
+            file, size = frame
+            with file:
+                name = _frame_name(row, file)
+                yield from _member(name, file, size, mtime)
+            manifest.write(_manifest_line(row, name))
+
+        yield from _spooled_member("manifest.jsonl", manifest, mtime)
+
+        if run_ids:
+            choices.writelines(_choice_lines(run_ids))
+        yield from _spooled_member("choices.jsonl", choices, mtime)
+
+    # End-of-archive marker.
+    yield b"\0" * (2 * tarfile.BLOCKSIZE)
+
+
+@Export.route("/export/session/<session_id>", methods=["GET"])
+@swag_from("../docs/export_session_get.yml")
+def export_session(session_id):
+    game_id = request.args.get("game_id")
+    from_index = request.args.get("from_index")
+    try:
+        from_index = int(from_index) if from_index else None
+    except ValueError as exc:
+        raise MissingCollectorParam("from_index must be an integer") from exc
+
+    rows = _capture_rows(session_id, game_id, from_index)
+    try:
+        # Runs the query now, so failures get a normal error response.
+        first = next(rows, None)
+    except Exception as e:
+        return jsonify(
+            {"error": "Client Side Error", "message": str(e), "type": type(e).__name__}
+        ), 400
+
+    if first is None and from_index is None:
+        rows.close()
+        return jsonify({"error": "Session not found"}), 404
+
+    def all_rows():
+        if first is not None:
+            yield first
+        yield from rows
+
+    filename = secure_filename(f"session-{session_id}.tar") or "session.tar"
+    return Response(
+        _export_tar(all_rows()),
+        mimetype="application/x-tar",
+        headers={"Content-Disposition": f"attachment; filename={filename}"},
+    )
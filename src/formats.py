@@ -0,0 +1,131 @@
+"""
+Response formats for bulk reads, picked from the request's Accept header.
+
+JSON stays the default. Analytics consumers can ask for:
+- MessagePack (`application/msgpack`): a sequence of maps, one per row, with
+  images as raw bytes and timestamps as MessagePack timestamps. Read it with
+  `msgpack.Unpacker`.
+- Arrow IPC streaming (`application/vnd.apache.arrow.stream`): record
+  batches with a binary image column. Read it with `pyarrow.ipc.open_stream`.
+
+Both are written batch by batch as rows come off the cursor, so a session is
+never held in memory as a whole.
+"""
+
+import io
+import itertools
+import json
+from datetime import datetime, timezone
+
+import msgpack
+import pyarrow as pa
+from flask import Response, request
+
+from src.errors import UnsupportedResponseFormatError
+
+JSON = "application/json"
+MSGPACK = "application/msgpack"
+MSGPACK_LEGACY = "application/x-msgpack"
+ARROW_STREAM = "application/vnd.apache.arrow.stream"
+
+# JSON first, so `*/*` and `application/*` keep getting JSON.
+OFFERED_FORMATS = (JSON, MSGPACK, MSGPACK_LEGACY, ARROW_STREAM)
+
+# Arrow has no JSON type, so JSON values travel as strings tagged with this.
+JSON_FIELD = {b"content-type": b"application/json"}
+
+RAW_CAPTURE_SCHEMA = pa.schema(
+    [
+        ("captured_at", pa.timestamp("us")),
+        ("game_id", pa.string()),
+        ("run_id", pa.string()),
+        # large_binary has 64-bit offsets, a batch of big frames can pass 2 GiB.
+        ("image_data", pa.large_binary()),
+        ("screenshot_ref", pa.string()),
+        ("image_height", pa.int32()),
+        ("image_width", pa.int32()),
+        # Only set when a preview size was requested.
+        ("preview", pa.bool_()),
+    ]
+)
+
+CHOICE_SCHEMA = pa.schema(
+    [
+        ("choice_id", pa.int64()),
+        ("run_id", pa.int64()),
+        pa.field("choice_options", pa.string(), metadata=JSON_FIELD),
+        ("selected", pa.string()),
+    ]
+)
+
+
+def negotiate():
+    """
+    Returns the media type to answer the current request with. Raises
+    UnsupportedResponseFormatError when the Accept header rules out all of
+    them.
+    """
+    accept = request.accept_mimetypes
+    if not accept:
+        return JSON
+    best = accept.best_match(OFFERED_FORMATS)
+    if best is None:
+        raise UnsupportedResponseFormatError(
+            f"Supported formats are {', '.join(OFFERED_FORMATS)}."
+        )
+    return best
+
+
+def _msgpack_value(value):
+    # Stored timestamps are naive UTC, MessagePack timestamps need a zone.
+    if isinstance(value, datetime) and value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value
+
+
+def _msgpack_chunks(batches):
+    packer = msgpack.Packer(datetime=True)
+    for batch in batches:
+        yield b"".join(
+            packer.pack({key: _msgpack_value(value) for key, value in row.items()})
+            for row in batch
+        )
+
+
+def _arrow_chunks(batches, schema):
+    json_fields = [field.name for field in schema if field.metadata == JSON_FIELD]
+    sink = io.BytesIO()
+
+    def drain():
+        chunk = sink.getvalue()
+        sink.seek(0)
+        sink.truncate()
+        return chunk
+
+    with pa.ipc.new_stream(sink, schema) as writer:
+        for batch in batches:
+            for row in batch:
+                for name in json_fields:
+                    row[name] = json.dumps(row[name])
+            writer.write_batch(pa.RecordBatch.from_pylist(batch, schema=schema))
+            yield drain()
+    # End-of-stream marker, and the schema when there were no rows.
+    yield drain()
+
+
+def stream_response(mimetype, rows, schema, batch_size):
+    """
+    Streams `rows` (dicts) as `mimetype`, `batch_size` rows per chunk.
+
+    The first row is fetched before returning, so a failing query still
+    raises here and can be answered with a normal error response.
+    """
+    rows = iter(rows)
+    rows = itertools.chain(list(itertools.islice(rows, 1)), rows)
+    batches = (list(batch) for batch in itertools.batched(rows, batch_size))
+
+    if mimetype == ARROW_STREAM:
+        body = _arrow_chunks(batches, schema)
+    else:
+        body = _msgpack_chunks(batches)
+    return Response(body, mimetype=mimetype)
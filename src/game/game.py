@@ -1,9 +1,9 @@
 from flasgger import swag_from
 from flask import Blueprint, jsonify, request
-from psycopg.rows import dict_row
 
-from src.db import DatabaseConnection
-from src.errors import MissingCollectorParam
+from src import repository
+from src.cache import cache_response, cached_response
+from src.ingestion.collector import _parse_int
 from src.util import validate_data
 
 Game = Blueprint("game", __name__)
@@ -20,23 +20,7 @@ def insert_game_to_db():
     validate_data(["game_name", "user_id", "game_version"], data)
 
     try:
-        with DatabaseConnection.get_connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute(
-                    """INSERT INTO user_game (
-                        user_id,
-                        game_name,
-                        game_version,
-                        version_date
-                        )
-                        VALUES (%s, %s, %s, NOW())
-                        RETURNING id;
-                        """,
-                    (user_id, game_name, game_version),
-                )
-                game_id = cur.fetchone()[0]
-                conn.commit()
-
+        game_id = repository.insert_game(user_id, game_name, game_version)
     except Exception as e:
         return jsonify(
             {"error": "Client Side Error", "message": str(e), "type": type(e).__name__}
@@ -48,26 +32,15 @@ def insert_game_to_db():
 @Game.route("/collect/game", methods=["GET"])
 @swag_from("../docs/game_get.yml")
 def get_game():
-    game_id = request.args.get("game_id")
-    if not game_id:
-        raise MissingCollectorParam("game_id is required")
+    # Parsed, so `42` and `042` share one cache entry.
+    game_id = _parse_int(request.args.get("game_id"), "game_id", required=True)
 
-    try:
-        with DatabaseConnection.get_connection() as conn:
-            with conn.cursor(row_factory=dict_row) as cur:
-                game = cur.execute(
-                    """SELECT
-                        id AS game_id,
-                        user_id,
-                        game_name,
-                        game_version,
-                        version_date
-                    FROM user_game
-                    WHERE id = %s;
-                    """,
-                    (game_id,),
-                ).fetchall()
+    cached = cached_response(f"game:{game_id}")
+    if cached is not None:
+        return cached
 
+    try:
+        game = repository.get_games(game_id)
     except Exception as e:
         return jsonify(
             {"error": "Client Side Error", "message": str(e), "type": type(e).__name__}
@@ -76,4 +49,4 @@ def get_game():
     if not game:
         return jsonify({"error": "Game not found"}), 404
 
-    return jsonify(game), 200
+    return cache_response(f"game:{game_id}", jsonify(game)), 200
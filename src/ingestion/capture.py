@@ -1,33 +1,194 @@
-from src.ingestion.collector import collect_capture
+import os
+
+from flask_socketio import join_room, leave_room
+
+from src import metrics
+from src.ingestion.collector import collect_capture, collect_capture_batch
 from src.ingestion.error import socket_error_payload
 from src.socketio_ext import socketio
 
+CAPTURE_BATCH_MAX_ITEMS = int(os.environ.get("CAPTURE_BATCH_MAX_ITEMS", "500"))
+# Emit `capture_stored` to the session's room after each stored capture.
+SOCKETIO_NOTIFY_CAPTURES = os.environ.get("SOCKETIO_NOTIFY_CAPTURES", "1") == "1"
+
+# The helpers below hold the event logic shared by this Flask-SocketIO server
+# and the asyncio server in src/asgi.py.
+
+
+def capture_image_bytes(json):
+    """Returns the image of a capture_event payload, or raises ValueError."""
+    if not json:
+        raise ValueError("Missing payload")
+
+    image_bytes = json.get("image_data")
+    if not image_bytes:
+        raise ValueError("image_data is required")
+    return image_bytes
+
+
+def capture_ack(payload, status):
+    if status >= 400:
+        return {"status": "error", **payload}
+
+    ack = {
+        "status": "ok",
+        "message": "recieved and stored raw capture.",
+    }
+    for key in ("capture_id", "duplicate", "missing", "gaps", "spooled"):
+        if key in payload:
+            ack[key] = payload[key]
+    return ack
+
+
+def batch_captures(json):
+    """Returns the capture list of a capture_batch payload, or raises ValueError."""
+    captures = json.get("captures") if isinstance(json, dict) else json
+    if not captures or not isinstance(captures, list):
+        raise ValueError("captures must be a non-empty list")
+    if len(captures) > CAPTURE_BATCH_MAX_ITEMS:
+        raise ValueError(
+            f"capture_batch accepts at most {CAPTURE_BATCH_MAX_ITEMS} captures"
+        )
+    return captures
+
+
+def batch_ack(batch_results):
+    results = []
+    sessions = {}
+    for index, (payload, status) in enumerate(batch_results):
+        if status >= 400:
+            results.append(
+                {"index": index, "status": "error", "code": status, **payload}
+            )
+        else:
+            result = {
+                "index": index,
+                "status": "ok",
+                "capture_id": payload.get("capture_id"),
+            }
+            if payload.get("duplicate"):
+                result["duplicate"] = True
+            results.append(result)
+            if payload.get("session_id") is not None:
+                # Later items carry the most recent view of their session.
+                sessions[payload["session_id"]] = {
+                    "missing": payload["missing"],
+                    "gaps": payload["gaps"],
+                }
+
+    failed = sum(1 for result in results if result["status"] == "error")
+    if failed == 0:
+        batch_status = "ok"
+    elif failed == len(results):
+        batch_status = "error"
+    else:
+        batch_status = "partial"
+
+    return {
+        "status": batch_status,
+        "stored": len(results) - failed,
+        "failed": failed,
+        "results": results,
+        "sessions": sessions,
+    }
+
+
+def session_room(json):
+    """Returns the room of a join_session/leave_session payload."""
+    session_id = json.get("session_id") if isinstance(json, dict) else None
+    if not session_id:
+        raise ValueError("session_id is required")
+    return f"session:{session_id}"
+
+
+def stored_notifications(items, batch_results):
+    """
+    Groups the capture_ids stored by a capture_event/capture_batch by session,
+    as (room, capture_stored payload) pairs.
+    """
+    if not SOCKETIO_NOTIFY_CAPTURES:
+        return []
+
+    stored = {}
+    for data, (payload, status) in zip(items, batch_results):
+        if payload.get("duplicate"):
+            # Already announced when it was first stored.
+            continue
+        if status < 400 and isinstance(data, dict) and data.get("session_id"):
+            session_id = str(data["session_id"])
+            stored.setdefault(session_id, []).append(payload.get("capture_id"))
+
+    return [
+        (
+            f"session:{session_id}",
+            {"session_id": session_id, "capture_ids": capture_ids},
+        )
+        for session_id, capture_ids in stored.items()
+    ]
+
+
+def hello_world_response(json):
+    print(f"[socket] hello_world received: {json}", flush=True)
+    return {"status": "ok", "message": f"got message: {json.get('msg')}"}
+
 
 @socketio.on("capture_event")
+@metrics.instrument_event("capture_event")
 def handle_capture(json):
     try:
-        if not json:
-            raise ValueError("Missing payload")
-
-        image_bytes = json.get("image_data")
-        if not image_bytes:
-            raise ValueError("image_data is required")
-
+        image_bytes = capture_image_bytes(json)
         payload, status = collect_capture(json, image_bytes=image_bytes)
-        if status >= 400:
-            return {"status": "error", **payload}
+        for room, notification in stored_notifications([json], [(payload, status)]):
+            socketio.emit("capture_stored", notification, to=room)
+        return capture_ack(payload, status)
+    except Exception as e:
+        return socket_error_payload(e)
 
-        response_payload = {
-            "status": "ok",
-            "message": "recieved and stored raw capture.",
-        }
-        return response_payload
+
+@socketio.on("capture_batch")
+@metrics.instrument_event("capture_batch")
+def handle_capture_batch(json):
+    """
+    Accepts a list of captures, either directly or under `captures`, and acks
+    once with a per-item status list aligned with the request order.
+    """
+    try:
+        captures = batch_captures(json)
+        batch_results = collect_capture_batch(captures)
+        for room, notification in stored_notifications(captures, batch_results):
+            socketio.emit("capture_stored", notification, to=room)
+        return batch_ack(batch_results)
     except Exception as e:
         return socket_error_payload(e)
 
 
 @socketio.on("hello_world")
+@metrics.instrument_event("hello_world")
 def handle_hello_world(json):
-    print(f"[socket] hello_world received: {json}", flush=True)
-    response_payload = {"status": "ok", "message": f"got message: {json.get('msg')}"}
-    socketio.emit("response", response_payload)
+    socketio.emit("response", hello_world_response(json))
+
+
+@socketio.on("join_session")
+@metrics.instrument_event("join_session")
+def handle_join_session(json):
+    """
+    Subscribes the client to `capture_stored` events of a session, whichever
+    worker receives its captures.
+    """
+    try:
+        room = session_room(json)
+        join_room(room)
+        return {"status": "ok", "room": room}
+    except Exception as e:
+        return socket_error_payload(e)
+
+
+@socketio.on("leave_session")
+@metrics.instrument_event("leave_session")
+def handle_leave_session(json):
+    try:
+        room = session_room(json)
+        leave_room(room)
+        return {"status": "ok", "room": room}
+    except Exception as e:
+        return socket_error_payload(e)
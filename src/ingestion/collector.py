@@ -1,20 +1,47 @@
 import base64
-import os
+import heapq
+import itertools
+import json
 import uuid
+from dataclasses import asdict
 from datetime import datetime, timezone
 
 from flasgger import swag_from
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, Response, jsonify, request
 from psycopg.rows import dict_row
-from werkzeug.utils import secure_filename
+from werkzeug.exceptions import HTTPException
+from werkzeug.wsgi import wrap_file
 
+from src import formats, metrics, repository
 from src.db import DatabaseConnection
 from src.errors import (
+    BlobStorageError,
     InvalidMediaFormatError,
     MissingCollectorParam,
     MissingUploadFileError,
 )
-from src.util import UPLOAD_DIR, allowed_file, validate_data
+from src.ingestion.image import (
+    IMAGE_CHUNK_SIZE,
+    open_capture_image,
+    open_capture_preview,
+)
+from src.ingestion.spool import capture_spool
+from src.ingestion.writer import (
+    CAPTURE_ACK_TIMEOUT,
+    SESSION_GAP_LIMIT,
+    capture_writer,
+)
+from src.storage.blob import blob_store
+from src.storage.preview import PREVIEW_SIZES, preview_key
+from src.util import (
+    allowed_file,
+    decode_cursor,
+    encode_cursor,
+    sniff_image,
+    validate_data,
+)
+
+INT4_MIN, INT4_MAX = -(2**31), 2**31 - 1
 
 
 def _parse_timestamp(value, field_name, required=True):
@@ -58,72 +85,224 @@ def _parse_timestamp(value, field_name, required=True):
         ) from exc
 
 
-def collect_capture(data, image_bytes):
-    validate_data(["session_id", "game_id", "captured_at", "capture_index"], data)
+def _parse_int(value, field_name, required=False):
+    """Coerce form/socket values into ints, binary COPY does no server-side casting."""
+    if value is None or value == "":
+        if required:
+            raise MissingCollectorParam(f"{field_name} is required")
+        return None
+
+    try:
+        number = int(value)
+    except (TypeError, ValueError) as exc:
+        raise MissingCollectorParam(f"{field_name} must be an integer") from exc
+
+    # Binary int4 values are packed without overflow checks.
+    if not INT4_MIN <= number <= INT4_MAX:
+        raise MissingCollectorParam(f"{field_name} is out of range")
+    return number
+
+
+def _to_utc_naive(value):
+    """raw_capture stores `timestamp` columns, so aware datetimes are kept as UTC."""
+    if value is None or value.tzinfo is None:
+        return value
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def _parse_bool(value, default=True):
+    if value is None:
+        return default
+    return value.strip().lower() not in {"0", "false", "no", "off"}
+
+
+def _parse_preview_size(value):
+    size = _parse_int(value, "size")
+    if size is not None and size not in PREVIEW_SIZES:
+        sizes = ", ".join(map(str, PREVIEW_SIZES)) or "none are configured"
+        raise MissingCollectorParam(f"size must be a preview size ({sizes})")
+    return size
+
+
+def _optional_str(value):
+    return None if value is None else str(value)
+
+
+def capture_error_payload(error):
+    if isinstance(error, HTTPException):
+        return {
+            "error": error.name,
+            "message": error.description,
+            "type": type(error).__name__,
+        }, error.code
+    return {
+        "error": "Client Side Error",
+        "message": str(error),
+        "type": type(error).__name__,
+    }, 400
+
+
+if capture_spool is not None:
+    # Acks wait for the local spool's fsync instead of Postgres.
+    capture_writer = capture_spool
+
 
-    # Required fields
-    capture_id = str(uuid.uuid4())
-    captured_at = _parse_timestamp(data.get("captured_at"), "captured_at")
-    session_id = data["session_id"]
-    game_id = data["game_id"]
-    capture_index = data["capture_index"]
-    received_at = datetime.now(timezone.utc)
+def stored_payload(stored):
+    """The success payload for a row the writer resolved to `stored`."""
+    payload = {
+        "message": "File uploaded successfully",
+        "capture_id": stored.capture_id,
+        "duplicate": stored.duplicate,
+        "session_id": stored.session_id,
+        "missing": stored.missing,
+        "gaps": [list(gap) for gap in stored.gaps],
+    }
+    if stored.spooled:
+        payload["spooled"] = True
+    return payload
 
-    # Optional Fields
-    run_id = data.get("run_id")
-    mouse_x = data.get("mouse_x")
-    mouse_y = data.get("mouse_y")
-    screenshot_hash = data.get("screenshot_hash")
-    image_width = data.get("image_width")
-    image_height = data.get("image_height")
 
+def build_capture_row(data, image_bytes, screenshot_ref=None, image_info=None):
+    """
+    Validates capture metadata, stores the image and returns the raw_capture
+    row ordered as RAW_CAPTURE_COLUMNS. Pass `screenshot_ref` instead of
+    `image_bytes` for an image the caller stores itself, and `image_info` when
+    the caller has already sniffed the image.
+
+    The image must be a PNG or JPEG by its magic bytes. Its width and height
+    are read from its header, client-sent ones are only used when the header
+    has none.
+    """
+    with metrics.phase(metrics.PHASE_VALIDATION):
+        validate_data(["session_id", "game_id", "captured_at", "capture_index"], data)
+
+        # Required fields
+        capture_id = str(uuid.uuid4())
+        captured_at = _parse_timestamp(data.get("captured_at"), "captured_at")
+        session_id = str(data["session_id"])
+        game_id = str(data["game_id"])
+        capture_index = _parse_int(
+            data["capture_index"], "capture_index", required=True
+        )
+        received_at = datetime.now(timezone.utc)
+
+        # Optional Fields
+        run_id = _optional_str(data.get("run_id"))
+        mouse_x = _parse_int(data.get("mouse_x"), "mouse_x")
+        mouse_y = _parse_int(data.get("mouse_y"), "mouse_y")
+        image_width = _parse_int(data.get("image_width"), "image_width")
+        image_height = _parse_int(data.get("image_height"), "image_height")
+
+        if image_info is None and image_bytes is not None:
+            image_info = sniff_image(image_bytes)
+            if image_info is None:
+                raise InvalidMediaFormatError()
+        if image_info is not None and image_info.width is not None:
+            # PNG headers hold u32 dimensions, wider than the int4 columns.
+            image_width = _parse_int(image_info.width, "image_width")
+            image_height = _parse_int(image_info.height, "image_height")
+
+    # Images live in the blob store, keyed by a server-computed content hash.
+    # Client supplied hashes are not trusted as storage keys.
+    if screenshot_ref is None:
+        try:
+            with metrics.phase(metrics.PHASE_STORAGE):
+                screenshot_ref = blob_store.put(bytes(image_bytes))
+        except OSError as e:
+            raise BlobStorageError(str(e)) from e
+    screenshot_hash = screenshot_ref
+
+    return (
+        capture_id,
+        screenshot_ref,
+        game_id,
+        session_id,
+        _to_utc_naive(captured_at),
+        _to_utc_naive(received_at),
+        run_id,
+        mouse_x,
+        mouse_y,
+        screenshot_hash,
+        image_height,
+        image_width,
+        capture_index,
+    )
+
+
+def collect_capture(data, image_bytes, image_info=None):
+    row = build_capture_row(data, image_bytes, image_info=image_info)
+    return submit_capture_row(row, len(image_bytes))
+
+
+def submit_capture_row(row, nbytes):
+    """
+    Writes a built capture row and waits for its ack. A repeated
+    (session_id, capture_index) acks with the original capture_id.
+    """
     try:
-        with DatabaseConnection.get_connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute(
-                    """INSERT INTO raw_capture
-                    (
-                    capture_id,
-                    image_data,
-                    game_id,
-                    session_id,
-                    captured_at,
-                    received_at,
-                    run_id,
-                    mouse_x,
-                    mouse_y,
-                    screenshot_hash,
-                    image_height,
-                    image_width,
-                    capture_index
-                    )
-                    VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s);
-                    """,
-                    (
-                        capture_id,
-                        image_bytes,
-                        game_id,
-                        session_id,
-                        captured_at,
-                        received_at,
-                        run_id,
-                        mouse_x,
-                        mouse_y,
-                        screenshot_hash,
-                        image_height,
-                        image_width,
-                        capture_index,
-                    ),
-                )
-            conn.commit()
+        with metrics.phase(metrics.PHASE_DB):
+            stored = capture_writer.submit(row).result(timeout=CAPTURE_ACK_TIMEOUT)
     except Exception as e:
-        return {
-            "error": "Client Side Error",
-            "message": str(e),
-            "type": type(e).__name__,
-        }, 400
+        return capture_error_payload(e)
+
+    if stored.duplicate is False:
+        metrics.record_ingested(nbytes)
+    return stored_payload(stored), 200
+
+
+def collect_capture_batch(items):
+    """
+    Stores a list of captures (each with its own `image_data`) in a single
+    writer batch. Returns one (payload, status) pair per item, in order, so
+    partial failures can be reported per capture.
+    """
+    results = [None] * len(items)
+    pending = []
+
+    for index, data in enumerate(items):
+        try:
+            if not isinstance(data, dict):
+                raise ValueError("capture must be an object")
+            image_bytes = data.get("image_data")
+            if not image_bytes:
+                raise ValueError("image_data is required")
+            row = build_capture_row(data, image_bytes)
+            pending.append((index, row, len(image_bytes)))
+        except Exception as e:
+            results[index] = capture_error_payload(e)
+
+    futures = capture_writer.submit_many([row for _, row, _ in pending])
 
-    return {"message": "File uploaded successfully"}, 200
+    for (index, _, nbytes), future in zip(pending, futures):
+        try:
+            with metrics.phase(metrics.PHASE_DB):
+                stored = future.result(timeout=CAPTURE_ACK_TIMEOUT)
+        except Exception as e:
+            results[index] = capture_error_payload(e)
+        else:
+            if stored.duplicate is False:
+                metrics.record_ingested(nbytes)
+            results[index] = stored_payload(stored), 200
+
+    return results
+
+
+def _load_image(row, size=None):
+    """
+    Return image bytes for a capture row, whether stored inline or as a blob.
+    With `size`, return its preview instead, or None until it is rendered.
+    Inline images never get one.
+    """
+    if size is not None:
+        key = row.get("screenshot_ref") and preview_key(row["screenshot_ref"], size)
+        if key and blob_store.exists(key):
+            return blob_store.read(key)
+        return None
+    if row.get("image_data"):
+        return row["image_data"]
+    if row.get("screenshot_ref"):
+        return blob_store.read(row["screenshot_ref"])
+    return None
 
 
 Collector = Blueprint("collector", __name__)
@@ -142,17 +321,15 @@ def collect():
     if file.filename == "":
         raise MissingUploadFileError()
 
-    if file and allowed_file(filename):
-        filename = secure_filename(filename)
-        file.save(os.path.join(UPLOAD_DIR, filename))
-
-        file.seek(0)
-    else:
+    image_bytes = file.read()
+    # The bytes decide the format, the extension only has to agree with them.
+    image_info = sniff_image(image_bytes)
+    if image_info is None or not allowed_file(filename, image_info.mimetype):
         raise InvalidMediaFormatError()
 
     data = request.form
 
-    payload, status = collect_capture(data, file.read())
+    payload, status = collect_capture(data, image_bytes, image_info)
     return jsonify(payload), status
 
 
@@ -164,32 +341,216 @@ def get_raw_collection():
 
     if not game_id or not session_id:
         raise MissingCollectorParam("session_id and game_id are required")
+    size = _parse_preview_size(request.args.get("size"))
+
+    mimetype = formats.negotiate()
+    if mimetype != formats.JSON:
+        # Binary formats carry images as raw bytes, no base64 needed.
+        try:
+            return formats.stream_response(
+                mimetype,
+                _raw_collection_rows(game_id, session_id, size),
+                formats.RAW_CAPTURE_SCHEMA,
+                STREAM_FETCH_SIZE,
+            )
+        except Exception as e:
+            return jsonify(
+                {
+                    "error": "Client Side Error",
+                    "message": str(e),
+                    "type": type(e).__name__,
+                }
+            ), 400
 
     try:
-        with DatabaseConnection.get_connection() as conn:
-            with conn.cursor(row_factory=dict_row) as cur:
-                res = cur.execute(
-                    """SELECT
-                        captured_at,
-                        game_id,
-                        run_id,
-                        image_data,
-                        image_height,
-                        image_width
-                    FROM raw_capture
-                    WHERE game_id = %s and session_id = %s;
-                    """,
-                    (game_id, session_id),
-                ).fetchall()
-                conn.commit()
+        captures = repository.get_raw_collection(game_id, session_id)
     except Exception as e:
         return jsonify(
             {"error": "Client Side Error", "message": str(e), "type": type(e).__name__}
         ), 400
-    if res:
-        for row in res:
-            if row.get("image_data"):
-                # Convert bytes to base64 string
-                row["image_data"] = base64.b64encode(row["image_data"]).decode("utf-8")
+
+    res = []
+    for capture in captures:
+        row = asdict(capture)
+        image_data = _load_image(row, size)
+        if image_data:
+            # Convert bytes to base64 string
+            row["image_data"] = base64.b64encode(image_data).decode("utf-8")
+        elif size is not None:
+            row["image_data"] = None
+        if size is not None:
+            row["preview"] = image_data is not None
+        res.append(row)
 
     return jsonify({"data": res}), 200
+
+
+STREAM_FETCH_SIZE = 100
+
+
+def _raw_collection_rows(game_id, session_id, size=None):
+    with DatabaseConnection.get_connection() as conn:
+        for row in repository.iter_raw_collection(
+            conn, game_id, session_id, STREAM_FETCH_SIZE
+        ):
+            row["image_data"] = _load_image(row, size)
+            if size is not None:
+                row["preview"] = row["image_data"] is not None
+            yield row
+        conn.commit()
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+@Collector.route("/collect/stream", methods=["GET"])
+@swag_from("../docs/collection_stream_get.yml")
+def stream_raw_collection():
+    """
+    Streams captures as NDJSON, one row per line, straight from a server-side
+    cursor. Every row carries a `cursor` that can be passed back as `after`.
+    """
+    session_id = request.args.get("session_id")
+    game_id = request.args.get("game_id")
+
+    if not game_id or not session_id:
+        raise MissingCollectorParam("session_id and game_id are required")
+
+    limit = _parse_int(request.args.get("limit"), "limit")
+    if limit is not None and limit <= 0:
+        raise MissingCollectorParam("limit must be a positive integer")
+
+    after = request.args.get("after")
+    include_images = _parse_bool(request.args.get("include_images"))
+    size = _parse_preview_size(request.args.get("size"))
+
+    params = [game_id, session_id]
+    cursor = decode_cursor(after) if after else None
+    if cursor:
+        params.extend(cursor)
+    if limit is not None:
+        params.append(limit)
+
+    query = repository.raw_capture_stream_query(
+        include_images, bool(after), limit is not None
+    )
+
+    def generate():
+        try:
+            with DatabaseConnection.get_connection() as conn:
+                with conn.cursor(
+                    name=f"collect_stream_{uuid.uuid4().hex}", row_factory=dict_row
+                ) as cur:
+                    cur.itersize = STREAM_FETCH_SIZE
+                    cur.execute(query, params)
+                    # Captures moved to the cold tier, merged into the same order.
+                    archived = repository.archived_capture_stream(
+                        conn, game_id, session_id, include_images, cursor
+                    )
+                    rows = heapq.merge(
+                        archived,
+                        cur,
+                        key=lambda row: (row["captured_at"], row["capture_id"]),
+                    )
+                    for row in itertools.islice(rows, limit):
+                        if include_images:
+                            image_data = _load_image(row, size)
+                            row["image_data"] = (
+                                base64.b64encode(image_data).decode("utf-8")
+                                if image_data
+                                else None
+                            )
+                            if size is not None:
+                                row["preview"] = image_data is not None
+                        row["cursor"] = encode_cursor(
+                            row["captured_at"], row["capture_id"]
+                        )
+                        yield json.dumps(row, default=_json_default) + "\n"
+                conn.commit()
+        except Exception as e:
+            # Headers are already sent, so report failures in-band.
+            yield (
+                json.dumps(
+                    {
+                        "error": "Client Side Error",
+                        "message": str(e),
+                        "type": type(e).__name__,
+                    }
+                )
+                + "\n"
+            )
+
+    return Response(generate(), mimetype="application/x-ndjson")
+
+
+@Collector.route("/collect/<capture_id>/image", methods=["GET"])
+@swag_from("../docs/collect_image_get.yml")
+def get_capture_image(capture_id):
+    size = _parse_preview_size(request.args.get("size"))
+    try:
+        image = open_capture_preview(capture_id, size) if size is not None else None
+        # Until the preview is rendered, the original is served in its place.
+        fallback = size is not None and image is None
+        if image is None:
+            image = open_capture_image(capture_id)
+    except Exception as e:
+        return jsonify(
+            {"error": "Client Side Error", "message": str(e), "type": type(e).__name__}
+        ), 400
+
+    if image is None:
+        return jsonify({"error": "Capture image not found"}), 404
+
+    file, length, mimetype, etag = image
+    response = Response(
+        wrap_file(request.environ, file, buffer_size=IMAGE_CHUNK_SIZE),
+        mimetype=mimetype,
+        direct_passthrough=True,
+    )
+    response.content_length = length
+    response.set_etag(etag)
+    if fallback:
+        # The preview will replace it at this URL, so it must not be cached.
+        response.cache_control.no_cache = True
+    else:
+        # A capture's bytes never change once stored, nor do its previews.
+        response.cache_control.public = True
+        response.cache_control.max_age = 31536000
+        response.cache_control.immutable = True
+
+    # Handles If-None-Match (304) and Range (206) against the seekable file.
+    response = response.make_conditional(
+        request, accept_ranges=True, complete_length=length
+    )
+    if response.status_code == 304:
+        file.close()
+    return response
+
+
+@Collector.route("/collect/session/<session_id>/status", methods=["GET"])
+@swag_from("../docs/collect_session_status_get.yml")
+def get_session_status(session_id):
+    try:
+        limit = int(request.args.get("limit", SESSION_GAP_LIMIT))
+        if limit < 1:
+            raise ValueError("limit must be positive")
+        session = repository.get_capture_session(session_id)
+        gaps = repository.get_session_gaps(session_id, limit) if session else []
+    except Exception as e:
+        return jsonify(
+            {"error": "Client Side Error", "message": str(e), "type": type(e).__name__}
+        ), 400
+
+    if session is None:
+        return jsonify({"error": "Session not found"}), 404
+
+    return jsonify(
+        {
+            **asdict(session),
+            "missing": session.last_index - session.first_index + 1 - session.received,
+            "gaps": [list(gap) for gap in gaps],
+        }
+    ), 200
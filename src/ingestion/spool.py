@@ -0,0 +1,393 @@
+"""
+Write-ahead spool for captures.
+
+With CAPTURE_SPOOL_DIR set, a capture is acked once its raw_capture row is
+appended to a local log and fsync'd, instead of once Postgres has committed
+it. A drainer thread replays the log into raw_capture in batches, through
+the capture writer's COPY path. It deletes each segment once all of its rows
+have committed. Segments left behind by a crash are replayed when the process
+starts again. Images are already in the blob store by the time their row is
+spooled, so the log only holds metadata.
+
+The log is a directory of segments named `<seq>.log`. Each record is a
+`<length:u32><crc32:u32>` header followed by the row as a MessagePack array.
+A record whose length or checksum does not match is a torn write from a crash.
+That record was never acked, and it ends the segment.
+
+Replaying a segment twice is harmless. The writer claims
+(session_id, capture_index) keys, so rows that committed before a crash, but
+whose segment was not yet deleted, resolve as duplicates.
+
+Each process appends to its own slot directory under CAPTURE_SPOOL_DIR, held
+with flock, so workers never share a segment. A drainer also replays the
+slots that no running process holds, which recovers the segments of a worker
+that did not come back.
+"""
+
+import fcntl
+import itertools
+import os
+import queue
+import struct
+import threading
+import time
+import zlib
+from concurrent.futures import Future
+from datetime import datetime, timezone
+
+import msgpack
+import psycopg
+
+from src import metrics
+from src.ingestion.writer import CAPTURE_BATCH_SIZE, StoredCapture, capture_writer
+from src.repository import RAW_CAPTURE_COLUMNS
+
+# Empty disables the spool, and acks wait for Postgres.
+CAPTURE_SPOOL_DIR = os.environ.get("CAPTURE_SPOOL_DIR", "")
+CAPTURE_SPOOL_SEGMENT_SIZE = int(
+    os.environ.get("CAPTURE_SPOOL_SEGMENT_SIZE", str(64 * 1024 * 1024))
+)
+# How long the appender waits for more rows to share one fsync.
+CAPTURE_SPOOL_SYNC_DELAY = (
+    int(os.environ.get("CAPTURE_SPOOL_SYNC_DELAY_MS", "2")) / 1000
+)
+CAPTURE_SPOOL_DRAIN_INTERVAL = float(
+    os.environ.get("CAPTURE_SPOOL_DRAIN_INTERVAL", "1")
+)
+# How many recently spooled (session_id, capture_index) keys a process
+# remembers, so a retry is acked with the capture_id spooled first.
+CAPTURE_SPOOL_RECENT_KEYS = int(os.environ.get("CAPTURE_SPOOL_RECENT_KEYS", "65536"))
+
+_HEADER = struct.Struct("<II")
+_SESSION_ID = [name for name, _ in RAW_CAPTURE_COLUMNS].index("session_id")
+_CAPTURE_INDEX = [name for name, _ in RAW_CAPTURE_COLUMNS].index("capture_index")
+_REJECTED = "rejected.log"
+
+
+def encode_record(row):
+    # MessagePack timestamps need an aware datetime, stored ones are naive UTC.
+    values = [
+        value.replace(tzinfo=timezone.utc) if isinstance(value, datetime) else value
+        for value in row
+    ]
+    payload = msgpack.packb(values, datetime=True)
+    return _HEADER.pack(len(payload), zlib.crc32(payload)) + payload
+
+
+def read_records(path):
+    """
+    Yields the rows of a segment, in order, up to its first torn record.
+    """
+    with open(path, "rb") as f:
+        while header := f.read(_HEADER.size):
+            if len(header) < _HEADER.size:
+                break
+            length, checksum = _HEADER.unpack(header)
+            payload = f.read(length)
+            if len(payload) < length or zlib.crc32(payload) != checksum:
+                print(f"[spool] {path}: torn record, ignoring the rest.", flush=True)
+                break
+            values = msgpack.unpackb(payload, timestamp=3)
+            yield tuple(
+                value.replace(tzinfo=None) if isinstance(value, datetime) else value
+                for value in values
+            )
+
+
+class CaptureSpool:
+    """
+    Acks raw_capture rows once they are durable in the local spool, and
+    replays them into Postgres in the background. Has the same `submit` and
+    `submit_many` as CaptureWriter. Its futures resolve to a StoredCapture
+    with `spooled` set.
+
+    A retry of a key spooled recently by this process is not spooled again,
+    and is acked as a duplicate of the first. Otherwise `duplicate` is None,
+    since whether the key is already stored is only known at replay.
+    """
+
+    def __init__(
+        self,
+        root,
+        segment_size=CAPTURE_SPOOL_SEGMENT_SIZE,
+        sync_delay=CAPTURE_SPOOL_SYNC_DELAY,
+        drain_interval=CAPTURE_SPOOL_DRAIN_INTERVAL,
+        batch_size=CAPTURE_BATCH_SIZE,
+        writer=capture_writer,
+        recent_keys=CAPTURE_SPOOL_RECENT_KEYS,
+    ):
+        self.root = root
+        self.segment_size = segment_size
+        self.sync_delay = sync_delay
+        self.drain_interval = drain_interval
+        self.batch_size = batch_size
+        self.writer = writer
+        self.recent_keys = recent_keys
+        self.slot = None
+        self._slot_lock = None
+        self._queue = queue.Queue()
+        self._segment = None
+        self._segment_path = None
+        self._segment_lock = threading.Lock()
+        # Key -> capture_id of the latest spooled rows, oldest first.
+        self._recent = {}
+        self._started = False
+        self._lock = threading.Lock()
+        self._drain_lock = threading.Lock()
+
+    def start(self):
+        """
+        Claims a slot and starts the appender and the drainer. The drainer's
+        first pass replays whatever an earlier run left behind.
+        """
+        if self._started:
+            return
+
+        with self._lock:
+            if self._started:
+                return
+            os.makedirs(self.root, exist_ok=True)
+            self.slot, self._slot_lock = self._claim_slot()
+            print(f"[spool] appending to {self.slot}", flush=True)
+            for target, name in (
+                (self._run, "capture-spool"),
+                (self._drain_loop, "capture-spool-drainer"),
+            ):
+                threading.Thread(target=target, name=name, daemon=True).start()
+            self._started = True
+
+    def submit(self, row):
+        return self.submit_many([row])[0]
+
+    def submit_many(self, rows):
+        self.start()
+        entries = [(row, Future()) for row in rows]
+        if entries:
+            self._queue.put(entries)
+        return [future for _, future in entries]
+
+    def _claim_slot(self):
+        for number in itertools.count():
+            slot = os.path.join(self.root, str(number))
+            lock = self._try_lock(slot)
+            if lock is not None:
+                return slot, lock
+
+    @staticmethod
+    def _try_lock(slot):
+        os.makedirs(slot, exist_ok=True)
+        lock = open(os.path.join(slot, "lock"), "a")
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lock.close()
+            return None
+        return lock
+
+    def _run(self):
+        while True:
+            batch = list(self._queue.get())
+            deadline = time.monotonic() + self.sync_delay
+
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.extend(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            self._append(batch)
+
+    def _append(self, batch):
+        try:
+            with self._segment_lock:
+                first_ids = self._first_ids(row for row, _ in batch)
+                spooled = [
+                    row for row, _ in batch if _first_id(first_ids, row) == row[0]
+                ]
+                self._write(spooled)
+                self._remember(spooled)
+        except Exception as e:
+            # The segment may end in a torn record now, start a new one.
+            with self._segment_lock:
+                self._close_segment()
+            for _, future in batch:
+                future.set_exception(e)
+            return
+
+        for row, future in batch:
+            capture_id = _first_id(first_ids, row)
+            future.set_result(
+                StoredCapture(
+                    capture_id=capture_id,
+                    duplicate=True if capture_id != row[0] else None,
+                    session_id=row[_SESSION_ID],
+                    missing=None,
+                    gaps=(),
+                    spooled=True,
+                )
+            )
+
+    def _first_ids(self, rows):
+        """
+        The capture_id each key of `rows` was first spooled with, by this
+        process, either earlier or within `rows`.
+        """
+        first_ids = {}
+        for row in rows:
+            key = _capture_key(row)
+            if key is not None and key not in first_ids:
+                first_ids[key] = self._recent.get(key, row[0])
+        return first_ids
+
+    def _write(self, rows):
+        if not rows:
+            return
+        if self._segment is None:
+            self._open_segment()
+        # One write and one fsync for the whole batch.
+        self._segment.write(b"".join(encode_record(row) for row in rows))
+        self._segment.flush()
+        os.fsync(self._segment.fileno())
+        if self._segment.tell() >= self.segment_size:
+            self._close_segment()
+
+    def _remember(self, rows):
+        for row in rows:
+            key = _capture_key(row)
+            if key is not None:
+                self._recent[key] = row[0]
+        # Dicts keep insertion order, so the oldest keys are forgotten first.
+        while len(self._recent) > self.recent_keys:
+            del self._recent[next(iter(self._recent))]
+
+    def _open_segment(self):
+        # Segment numbers come from the clock, so they keep increasing across
+        # restarts and replays happen in order.
+        self._segment_path = os.path.join(self.slot, f"{time.time_ns():020d}.log")
+        self._segment = open(self._segment_path, "xb")
+        _fsync_dir(self.slot)
+
+    def _close_segment(self):
+        if self._segment is not None:
+            try:
+                self._segment.close()
+            except OSError:
+                pass
+        self._segment = None
+        self._segment_path = None
+
+    def _sealed_segments(self, slot):
+        """
+        Segments of `slot` that are no longer appended to, oldest first.
+
+        The slot is listed under the same lock as the appender's, so a segment
+        it opens afterwards is never part of the snapshot, and never replayed
+        or deleted while it is still being written.
+        """
+        with self._segment_lock:
+            active = None
+            if slot == self.slot and self._segment is not None:
+                if self._segment.tell() == 0:
+                    active = self._segment_path
+                else:
+                    # Seal the active segment, so rows never wait for it to fill.
+                    self._close_segment()
+            return [
+                os.path.join(slot, name)
+                for name in sorted(os.listdir(slot))
+                if name.endswith(".log")
+                and name != _REJECTED
+                and os.path.join(slot, name) != active
+            ]
+
+    def _drain_loop(self):
+        while True:
+            try:
+                self.drain()
+            except psycopg.OperationalError as e:
+                print(f"[spool] database unavailable, will retry: {e}", flush=True)
+            except Exception as e:
+                print(f"[spool] drain failed, will retry: {e!r}", flush=True)
+            time.sleep(self.drain_interval)
+
+    def drain(self):
+        """
+        Replays every sealed segment of this process's slot, and of slots no
+        running process holds, into raw_capture. Returns the number of rows
+        replayed.
+        """
+        with self._drain_lock:
+            replayed = self._drain_slot(self.slot)
+
+            for name in sorted(os.listdir(self.root)):
+                slot = os.path.join(self.root, name)
+                if slot == self.slot or not os.path.isdir(slot):
+                    continue
+                lock = self._try_lock(slot)
+                if lock is None:
+                    continue
+                with lock:
+                    replayed += self._drain_slot(slot)
+
+            metrics.SPOOL_BYTES.set(_slot_size(self.slot))
+            return replayed
+
+    def _drain_slot(self, slot):
+        replayed = 0
+        for path in self._sealed_segments(slot):
+            for rows in itertools.batched(read_records(path), self.batch_size):
+                self._replay(slot, rows)
+                replayed += len(rows)
+            os.unlink(path)
+            _fsync_dir(slot)
+        return replayed
+
+    def _replay(self, slot, rows):
+        outcomes = self.writer.write_batch(list(rows))
+        rejected = [
+            (row, outcome)
+            for row, outcome in zip(rows, outcomes)
+            if isinstance(outcome, Exception)
+        ]
+        if not rejected:
+            return
+
+        # Kept aside rather than retried forever, a bad row would block the log.
+        with open(os.path.join(slot, _REJECTED), "ab") as f:
+            for row, error in rejected:
+                print(f"[spool] rejected capture {row[0]}: {error}", flush=True)
+                f.write(encode_record(row))
+            f.flush()
+            os.fsync(f.fileno())
+
+
+def _capture_key(row):
+    if row[_CAPTURE_INDEX] is None:
+        return None
+    return row[_SESSION_ID], row[_CAPTURE_INDEX]
+
+
+def _first_id(first_ids, row):
+    return first_ids.get(_capture_key(row), row[0])
+
+
+def _fsync_dir(path):
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _slot_size(slot):
+    return sum(
+        entry.stat().st_size
+        for entry in os.scandir(slot)
+        if entry.name.endswith(".log") and entry.name != _REJECTED
+    )
+
+
+capture_spool = CaptureSpool(CAPTURE_SPOOL_DIR) if CAPTURE_SPOOL_DIR else None
@@ -0,0 +1,117 @@
+from flasgger import swag_from
+from flask import Blueprint, jsonify, request
+
+from src import metrics
+from src.errors import BlobStorageError, InvalidMediaFormatError, MissingCollectorParam
+from src.ingestion.collector import build_capture_row, submit_capture_row
+from src.storage.blob import blob_store
+from src.storage.upload import upload_staging
+from src.util import IMAGE_SNIFF_SIZE, sniff_image
+
+Uploads = Blueprint("uploads", __name__)
+
+
+def _upload_status(upload):
+    response = jsonify(
+        {
+            "upload_id": upload.upload_id,
+            "offset": upload.offset,
+            "length": upload.length,
+            "capture_id": upload.capture_id,
+        }
+    )
+    response.headers["Upload-Offset"] = str(upload.offset)
+    if upload.length is not None:
+        response.headers["Upload-Length"] = str(upload.length)
+    response.cache_control.no_store = True
+    return response
+
+
+def _header_int(name, required=False):
+    value = request.headers.get(name)
+    if value is None:
+        if required:
+            raise MissingCollectorParam(f"{name} header is required")
+        return None
+    try:
+        return int(value)
+    except ValueError as exc:
+        raise MissingCollectorParam(f"{name} must be an integer") from exc
+
+
+@Uploads.route("/uploads", methods=["POST"])
+@swag_from("../docs/upload_create.yml")
+def create_upload():
+    data = request.get_json(silent=True) or {}
+    length = data.get("length", _header_int("Upload-Length"))
+    if length is not None and not isinstance(length, int):
+        raise MissingCollectorParam("length must be an integer")
+
+    upload_id = upload_staging.create(length)
+    with upload_staging.open(upload_id) as upload:
+        response = _upload_status(upload)
+    response.status_code = 201
+    response.headers["Location"] = f"{request.path}/{upload_id}"
+    return response
+
+
+@Uploads.route("/uploads/<upload_id>", methods=["GET"])
+@swag_from("../docs/upload_get.yml")
+def get_upload(upload_id):
+    # HEAD is served by this route too, with the same headers.
+    with upload_staging.open(upload_id) as upload:
+        return _upload_status(upload)
+
+
+@Uploads.route("/uploads/<upload_id>", methods=["PATCH"])
+@swag_from("../docs/upload_patch.yml")
+def append_upload(upload_id):
+    offset = _header_int("Upload-Offset", required=True)
+
+    with upload_staging.open(upload_id) as upload:
+        # The body goes straight to the part file, it is never buffered whole.
+        with metrics.phase(metrics.PHASE_STORAGE):
+            upload.append(offset, request.stream)
+        return _upload_status(upload)
+
+
+@Uploads.route("/uploads/<upload_id>/finalize", methods=["POST"])
+@swag_from("../docs/upload_finalize.yml")
+def finalize_upload(upload_id):
+    data = request.get_json(silent=True) or {}
+
+    with upload_staging.open(upload_id) as upload:
+        if upload.capture_id:
+            # A retry after a lost response.
+            return jsonify(
+                {
+                    "message": "File uploaded successfully",
+                    "capture_id": upload.capture_id,
+                }
+            ), 200
+
+        screenshot_ref = upload.seal()
+        image_info = sniff_image(upload.header(IMAGE_SNIFF_SIZE))
+        if image_info is None:
+            raise InvalidMediaFormatError()
+
+        row = build_capture_row(
+            data, None, screenshot_ref=screenshot_ref, image_info=image_info
+        )
+        try:
+            with metrics.phase(metrics.PHASE_STORAGE):
+                blob_store.put_file(upload.path, screenshot_ref)
+        except OSError as e:
+            raise BlobStorageError(str(e)) from e
+
+        payload, status = submit_capture_row(row, upload.length)
+        if status == 200:
+            upload.complete(payload["capture_id"])
+    return jsonify(payload), status
+
+
+@Uploads.route("/uploads/<upload_id>", methods=["DELETE"])
+@swag_from("../docs/upload_delete.yml")
+def abort_upload(upload_id):
+    upload_staging.abort(upload_id)
+    return jsonify({"message": "Upload aborted", "upload_id": upload_id}), 200
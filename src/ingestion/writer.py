@@ -0,0 +1,420 @@
+import asyncio
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from dataclasses import dataclass
+
+import psycopg
+
+from src.db import AsyncDatabaseConnection, DatabaseConnection
+from src.pipeline.jobs import (
+    enqueue_jobs,
+    enqueue_jobs_async,
+    enqueue_previews,
+    enqueue_previews_async,
+)
+from src.repository import (
+    CLAIM_CAPTURE_KEYS,
+    COPY_RAW_CAPTURE,
+    INSERT_RAW_CAPTURE,
+    RAW_CAPTURE_COLUMNS,
+    SELECT_CAPTURE_KEYS,
+    SELECT_SESSION_GAPS,
+    TRACK_CAPTURE_SESSIONS,
+    TRACK_RUN_CAPTURES,
+)
+
+CAPTURE_BATCH_SIZE = int(os.environ.get("CAPTURE_BATCH_SIZE", "200"))
+CAPTURE_BATCH_DELAY = int(os.environ.get("CAPTURE_BATCH_DELAY_MS", "20")) / 1000
+CAPTURE_ACK_TIMEOUT = float(os.environ.get("CAPTURE_ACK_TIMEOUT", "30"))
+# Most missing-index ranges reported per session in an ack.
+SESSION_GAP_LIMIT = int(os.environ.get("SESSION_GAP_LIMIT", "100"))
+
+_COLUMN_INDEX = {name: index for index, (name, _) in enumerate(RAW_CAPTURE_COLUMNS)}
+
+
+@dataclass(slots=True, frozen=True)
+class StoredCapture:
+    """What a submitted row resolved to once its batch committed."""
+
+    # The original capture_id when the row repeated a stored
+    # (session_id, capture_index).
+    capture_id: str
+    # None when spooled and not yet known.
+    duplicate: bool | None
+    session_id: str
+    # Indices missing between the session's first and last received one, and
+    # the first SESSION_GAP_LIMIT of those ranges as (start, end) pairs.
+    missing: int | None
+    gaps: tuple
+    # Acked from the local spool, before the row reached Postgres. Whether it
+    # repeats a stored key, and the session's gaps, are not known yet.
+    spooled: bool = False
+
+
+class CaptureWriter:
+    """
+    Buffers raw_capture rows and writes them with one binary COPY per batch.
+
+    A batch is flushed once it holds `batch_size` rows or `batch_delay` seconds
+    after its first row arrived, whichever comes first. Each submitted row gets
+    a Future that resolves only after the batch containing it has committed.
+
+    Ingest is idempotent on (session_id, capture_index): rows whose key is
+    already stored are not written again, and resolve to the original
+    capture_id. Only the new captures are added to run_summary.
+    """
+
+    def __init__(self, batch_size=CAPTURE_BATCH_SIZE, batch_delay=CAPTURE_BATCH_DELAY):
+        self.batch_size = batch_size
+        self.batch_delay = batch_delay
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def submit(self, row):
+        """
+        Queue a row (ordered as RAW_CAPTURE_COLUMNS) and return a Future that
+        resolves to a StoredCapture once committed.
+        """
+        return self.submit_many([row])[0]
+
+    def submit_many(self, rows):
+        """
+        Queue several rows at once. They are guaranteed to land in the same
+        batch, and so the same COPY transaction, unless that batch fails and
+        falls back to per-row inserts.
+        """
+        self._ensure_started()
+        entries = [(row, Future()) for row in rows]
+        if entries:
+            self._queue.put(entries)
+        return [future for _, future in entries]
+
+    def _ensure_started(self):
+        if self._thread is not None:
+            return
+
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="capture-writer", daemon=True
+                )
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            batch = list(self._queue.get())
+            deadline = time.monotonic() + self.batch_delay
+
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.extend(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            self._flush(batch)
+
+    def _flush(self, batch):
+        try:
+            outcomes = self.write_batch([row for row, _ in batch])
+        except psycopg.OperationalError as e:
+            # The connection itself is unusable, retrying row by row won't help.
+            for _, future in batch:
+                future.set_exception(e)
+            return
+
+        for (_, future), outcome in zip(batch, outcomes):
+            if isinstance(outcome, Exception):
+                future.set_exception(outcome)
+            else:
+                future.set_result(outcome)
+
+    def write_batch(self, rows):
+        """
+        Writes rows in one COPY transaction, now, and returns per row either
+        its StoredCapture or the exception that kept it out. Raises
+        psycopg.OperationalError when the database cannot be reached.
+        """
+        try:
+            return self._write_rows(rows, use_copy=True)
+        except psycopg.OperationalError:
+            raise
+        except Exception:
+            # A single bad row aborts the whole COPY, so fall back to one insert
+            # per row to give every row its own outcome.
+            outcomes = []
+            for row in rows:
+                try:
+                    (result,) = self._write_rows([row], use_copy=False)
+                except psycopg.OperationalError:
+                    raise
+                except Exception as e:
+                    outcomes.append(e)
+                else:
+                    outcomes.append(result)
+            return outcomes
+
+    @staticmethod
+    def _write_rows(rows, use_copy):
+        unique = _unique_rows(rows)
+        with DatabaseConnection.get_connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute(CLAIM_CAPTURE_KEYS, _key_params(unique, True), prepare=True)
+                claimed = {capture_id for (capture_id,) in cur.fetchall()}
+                new_rows = [row for row in unique if row[0] in claimed]
+
+                if new_rows and use_copy:
+                    with cur.copy(COPY_RAW_CAPTURE) as copy:
+                        copy.set_types(
+                            [type_name for _, type_name in RAW_CAPTURE_COLUMNS]
+                        )
+                        for row in new_rows:
+                            copy.write_row(row)
+                else:
+                    for row in new_rows:
+                        cur.execute(INSERT_RAW_CAPTURE, row, prepare=True)
+                enqueue_jobs(cur, _job_keys(new_rows))
+                enqueue_previews(cur, _screenshot_refs(new_rows))
+                run_params = _run_params(new_rows)
+                if run_params[0]:
+                    cur.execute(TRACK_RUN_CAPTURES, run_params, prepare=True)
+
+                stored = {_key(row): row[0] for row in new_rows}
+                if len(new_rows) < len(unique):
+                    duplicates = [row for row in unique if row[0] not in claimed]
+                    cur.execute(
+                        SELECT_CAPTURE_KEYS, _key_params(duplicates), prepare=True
+                    )
+                    stored.update(
+                        ((session_id, index), capture_id)
+                        for session_id, index, capture_id in cur.fetchall()
+                    )
+
+                cur.execute(
+                    TRACK_CAPTURE_SESSIONS,
+                    _track_params(unique, claimed),
+                    prepare=True,
+                )
+                missing = dict(cur.fetchall())
+                gaps = {}
+                for session_id, count in missing.items():
+                    if count > 0:
+                        cur.execute(
+                            SELECT_SESSION_GAPS,
+                            (session_id, SESSION_GAP_LIMIT),
+                            prepare=True,
+                        )
+                        gaps[session_id] = tuple(cur.fetchall())
+            conn.commit()
+        return _results(rows, stored, missing, gaps)
+
+
+class AsyncCaptureWriter:
+    """
+    The asyncio counterpart of CaptureWriter, with the same batching rules,
+    SQL and per-row fallback, running on AsyncDatabaseConnection.
+    """
+
+    def __init__(self, batch_size=CAPTURE_BATCH_SIZE, batch_delay=CAPTURE_BATCH_DELAY):
+        self.batch_size = batch_size
+        self.batch_delay = batch_delay
+        self._queue = None
+        self._task = None
+
+    def submit_many(self, rows):
+        """
+        Queue rows from within the running loop and return one asyncio Future
+        per row, resolved with a StoredCapture once committed.
+        """
+        loop = asyncio.get_running_loop()
+        if self._task is None or self._task.done():
+            self._queue = asyncio.Queue()
+            self._task = loop.create_task(self._run())
+
+        entries = [(row, loop.create_future()) for row in rows]
+        if entries:
+            self._queue.put_nowait(entries)
+        return [future for _, future in entries]
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = list(await self._queue.get())
+            deadline = loop.time() + self.batch_delay
+
+            while len(batch) < self.batch_size:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.extend(await asyncio.wait_for(self._queue.get(), remaining))
+                except TimeoutError:
+                    break
+
+            await self._flush(batch)
+
+    async def _flush(self, batch):
+        try:
+            results = await self._write_rows([row for row, _ in batch], use_copy=True)
+        except psycopg.OperationalError as e:
+            for _, future in batch:
+                _set_exception(future, e)
+            return
+        except Exception:
+            for row, future in batch:
+                try:
+                    (result,) = await self._write_rows([row], use_copy=False)
+                except Exception as e:
+                    _set_exception(future, e)
+                else:
+                    _set_result(future, result)
+            return
+
+        for (_, future), result in zip(batch, results):
+            _set_result(future, result)
+
+    @staticmethod
+    async def _write_rows(rows, use_copy):
+        unique = _unique_rows(rows)
+        async with AsyncDatabaseConnection.get_connection() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(
+                    CLAIM_CAPTURE_KEYS, _key_params(unique, True), prepare=True
+                )
+                claimed = {capture_id for (capture_id,) in await cur.fetchall()}
+                new_rows = [row for row in unique if row[0] in claimed]
+
+                if new_rows and use_copy:
+                    async with cur.copy(COPY_RAW_CAPTURE) as copy:
+                        copy.set_types(
+                            [type_name for _, type_name in RAW_CAPTURE_COLUMNS]
+                        )
+                        for row in new_rows:
+                            await copy.write_row(row)
+                else:
+                    for row in new_rows:
+                        await cur.execute(INSERT_RAW_CAPTURE, row, prepare=True)
+                await enqueue_jobs_async(cur, _job_keys(new_rows))
+                await enqueue_previews_async(cur, _screenshot_refs(new_rows))
+                run_params = _run_params(new_rows)
+                if run_params[0]:
+                    await cur.execute(TRACK_RUN_CAPTURES, run_params, prepare=True)
+
+                stored = {_key(row): row[0] for row in new_rows}
+                if len(new_rows) < len(unique):
+                    duplicates = [row for row in unique if row[0] not in claimed]
+                    await cur.execute(
+                        SELECT_CAPTURE_KEYS, _key_params(duplicates), prepare=True
+                    )
+                    stored.update(
+                        ((session_id, index), capture_id)
+                        for session_id, index, capture_id in await cur.fetchall()
+                    )
+
+                await cur.execute(
+                    TRACK_CAPTURE_SESSIONS,
+                    _track_params(unique, claimed),
+                    prepare=True,
+                )
+                missing = dict(await cur.fetchall())
+                gaps = {}
+                for session_id, count in missing.items():
+                    if count > 0:
+                        await cur.execute(
+                            SELECT_SESSION_GAPS,
+                            (session_id, SESSION_GAP_LIMIT),
+                            prepare=True,
+                        )
+                        gaps[session_id] = tuple(await cur.fetchall())
+            await conn.commit()
+        return _results(rows, stored, missing, gaps)
+
+
+def _key(row):
+    return (
+        row[_COLUMN_INDEX["session_id"]],
+        row[_COLUMN_INDEX["capture_index"]],
+    )
+
+
+def _unique_rows(rows):
+    """The first row of each (session_id, capture_index) key, in key order."""
+    unique = {}
+    for row in rows:
+        unique.setdefault(_key(row), row)
+    return [unique[key] for key in sorted(unique)]
+
+
+def _key_params(rows, with_capture_id=False):
+    params = (
+        [row[_COLUMN_INDEX["session_id"]] for row in rows],
+        [row[_COLUMN_INDEX["capture_index"]] for row in rows],
+    )
+    if with_capture_id:
+        params += ([row[0] for row in rows],)
+    return params
+
+
+def _track_params(rows, claimed):
+    return _key_params(rows) + ([row[0] in claimed for row in rows],)
+
+
+def _run_params(rows):
+    """Run ids and capture times of the rows that belong to a run."""
+    rows = [row for row in rows if row[_COLUMN_INDEX["run_id"]] is not None]
+    return (
+        [row[_COLUMN_INDEX["run_id"]] for row in rows],
+        [row[_COLUMN_INDEX["captured_at"]] for row in rows],
+    )
+
+
+def _results(rows, stored, missing, gaps):
+    results = []
+    for row in rows:
+        key = _key(row)
+        session_id = key[0]
+        results.append(
+            StoredCapture(
+                capture_id=stored[key],
+                duplicate=stored[key] != row[0],
+                session_id=session_id,
+                missing=missing.get(session_id, 0),
+                gaps=gaps.get(session_id, ()),
+            )
+        )
+    return results
+
+
+def _job_keys(rows):
+    return [
+        (
+            row[_COLUMN_INDEX["capture_id"]],
+            row[_COLUMN_INDEX["game_id"]],
+            row[_COLUMN_INDEX["run_id"]],
+        )
+        for row in rows
+    ]
+
+
+def _screenshot_refs(rows):
+    return [row[_COLUMN_INDEX["screenshot_ref"]] for row in rows]
+
+
+def _set_result(future, value):
+    # The caller may have timed out and cancelled its future.
+    if not future.done():
+        future.set_result(value)
+
+
+def _set_exception(future, error):
+    if not future.done():
+        future.set_exception(error)
+
+
+capture_writer = CaptureWriter()
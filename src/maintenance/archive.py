@@ -0,0 +1,171 @@
+"""
+Moves captures older than a cutoff out of raw_capture into compressed,
+append-only segments in the archive store. Archived captures are still
+served by GET /collect, /collect/stream and /collect/<capture_id>/image.
+
+    uv run python -m src.maintenance.archive --older-than-days 30
+
+Run it from cron, or keep it running with `--every 3600`. Requires
+db/migrations/002_raw_capture_archive.sql.
+"""
+
+import argparse
+import os
+import time
+from datetime import datetime, timedelta, timezone
+
+import psycopg
+from dotenv import load_dotenv
+from psycopg.rows import dict_row
+
+from src.storage.archive import archive_store
+
+RAW_CAPTURE_ARCHIVE_AFTER_DAYS = int(
+    os.environ.get("RAW_CAPTURE_ARCHIVE_AFTER_DAYS", "30")
+)
+ARCHIVE_SEGMENT_MAX_CAPTURES = int(
+    os.environ.get("ARCHIVE_SEGMENT_MAX_CAPTURES", "5000")
+)
+
+SELECT_ARCHIVABLE_SESSIONS = """SELECT DISTINCT game_id, session_id
+    FROM raw_capture
+    WHERE captured_at < %s;
+    """
+
+# SKIP LOCKED lets several archivers run at once without archiving a capture
+# twice.
+SELECT_ARCHIVABLE_CAPTURES = """SELECT *
+    FROM raw_capture
+    WHERE game_id = %s AND session_id = %s AND captured_at < %s
+    ORDER BY captured_at, capture_id
+    LIMIT %s
+    FOR UPDATE SKIP LOCKED;
+    """
+
+INSERT_SEGMENT = """INSERT INTO raw_capture_segment (
+        segment_id,
+        game_id,
+        session_id,
+        first_captured_at,
+        last_captured_at,
+        capture_count,
+        byte_size
+    )
+    VALUES (%s, %s, %s, %s, %s, %s, %s);
+    """
+
+INSERT_ARCHIVED_CAPTURES = """INSERT INTO raw_capture_archive (capture_id, segment_id)
+    SELECT unnest(%s::varchar[]), %s;
+    """
+
+DELETE_ARCHIVED_CAPTURES = """DELETE FROM raw_capture
+    WHERE capture_id = ANY(%s) AND captured_at < %s;
+    """
+
+
+def archive_session(conn, store, game_id, session_id, cutoff, max_captures):
+    """
+    Archives the captures of one session taken before `cutoff`, up to
+    `max_captures` per segment. Returns the number of captures archived.
+
+    `conn` must be in autocommit mode, so that every segment commits in its
+    own transaction.
+    """
+    archived = 0
+    while True:
+        segment_id = None
+        try:
+            with conn.transaction(), conn.cursor(row_factory=dict_row) as cur:
+                rows = cur.execute(
+                    SELECT_ARCHIVABLE_CAPTURES,
+                    (game_id, session_id, cutoff, max_captures),
+                ).fetchall()
+                if not rows:
+                    break
+
+                segment_id, byte_size = store.write_segment(
+                    (row, row.pop("image_data", None)) for row in rows
+                )
+                capture_ids = [row["capture_id"] for row in rows]
+                cur.execute(
+                    INSERT_SEGMENT,
+                    (
+                        segment_id,
+                        game_id,
+                        session_id,
+                        rows[0]["captured_at"],
+                        rows[-1]["captured_at"],
+                        len(rows),
+                        byte_size,
+                    ),
+                )
+                cur.execute(INSERT_ARCHIVED_CAPTURES, (capture_ids, segment_id))
+                cur.execute(DELETE_ARCHIVED_CAPTURES, (capture_ids, cutoff))
+        except BaseException:
+            # Nothing references the segment unless the transaction committed.
+            if segment_id:
+                store.delete_segment(segment_id)
+            raise
+
+        archived += len(rows)
+        print(
+            f"[archive] {game_id}/{session_id}: {len(rows)} captures "
+            f"-> segment {segment_id} ({byte_size} bytes)",
+            flush=True,
+        )
+        if len(rows) < max_captures:
+            break
+    return archived
+
+
+def archive_captures(conn, store, older_than_days, max_captures, now=None):
+    """Archives every capture older than `older_than_days`. Returns the count."""
+    now = now or datetime.now(timezone.utc).replace(tzinfo=None)
+    cutoff = now - timedelta(days=older_than_days)
+
+    sessions = conn.execute(SELECT_ARCHIVABLE_SESSIONS, (cutoff,)).fetchall()
+    return sum(
+        archive_session(conn, store, game_id, session_id, cutoff, max_captures)
+        for game_id, session_id in sessions
+    )
+
+
+def main():
+    load_dotenv()
+
+    parser = argparse.ArgumentParser(
+        description="Move old raw_capture rows to the archive store."
+    )
+    parser.add_argument(
+        "--older-than-days", type=float, default=RAW_CAPTURE_ARCHIVE_AFTER_DAYS
+    )
+    parser.add_argument(
+        "--segment-size",
+        type=int,
+        default=ARCHIVE_SEGMENT_MAX_CAPTURES,
+        help="maximum captures per segment",
+    )
+    parser.add_argument(
+        "--every",
+        type=float,
+        help="keep running, repeating every this many seconds",
+    )
+    args = parser.parse_args()
+
+    conn_str = os.environ.get("PGSQL_CONN")
+    if not conn_str:
+        raise ValueError("PGSQL_CONN environment variable is not set")
+
+    while True:
+        with psycopg.connect(conn_str, autocommit=True) as conn:
+            total = archive_captures(
+                conn, archive_store, args.older_than_days, args.segment_size
+            )
+        print(f"[archive] archived {total} captures", flush=True)
+        if not args.every:
+            break
+        time.sleep(args.every)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+Deletes blobs that no capture references.
+
+    uv run python -m src.maintenance.blobs --dry-run
+    uv run python -m src.maintenance.blobs --grace-hours 24
+
+Images are written to the blob store before their raw_capture row is
+inserted. When the insert fails, or the capture turns out to be a duplicate,
+the blob is left behind. It cannot be deleted right away: blobs are shared
+by content, and another capture may be about to reference the same one.
+
+A blob is collected once it is older than the grace period and neither a
+live nor an archived capture references it. Previews go with their original.
+Storing a blob again refreshes its age, so a capture that reuses an old blob
+keeps it. The grace period must outlast the longest wait between storing an
+image and committing its row, including rows held in CAPTURE_SPOOL_DIR while
+Postgres is down.
+"""
+
+import argparse
+import os
+import time
+
+import psycopg
+from dotenv import load_dotenv
+
+from src.storage.archive import archive_store
+from src.storage.blob import blob_store
+
+BLOB_GC_GRACE_HOURS = float(os.environ.get("BLOB_GC_GRACE_HOURS", "24"))
+
+SELECT_LIVE_REFS = """SELECT DISTINCT screenshot_ref
+    FROM raw_capture
+    WHERE screenshot_ref IS NOT NULL;
+    """
+
+SELECT_SEGMENT_IDS = "SELECT segment_id FROM raw_capture_segment;"
+
+
+def referenced_blobs(conn, store):
+    """Returns the screenshot_ref of every live and archived capture."""
+    # Live captures are read first, so a capture archived meanwhile is found
+    # in its segment.
+    refs = set()
+    with conn.transaction(), conn.cursor("blob_refs") as cur:
+        cur.execute(SELECT_LIVE_REFS)
+        refs.update(ref for (ref,) in cur)
+    for (segment_id,) in conn.execute(SELECT_SEGMENT_IDS).fetchall():
+        for row in store.read_segment(segment_id):
+            if row.get("screenshot_ref"):
+                refs.add(row["screenshot_ref"])
+    return refs
+
+
+def collect_blobs(conn, blobs, archive, grace_seconds, dry_run=False, now=None):
+    """
+    Deletes every unreferenced blob last written more than `grace_seconds`
+    ago. Returns the number of blobs deleted, or that would be.
+    """
+    written_before = (now or time.time()) - grace_seconds
+    refs = referenced_blobs(conn, archive)
+
+    deleted = 0
+    for key in blobs.iter_keys(written_before):
+        # Previews are keyed `<screenshot_ref>.<size>.webp`.
+        if key.split(".", 1)[0] in refs:
+            continue
+        if dry_run or blobs.delete(key, written_before):
+            deleted += 1
+    return deleted
+
+
+def main():
+    load_dotenv()
+
+    parser = argparse.ArgumentParser(
+        description="Delete blobs that no live or archived capture references."
+    )
+    parser.add_argument(
+        "--grace-hours",
+        type=float,
+        default=BLOB_GC_GRACE_HOURS,
+        help="only delete blobs last written longer ago than this",
+    )
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="count unreferenced blobs without deleting them",
+    )
+    args = parser.parse_args()
+
+    conn_str = os.environ.get("PGSQL_CONN")
+    if not conn_str:
+        raise ValueError("PGSQL_CONN environment variable is not set")
+
+    with psycopg.connect(conn_str, autocommit=True) as conn:
+        total = collect_blobs(
+            conn, blob_store, archive_store, args.grace_hours * 3600, args.dry_run
+        )
+    verb = "would delete" if args.dry_run else "deleted"
+    print(f"[blobs] {verb} {total} unreferenced blobs", flush=True)
+
+
+if __name__ == "__main__":
+    main()
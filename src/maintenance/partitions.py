@@ -0,0 +1,300 @@
+"""
+Keeps raw_capture's time partitions ahead of the clock and drops (or
+detaches) the ones past retention.
+
+    uv run python -m src.maintenance.partitions --ahead 3 --retention-days 180
+
+Run it from cron, or keep it running with `--every 3600`. Requires
+db/migrations/001_partition_raw_capture.sql.
+"""
+
+import argparse
+import os
+import re
+import time
+from datetime import datetime, timedelta, timezone
+
+import psycopg
+from dotenv import load_dotenv
+from psycopg import sql
+
+PARENT = "raw_capture"
+DEFAULT_PARTITION = "raw_capture_default"
+
+RAW_CAPTURE_PARTITION_INTERVAL = os.environ.get(
+    "RAW_CAPTURE_PARTITION_INTERVAL", "month"
+)
+RAW_CAPTURE_PARTITIONS_AHEAD = int(os.environ.get("RAW_CAPTURE_PARTITIONS_AHEAD", "3"))
+RAW_CAPTURE_RETENTION_DAYS = os.environ.get("RAW_CAPTURE_RETENTION_DAYS")
+
+_BOUND_RE = re.compile(r"FROM \((?:'([^']*)'|MINVALUE)\) TO \((?:'([^']*)'|MAXVALUE)\)")
+
+SELECT_PARTITIONS = """SELECT
+        child.relname,
+        pg_get_expr(child.relpartbound, child.oid)
+    FROM pg_inherits
+    JOIN pg_class AS child ON child.oid = pg_inherits.inhrelid
+    WHERE pg_inherits.inhparent = %s::regclass;
+    """
+
+SELECT_SCHEMA = """SELECT relnamespace::regnamespace::text
+    FROM pg_class
+    WHERE oid = %s::regclass;
+    """
+
+HAS_CAPTURE_KEY = "SELECT to_regclass('capture_key') IS NOT NULL;"
+
+# The keys of an expiring partition's captures, so a retry of one is stored
+# again instead of being acked with a capture_id that no longer exists.
+# Keys of archived captures stay, their rows are not in the partition.
+DELETE_EXPIRED_KEYS = """DELETE FROM capture_key
+    USING {partition} AS expired
+    WHERE capture_key.session_id = expired.session_id
+        AND capture_key.capture_index = expired.capture_index
+        AND capture_key.capture_id = expired.capture_id
+    RETURNING capture_key.session_id;
+    """
+
+# Locked first, in the capture writer's order, so captures of these sessions
+# committed meanwhile are counted once: either here or by their own upsert.
+LOCK_CAPTURE_SESSIONS = """SELECT 1
+    FROM capture_session
+    WHERE session_id = ANY(%(session_ids)s)
+    ORDER BY session_id
+    FOR UPDATE;
+    """
+
+REFRESH_CAPTURE_SESSIONS = """WITH remaining AS (
+        SELECT
+            session_id,
+            count(*) AS received,
+            min(capture_index) AS first_index,
+            max(capture_index) AS last_index
+        FROM capture_key
+        WHERE session_id = ANY(%(session_ids)s)
+        GROUP BY session_id
+    ), emptied AS (
+        DELETE FROM capture_session
+        WHERE session_id = ANY(%(session_ids)s)
+            AND session_id NOT IN (SELECT session_id FROM remaining)
+    )
+    UPDATE capture_session
+    SET received = remaining.received,
+        first_index = remaining.first_index,
+        last_index = remaining.last_index
+    FROM remaining
+    WHERE capture_session.session_id = remaining.session_id;
+    """
+
+
+def interval_start(moment, interval):
+    """Truncates a naive UTC datetime to the start of its partition."""
+    if interval == "day":
+        return datetime(moment.year, moment.month, moment.day)
+    if interval == "month":
+        return datetime(moment.year, moment.month, 1)
+    raise ValueError(f"Unknown partition interval: {interval}")
+
+
+def next_interval(start, interval):
+    if interval == "day":
+        return start + timedelta(days=1)
+    if interval == "month":
+        return datetime(start.year + start.month // 12, start.month % 12 + 1, 1)
+    raise ValueError(f"Unknown partition interval: {interval}")
+
+
+def partition_name(start, interval):
+    if interval == "day":
+        return f"{PARENT}_p{start:%Y%m%d}"
+    return f"{PARENT}_p{start:%Y%m}"
+
+
+def parse_bounds(bound_expr):
+    """
+    Parses `pg_get_expr(relpartbound)` into (lower, upper) datetimes, where
+    None stands for MINVALUE/MAXVALUE. Returns None for the default partition.
+    """
+    match = _BOUND_RE.search(bound_expr)
+    if not match:
+        return None
+    lower, upper = match.groups()
+    return (
+        datetime.fromisoformat(lower) if lower else None,
+        datetime.fromisoformat(upper) if upper else None,
+    )
+
+
+def _overlaps(start, end, bounds):
+    lower, upper = bounds
+    return (lower is None or lower < end) and (upper is None or start < upper)
+
+
+def list_partitions(conn):
+    """Returns {name: (lower, upper)} for every range partition of raw_capture."""
+    rows = conn.execute(SELECT_PARTITIONS, (PARENT,)).fetchall()
+    partitions = {}
+    for name, bound_expr in rows:
+        bounds = parse_bounds(bound_expr)
+        if bounds is not None:
+            partitions[name] = bounds
+    return partitions
+
+
+def ensure_partitions(conn, ahead, interval, now=None):
+    """
+    Creates the partitions for the current interval and the `ahead` following
+    ones. Ranges already covered by a partition are skipped. Returns the
+    names created.
+    """
+    now = now or datetime.now(timezone.utc).replace(tzinfo=None)
+    schema = conn.execute(SELECT_SCHEMA, (PARENT,)).fetchone()[0]
+    existing = list_partitions(conn)
+
+    created = []
+    start = interval_start(now, interval)
+    for _ in range(ahead + 1):
+        end = next_interval(start, interval)
+        if not any(_overlaps(start, end, bounds) for bounds in existing.values()):
+            name = partition_name(start, interval)
+            with conn.transaction():
+                _create_partition(conn, schema, name, start, end)
+            existing[name] = (start, end)
+            created.append(name)
+        start = end
+    return created
+
+
+def _create_partition(conn, schema, name, start, end):
+    table = sql.Identifier(schema, name)
+    conn.execute(
+        sql.SQL(
+            "CREATE TABLE {} (LIKE {} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"
+        ).format(table, sql.Identifier(schema, PARENT))
+    )
+    # Rows that already landed in the default partition for this range would
+    # make the ATTACH fail, so move them over first.
+    conn.execute(
+        sql.SQL(
+            "WITH moved AS ("
+            "DELETE FROM {default} WHERE captured_at >= %s AND captured_at < %s "
+            "RETURNING *"
+            ") INSERT INTO {table} SELECT * FROM moved"
+        ).format(default=sql.Identifier(schema, DEFAULT_PARTITION), table=table),
+        (start, end),
+    )
+    # Partition bounds are DDL and cannot be bound parameters.
+    conn.execute(
+        sql.SQL(
+            "ALTER TABLE {} ATTACH PARTITION {} FOR VALUES FROM ({}) TO ({})"
+        ).format(
+            sql.Identifier(schema, PARENT), table, sql.Literal(start), sql.Literal(end)
+        )
+    )
+
+
+def expire_partitions(conn, retention_days, detach=False, now=None):
+    """
+    Drops every partition that only holds rows older than `retention_days`,
+    or detaches it (kept as a plain table) when `detach` is set. Returns the
+    names expired.
+
+    The capture_key ledger forgets the partition's captures in the same
+    transaction, and their sessions' capture_session rows are recounted.
+    """
+    now = now or datetime.now(timezone.utc).replace(tzinfo=None)
+    cutoff = now - timedelta(days=retention_days)
+    schema = conn.execute(SELECT_SCHEMA, (PARENT,)).fetchone()[0]
+    has_capture_key = conn.execute(HAS_CAPTURE_KEY).fetchone()[0]
+
+    expired = []
+    for name, (_, upper) in sorted(list_partitions(conn).items()):
+        if upper is None or upper > cutoff:
+            continue
+        table = sql.Identifier(schema, name)
+        with conn.transaction():
+            # Holds off captures routed to the partition until it is gone.
+            conn.execute(
+                sql.SQL("LOCK TABLE {} IN ACCESS EXCLUSIVE MODE").format(table)
+            )
+            if has_capture_key:
+                _forget_capture_keys(conn, table)
+            if detach:
+                conn.execute(
+                    sql.SQL("ALTER TABLE {} DETACH PARTITION {}").format(
+                        sql.Identifier(schema, PARENT), table
+                    )
+                )
+            else:
+                conn.execute(sql.SQL("DROP TABLE {}").format(table))
+        expired.append(name)
+    return expired
+
+
+def _forget_capture_keys(conn, partition):
+    rows = conn.execute(
+        sql.SQL(DELETE_EXPIRED_KEYS).format(partition=partition)
+    ).fetchall()
+    session_ids = sorted({session_id for (session_id,) in rows})
+    if session_ids:
+        params = {"session_ids": session_ids}
+        conn.execute(LOCK_CAPTURE_SESSIONS, params)
+        conn.execute(REFRESH_CAPTURE_SESSIONS, params)
+
+
+def run_maintenance(conn, ahead, interval, retention_days=None, detach=False):
+    created = ensure_partitions(conn, ahead, interval)
+    for name in created:
+        print(f"[partitions] created {name}", flush=True)
+
+    if retention_days is not None:
+        expired = expire_partitions(conn, retention_days, detach=detach)
+        action = "detached" if detach else "dropped"
+        for name in expired:
+            print(f"[partitions] {action} {name}", flush=True)
+
+
+def main():
+    load_dotenv()
+
+    parser = argparse.ArgumentParser(description="Manage raw_capture partitions.")
+    parser.add_argument("--ahead", type=int, default=RAW_CAPTURE_PARTITIONS_AHEAD)
+    parser.add_argument(
+        "--interval",
+        choices=("day", "month"),
+        default=RAW_CAPTURE_PARTITION_INTERVAL,
+    )
+    parser.add_argument(
+        "--retention-days",
+        type=int,
+        default=int(RAW_CAPTURE_RETENTION_DAYS) if RAW_CAPTURE_RETENTION_DAYS else None,
+        help="expire partitions older than this (default: keep everything)",
+    )
+    parser.add_argument(
+        "--detach",
+        action="store_true",
+        help="detach expired partitions instead of dropping them",
+    )
+    parser.add_argument(
+        "--every",
+        type=float,
+        help="keep running, repeating every this many seconds",
+    )
+    args = parser.parse_args()
+
+    conn_str = os.environ.get("PGSQL_CONN")
+    if not conn_str:
+        raise ValueError("PGSQL_CONN environment variable is not set")
+
+    while True:
+        with psycopg.connect(conn_str, autocommit=True) as conn:
+            run_maintenance(
+                conn, args.ahead, args.interval, args.retention_days, args.detach
+            )
+        if not args.every:
+            break
+        time.sleep(args.every)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,207 @@
+"""
+Rebuilds run_summary from run, choice and raw_capture, to backfill runs
+that predate it or to repair a drifted row.
+
+    uv run python -m src.maintenance.run_summary
+    uv run python -m src.maintenance.run_summary --run-id 7 --run-id 8
+
+Runs are rebuilt in batches, each in its own transaction. A batch holds a
+lock that blocks writes to run_summary while it recounts. Captures and
+choices that arrive meanwhile wait for it, and are then added on top of the
+rebuilt counts instead of being lost. Archived captures are counted from
+their segments, which are read once up front, so do not run it while
+`src.maintenance.archive` is moving captures. Requires
+db/migrations/007_run_summary.sql.
+"""
+
+import argparse
+import itertools
+import os
+
+import psycopg
+from dotenv import load_dotenv
+
+from src.storage.archive import archive_store
+
+RUN_SUMMARY_REBUILD_BATCH_SIZE = int(
+    os.environ.get("RUN_SUMMARY_REBUILD_BATCH_SIZE", "500")
+)
+
+_INT4_MAX = 2**31 - 1
+
+SELECT_SUMMARY_RUN_IDS = """SELECT id::varchar FROM run
+    UNION
+    SELECT DISTINCT run_id FROM raw_capture WHERE run_id IS NOT NULL
+    UNION
+    SELECT DISTINCT run_id::varchar FROM choice WHERE run_id IS NOT NULL;
+    """
+
+SELECT_SEGMENT_IDS = """SELECT segment_id
+    FROM raw_capture_segment
+    ORDER BY first_captured_at, segment_id;
+    """
+
+# Conflicts with the ROW EXCLUSIVE lock every insert and update takes, and
+# with itself, so two rebuilds never interleave.
+LOCK_RUN_SUMMARY = "LOCK TABLE run_summary IN SHARE ROW EXCLUSIVE MODE;"
+
+REBUILD_RUN_SUMMARIES = """WITH runs AS (
+        SELECT unnest(%(run_ids)s::varchar[]) AS run_id
+    ), run_row AS (
+        SELECT id::varchar AS run_id, game_id, duration
+        FROM run
+        WHERE id = ANY(%(numeric_ids)s::int4[])
+    ), choices AS (
+        SELECT run_id::varchar AS run_id, count(*) AS choices
+        FROM choice
+        WHERE run_id = ANY(%(numeric_ids)s::int4[])
+        GROUP BY run_id
+    ), live AS (
+        SELECT
+            run_id,
+            count(*) AS captures,
+            min(captured_at) AS first_captured_at,
+            max(captured_at) AS last_captured_at
+        FROM raw_capture
+        WHERE run_id = ANY(%(run_ids)s::varchar[])
+        GROUP BY run_id
+    ), archived AS (
+        SELECT *
+        FROM unnest(
+            %(archived_run_ids)s::varchar[],
+            %(archived_captures)s::int8[],
+            %(archived_first)s::timestamp[],
+            %(archived_last)s::timestamp[]
+        ) AS archived(run_id, captures, first_captured_at, last_captured_at)
+    )
+    INSERT INTO run_summary (
+        run_id,
+        game_id,
+        duration,
+        choice_count,
+        capture_count,
+        first_captured_at,
+        last_captured_at
+    )
+    SELECT
+        runs.run_id,
+        run_row.game_id,
+        run_row.duration,
+        coalesce(choices.choices, 0),
+        coalesce(live.captures, 0) + coalesce(archived.captures, 0),
+        LEAST(live.first_captured_at, archived.first_captured_at),
+        GREATEST(live.last_captured_at, archived.last_captured_at)
+    FROM runs
+    LEFT JOIN run_row USING (run_id)
+    LEFT JOIN choices USING (run_id)
+    LEFT JOIN live USING (run_id)
+    LEFT JOIN archived USING (run_id)
+    ORDER BY runs.run_id
+    ON CONFLICT (run_id) DO UPDATE SET
+        game_id = EXCLUDED.game_id,
+        duration = EXCLUDED.duration,
+        choice_count = EXCLUDED.choice_count,
+        capture_count = EXCLUDED.capture_count,
+        first_captured_at = EXCLUDED.first_captured_at,
+        last_captured_at = EXCLUDED.last_captured_at,
+        updated_at = now() AT TIME ZONE 'UTC';
+    """
+
+
+def archived_run_captures(conn, store, run_ids=None):
+    """
+    Returns {run_id: (captures, first_captured_at, last_captured_at)} over
+    every archived capture, or only those of `run_ids`.
+    """
+    totals = {}
+    for (segment_id,) in conn.execute(SELECT_SEGMENT_IDS).fetchall():
+        for row in store.read_segment(segment_id):
+            run_id = row.get("run_id")
+            if run_id is None or (run_ids is not None and run_id not in run_ids):
+                continue
+            captured_at = row["captured_at"]
+            count, first, last = totals.get(run_id, (0, captured_at, captured_at))
+            totals[run_id] = (
+                count + 1,
+                min(first, captured_at),
+                max(last, captured_at),
+            )
+    return totals
+
+
+def _rebuild_params(run_ids, archived):
+    archived_ids = [run_id for run_id in run_ids if run_id in archived]
+    return {
+        "run_ids": list(run_ids),
+        # run.id and choice.run_id are integers, raw_capture.run_id is text.
+        "numeric_ids": [
+            int(run_id)
+            for run_id in run_ids
+            if run_id.isdigit() and int(run_id) <= _INT4_MAX
+        ],
+        "archived_run_ids": archived_ids,
+        "archived_captures": [archived[run_id][0] for run_id in archived_ids],
+        "archived_first": [archived[run_id][1] for run_id in archived_ids],
+        "archived_last": [archived[run_id][2] for run_id in archived_ids],
+    }
+
+
+def rebuild_run_summaries(conn, store, run_ids=None, batch_size=500):
+    """
+    Recomputes the summaries of `run_ids`, or of every run that has a run
+    row, a choice or a capture. Returns the number of runs rebuilt.
+
+    `conn` must be in autocommit mode, so that every batch commits in its
+    own transaction.
+    """
+    if run_ids is None:
+        run_ids = {run_id for (run_id,) in conn.execute(SELECT_SUMMARY_RUN_IDS)}
+        archived = archived_run_captures(conn, store)
+        run_ids.update(archived)
+    else:
+        run_ids = set(run_ids)
+        archived = archived_run_captures(conn, store, run_ids)
+
+    rebuilt = 0
+    for batch in itertools.batched(sorted(run_ids), batch_size):
+        with conn.transaction():
+            conn.execute(LOCK_RUN_SUMMARY)
+            conn.execute(REBUILD_RUN_SUMMARIES, _rebuild_params(batch, archived))
+        rebuilt += len(batch)
+        print(f"[run_summary] rebuilt {rebuilt}/{len(run_ids)} runs", flush=True)
+    return rebuilt
+
+
+def main():
+    load_dotenv()
+
+    parser = argparse.ArgumentParser(
+        description="Rebuild run_summary from runs, choices and captures."
+    )
+    parser.add_argument(
+        "--run-id",
+        action="append",
+        dest="run_ids",
+        help="only rebuild this run, can be repeated (default: every run)",
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=RUN_SUMMARY_REBUILD_BATCH_SIZE,
+        help="runs per transaction",
+    )
+    args = parser.parse_args()
+
+    conn_str = os.environ.get("PGSQL_CONN")
+    if not conn_str:
+        raise ValueError("PGSQL_CONN environment variable is not set")
+
+    with psycopg.connect(conn_str, autocommit=True) as conn:
+        total = rebuild_run_summaries(
+            conn, archive_store, args.run_ids, args.batch_size
+        )
+    print(f"[run_summary] rebuilt {total} runs", flush=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,374 @@
+"""
+Prometheus metrics for the HTTP routes, the Socket.IO events and the
+connection pools.
+
+Each request or event is timed in full. It is also split into the phases
+defined below, added up over the whole request (a route that runs three
+queries reports one `db` sample).
+
+When PROMETHEUS_MULTIPROC_DIR is set (see gunicorn.conf.py), every worker
+writes its samples there and `/metrics` aggregates all workers, whichever one
+serves the scrape.
+"""
+
+import functools
+import inspect
+import os
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from time import perf_counter
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+
+PROMETHEUS_MULTIPROC_DIR = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+# Pool stats are sampled at most this often per process.
+METRICS_POOL_INTERVAL = float(os.environ.get("METRICS_POOL_INTERVAL", "1"))
+
+PHASE_VALIDATION = "validation"
+PHASE_STORAGE = "storage"
+PHASE_DB = "db"
+PHASE_SERIALIZATION = "serialization"
+
+_PHASE_BUCKETS = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+REQUEST_LATENCY = Histogram(
+    "gamelens_request_duration_seconds",
+    "Time spent handling an HTTP request or a Socket.IO event.",
+    ["transport", "handler", "status"],
+    buckets=_PHASE_BUCKETS,
+)
+PHASE_LATENCY = Histogram(
+    "gamelens_request_phase_duration_seconds",
+    "Time spent per phase of an HTTP request or a Socket.IO event.",
+    ["transport", "handler", "phase"],
+    buckets=_PHASE_BUCKETS,
+)
+BYTES_INGESTED = Counter(
+    "gamelens_ingested_bytes",
+    "Image bytes of successfully stored captures.",
+    ["transport"],
+)
+ERRORS = Counter(
+    "gamelens_errors",
+    "Error responses and acks, by error type.",
+    ["transport", "handler", "type"],
+)
+CACHE_LOOKUPS = Counter(
+    "gamelens_cache_lookups",
+    "Lookup cache reads, by namespace and hit/miss.",
+    ["backend", "namespace", "result"],
+)
+SPOOL_BYTES = Gauge(
+    "gamelens_capture_spool_bytes",
+    "Spooled capture rows not yet replayed into Postgres.",
+    multiprocess_mode="livesum",
+)
+
+POOL_WAIT = Histogram(
+    "gamelens_db_pool_wait_seconds",
+    "Time spent waiting for a connection from the pool.",
+    ["pool"],
+    buckets=_PHASE_BUCKETS,
+)
+POOL_SIZE = Gauge(
+    "gamelens_db_pool_size",
+    "Connections currently open by the pool.",
+    ["pool"],
+    multiprocess_mode="livesum",
+)
+POOL_AVAILABLE = Gauge(
+    "gamelens_db_pool_available",
+    "Idle connections in the pool.",
+    ["pool"],
+    multiprocess_mode="livesum",
+)
+POOL_MAX = Gauge(
+    "gamelens_db_pool_max_size",
+    "Maximum connections the pool may open.",
+    ["pool"],
+    multiprocess_mode="livesum",
+)
+POOL_WAITING = Gauge(
+    "gamelens_db_pool_requests_waiting",
+    "Clients queued waiting for a connection.",
+    ["pool"],
+    multiprocess_mode="livesum",
+)
+POOL_REQUESTS = Counter(
+    "gamelens_db_pool_requests",
+    "Connections requested from the pool.",
+    ["pool"],
+)
+POOL_REQUESTS_QUEUED = Counter(
+    "gamelens_db_pool_requests_queued",
+    "Connection requests that had to wait for a free connection.",
+    ["pool"],
+)
+POOL_REQUESTS_ERRORS = Counter(
+    "gamelens_db_pool_requests_errors",
+    "Connection requests that timed out or failed.",
+    ["pool"],
+)
+POOL_CONNECTIONS_LOST = Counter(
+    "gamelens_db_pool_connections_lost",
+    "Connections found broken and discarded by the pool.",
+    ["pool"],
+)
+
+
+class _RequestTimer:
+    __slots__ = ("transport", "handler", "started", "phases", "token")
+
+    def __init__(self, transport, handler):
+        self.transport = transport
+        self.handler = handler
+        self.started = perf_counter()
+        self.phases = {}
+        self.token = None
+
+
+_current = ContextVar("gamelens_request_timer", default=None)
+
+
+def start_request(transport, handler):
+    timer = _RequestTimer(transport, handler)
+    timer.token = _current.set(timer)
+    return timer
+
+
+def finish_request(timer, status):
+    _current.reset(timer.token)
+    REQUEST_LATENCY.labels(timer.transport, timer.handler, status).observe(
+        perf_counter() - timer.started
+    )
+    for name, elapsed in timer.phases.items():
+        PHASE_LATENCY.labels(timer.transport, timer.handler, name).observe(elapsed)
+
+
+@contextmanager
+def phase(name):
+    """
+    Adds the time spent in the block to the current request's `name` phase.
+    Outside a request (e.g. on the capture writer thread) it does nothing.
+    """
+    timer = _current.get()
+    if timer is None:
+        yield
+        return
+
+    started = perf_counter()
+    try:
+        yield
+    finally:
+        timer.phases[name] = timer.phases.get(name, 0.0) + perf_counter() - started
+
+
+def record_error(error_type, transport=None, handler=None):
+    timer = _current.get()
+    if timer is not None:
+        transport = transport or timer.transport
+        handler = handler or timer.handler
+    ERRORS.labels(transport or "internal", handler or "unknown", error_type).inc()
+
+
+def record_ingested(nbytes):
+    timer = _current.get()
+    BYTES_INGESTED.labels(timer.transport if timer else "internal").inc(nbytes)
+
+
+def _record_ack_errors(timer, ack):
+    if not isinstance(ack, dict):
+        return
+    # Batch acks carry per-capture results.
+    for result in ack.get("results") or ():
+        if result.get("status") == "error":
+            record_error(result.get("type", "Error"), timer.transport, timer.handler)
+    if ack.get("status") not in ("ok", "partial", None) and "results" not in ack:
+        record_error(ack.get("type", "Error"), timer.transport, timer.handler)
+
+
+def _ack_status(ack):
+    if isinstance(ack, dict) and isinstance(ack.get("status"), str):
+        return ack["status"]
+    if isinstance(ack, dict) and "status" in ack:
+        return "error"
+    return "ok"
+
+
+def instrument_event(event):
+    """
+    Times a Socket.IO event handler, sync or async. Apply it below `.on(...)`.
+    """
+
+    def decorator(handler):
+        if inspect.iscoroutinefunction(handler):
+
+            @functools.wraps(handler)
+            async def async_wrapper(*args, **kwargs):
+                timer = start_request("socketio", event)
+                ack = None
+                try:
+                    ack = await handler(*args, **kwargs)
+                    return ack
+                finally:
+                    _record_ack_errors(timer, ack)
+                    finish_request(timer, _ack_status(ack))
+                    refresh_pool_stats()
+
+            return async_wrapper
+
+        @functools.wraps(handler)
+        def wrapper(*args, **kwargs):
+            timer = start_request("socketio", event)
+            ack = None
+            try:
+                ack = handler(*args, **kwargs)
+                return ack
+            finally:
+                _record_ack_errors(timer, ack)
+                finish_request(timer, _ack_status(ack))
+                refresh_pool_stats()
+
+        return wrapper
+
+    return decorator
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+_pools_refreshed_at = 0.0
+
+
+def register_pool(name, pool):
+    """Exports the stats of a psycopg_pool pool under the `pool=name` label."""
+    POOL_WAIT.labels(name)
+    _pools[name] = pool
+
+
+def refresh_pool_stats(force=False):
+    global _pools_refreshed_at
+
+    now = perf_counter()
+    if not force and now - _pools_refreshed_at < METRICS_POOL_INTERVAL:
+        return
+    if not _pools_lock.acquire(blocking=False):
+        return
+    try:
+        _pools_refreshed_at = now
+        for name, pool in _pools.items():
+            # pop_stats() resets the pool counters, so each call yields deltas.
+            stats = pool.pop_stats()
+            POOL_SIZE.labels(name).set(stats.get("pool_size", 0))
+            POOL_AVAILABLE.labels(name).set(stats.get("pool_available", 0))
+            POOL_MAX.labels(name).set(stats.get("pool_max", 0))
+            POOL_WAITING.labels(name).set(stats.get("requests_waiting", 0))
+            POOL_REQUESTS.labels(name).inc(stats.get("requests_num", 0))
+            POOL_REQUESTS_QUEUED.labels(name).inc(stats.get("requests_queued", 0))
+            POOL_REQUESTS_ERRORS.labels(name).inc(stats.get("requests_errors", 0))
+            POOL_CONNECTIONS_LOST.labels(name).inc(stats.get("connections_lost", 0))
+    finally:
+        _pools_lock.release()
+
+
+def render_metrics():
+    """
+    Returns (body, content_type) in the Prometheus text format.
+    """
+    refresh_pool_stats(force=True)
+    if PROMETHEUS_MULTIPROC_DIR:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+def init_metrics(app):
+    """
+    Times every Flask route, including its JSON serialization, and serves
+    `/metrics`.
+    """
+    from flask import Response, request
+    from flask.json.provider import DefaultJSONProvider
+
+    class TimedJSONProvider(DefaultJSONProvider):
+        def dumps(self, obj, **kwargs):
+            with phase(PHASE_SERIALIZATION):
+                return super().dumps(obj, **kwargs)
+
+    app.json = TimedJSONProvider(app)
+
+    @app.before_request
+    def _start_request_timer():
+        if request.endpoint != "metrics":
+            request.environ["gamelens.timer"] = start_request(
+                "http", request.endpoint or "unmatched"
+            )
+
+    @app.after_request
+    def _finish_request_timer(response):
+        timer = request.environ.pop("gamelens.timer", None)
+        if timer is None:
+            return response
+
+        if response.status_code >= 400:
+            body = None
+            if response.is_json and not response.direct_passthrough:
+                body = response.get_json(silent=True)
+            error_type = (body.get("type") if isinstance(body, dict) else None) or str(
+                response.status_code
+            )
+            record_error(error_type)
+
+        finish_request(timer, str(response.status_code))
+        refresh_pool_stats()
+        return response
+
+    @app.route("/metrics")
+    def metrics():
+        body, content_type = render_metrics()
+        return Response(body, content_type=content_type)
+
+
+def metrics_asgi_app():
+    """A bare ASGI app that serves the metrics, for src/asgi.py."""
+
+    async def app(scope, receive, send):
+        if scope["type"] != "http":
+            return
+        body, content_type = render_metrics()
+        await send(
+            {
+                "type": "http.response.start",
+                "status": 200,
+                "headers": [(b"content-type", content_type.encode("ascii"))],
+            }
+        )
+        await send({"type": "http.response.body", "body": body})
+
+    return app
@@ -0,0 +1,263 @@
+import os
+
+from psycopg.rows import dict_row
+
+from src.db import DatabaseConnection
+from src.storage.preview import PREVIEW_SIZES
+
+PIPELINE_ENQUEUE_JOBS = os.environ.get("PIPELINE_ENQUEUE_JOBS", "1") == "1"
+PREVIEW_ENQUEUE_JOBS = os.environ.get("PREVIEW_ENQUEUE_JOBS", "1") == "1" and bool(
+    PREVIEW_SIZES
+)
+
+STATUS_PENDING = "pending"
+STATUS_RUNNING = "running"
+STATUS_RETRY = "retry"
+STATUS_DONE = "done"
+STATUS_FAILED = "failed"
+
+# Timestamps are stored as naive UTC, like raw_capture.received_at.
+_NOW = "(now() AT TIME ZONE 'UTC')"
+
+# Runs in the same transaction as the raw_capture insert, so a capture is never
+# committed without its job (or the other way around).
+ENQUEUE_JOBS = f"""INSERT INTO pipeline_job (
+        job_id,
+        capture_id,
+        game_id,
+        run_id,
+        status,
+        attempts
+    )
+    SELECT gen_random_uuid()::text, capture_id, game_id, run_id, '{STATUS_PENDING}', 0
+    FROM unnest(%s::varchar[], %s::varchar[], %s::varchar[])
+        AS capture(capture_id, game_id, run_id);
+    """
+
+# Retries wait `backoff * 2^(attempts - 1)` seconds after the last attempt
+# failed, which requires db/migrations/008_job_failed_at.sql. SKIP LOCKED
+# lets any number of workers claim concurrently without ever handing the
+# same job to two of them.
+CLAIM_JOBS = f"""WITH claimable AS (
+        SELECT job_id
+        FROM pipeline_job
+        WHERE status = '{STATUS_PENDING}'
+            OR (
+                status = '{STATUS_RETRY}'
+                AND failed_at < {_NOW}
+                    - make_interval(secs => %(backoff)s * power(2, attempts - 1))
+            )
+        LIMIT %(limit)s
+        FOR UPDATE SKIP LOCKED
+    )
+    UPDATE pipeline_job AS job
+    SET status = '{STATUS_RUNNING}',
+        locked_by = %(worker_id)s,
+        locked_at = {_NOW},
+        attempts = job.attempts + 1
+    FROM claimable
+    WHERE job.job_id = claimable.job_id
+    RETURNING job.job_id, job.capture_id, job.game_id, job.run_id, job.attempts;
+    """
+
+# Both updates only apply while the worker still holds the lock, so a worker
+# whose job was reaped and re-claimed cannot overwrite the new owner's result.
+COMPLETE_JOB = f"""UPDATE pipeline_job
+    SET status = '{STATUS_DONE}',
+        locked_by = NULL,
+        pipeline_version = %s,
+        model_version = %s
+    WHERE job_id = %s AND locked_by = %s;
+    """
+
+FAIL_JOB = f"""UPDATE pipeline_job
+    SET status = CASE
+            WHEN attempts >= %s THEN '{STATUS_FAILED}'
+            ELSE '{STATUS_RETRY}'
+        END,
+        locked_by = NULL,
+        failed_at = {_NOW}
+    WHERE job_id = %s AND locked_by = %s;
+    """
+
+REAP_STALE_JOBS = f"""UPDATE pipeline_job
+    SET status = CASE
+            WHEN attempts >= %s THEN '{STATUS_FAILED}'
+            ELSE '{STATUS_RETRY}'
+        END,
+        locked_by = NULL,
+        failed_at = {_NOW}
+    WHERE status = '{STATUS_RUNNING}'
+        AND locked_at < {_NOW} - make_interval(secs => %s);
+    """
+
+
+# Previews are keyed by image, so a frame stored by many captures is rendered
+# once. Keys are sorted so concurrent batches lock them in the same order.
+ENQUEUE_PREVIEWS = f"""INSERT INTO preview_job (screenshot_ref, status, attempts)
+    SELECT DISTINCT screenshot_ref, '{STATUS_PENDING}', 0
+    FROM unnest(%s::varchar[]) AS capture(screenshot_ref)
+    WHERE screenshot_ref IS NOT NULL
+    ORDER BY screenshot_ref
+    ON CONFLICT DO NOTHING;
+    """
+
+CLAIM_PREVIEWS = f"""WITH claimable AS (
+        SELECT screenshot_ref
+        FROM preview_job
+        WHERE status = '{STATUS_PENDING}'
+            OR (
+                status = '{STATUS_RETRY}'
+                AND failed_at < {_NOW}
+                    - make_interval(secs => %(backoff)s * power(2, attempts - 1))
+            )
+        LIMIT %(limit)s
+        FOR UPDATE SKIP LOCKED
+    )
+    UPDATE preview_job AS job
+    SET status = '{STATUS_RUNNING}',
+        locked_by = %(worker_id)s,
+        locked_at = {_NOW},
+        attempts = job.attempts + 1
+    FROM claimable
+    WHERE job.screenshot_ref = claimable.screenshot_ref
+    RETURNING job.screenshot_ref, job.attempts;
+    """
+
+COMPLETE_PREVIEW = f"""UPDATE preview_job
+    SET status = '{STATUS_DONE}',
+        locked_by = NULL
+    WHERE screenshot_ref = %s AND locked_by = %s;
+    """
+
+FAIL_PREVIEW = f"""UPDATE preview_job
+    SET status = CASE
+            WHEN attempts >= %s THEN '{STATUS_FAILED}'
+            ELSE '{STATUS_RETRY}'
+        END,
+        locked_by = NULL,
+        failed_at = {_NOW}
+    WHERE screenshot_ref = %s AND locked_by = %s;
+    """
+
+REAP_STALE_PREVIEWS = f"""UPDATE preview_job
+    SET status = CASE
+            WHEN attempts >= %s THEN '{STATUS_FAILED}'
+            ELSE '{STATUS_RETRY}'
+        END,
+        locked_by = NULL,
+        failed_at = {_NOW}
+    WHERE status = '{STATUS_RUNNING}'
+        AND locked_at < {_NOW} - make_interval(secs => %s);
+    """
+
+
+def _enqueue_params(captures):
+    if not PIPELINE_ENQUEUE_JOBS or not captures:
+        return None
+    return tuple(list(column) for column in zip(*captures))
+
+
+def enqueue_jobs(cur, captures):
+    """
+    Queues one pipeline job per (capture_id, game_id, run_id), using the
+    caller's cursor so the jobs commit together with the captures.
+    """
+    params = _enqueue_params(captures)
+    if params:
+        cur.execute(ENQUEUE_JOBS, params)
+
+
+async def enqueue_jobs_async(cur, captures):
+    """Same as `enqueue_jobs`, for an async cursor."""
+    params = _enqueue_params(captures)
+    if params:
+        await cur.execute(ENQUEUE_JOBS, params)
+
+
+def enqueue_previews(cur, screenshot_refs):
+    """
+    Queues preview rendering for the given images, on the caller's cursor
+    like `enqueue_jobs`. Images that already have a job are skipped.
+    """
+    if PREVIEW_ENQUEUE_JOBS and screenshot_refs:
+        cur.execute(ENQUEUE_PREVIEWS, (list(screenshot_refs),))
+
+
+async def enqueue_previews_async(cur, screenshot_refs):
+    """Same as `enqueue_previews`, for an async cursor."""
+    if PREVIEW_ENQUEUE_JOBS and screenshot_refs:
+        await cur.execute(ENQUEUE_PREVIEWS, (list(screenshot_refs),))
+
+
+def claim_jobs(worker_id, limit, backoff):
+    with DatabaseConnection.get_connection() as conn:
+        with conn.cursor(row_factory=dict_row) as cur:
+            jobs = cur.execute(
+                CLAIM_JOBS,
+                {"worker_id": worker_id, "limit": limit, "backoff": backoff},
+            ).fetchall()
+        conn.commit()
+    return jobs
+
+
+def complete_job(job_id, worker_id, pipeline_version=None, model_version=None):
+    with DatabaseConnection.get_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                COMPLETE_JOB, (pipeline_version, model_version, job_id, worker_id)
+            )
+        conn.commit()
+
+
+def fail_job(job_id, worker_id, max_attempts):
+    with DatabaseConnection.get_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute(FAIL_JOB, (max_attempts, job_id, worker_id))
+        conn.commit()
+
+
+def reap_stale_jobs(lock_timeout, max_attempts):
+    """
+    Releases jobs whose worker died or stalled while holding them.
+    """
+    with DatabaseConnection.get_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute(REAP_STALE_JOBS, (max_attempts, lock_timeout))
+            reaped = cur.rowcount
+        conn.commit()
+    return reaped
+
+
+def claim_previews(worker_id, limit, backoff):
+    with DatabaseConnection.get_connection() as conn:
+        with conn.cursor(row_factory=dict_row) as cur:
+            jobs = cur.execute(
+                CLAIM_PREVIEWS,
+                {"worker_id": worker_id, "limit": limit, "backoff": backoff},
+            ).fetchall()
+        conn.commit()
+    return jobs
+
+
+def complete_preview(screenshot_ref, worker_id):
+    with DatabaseConnection.get_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute(COMPLETE_PREVIEW, (screenshot_ref, worker_id))
+        conn.commit()
+
+
+def fail_preview(screenshot_ref, worker_id, max_attempts):
+    with DatabaseConnection.get_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute(FAIL_PREVIEW, (max_attempts, screenshot_ref, worker_id))
+        conn.commit()
+
+
+def reap_stale_previews(lock_timeout, max_attempts):
+    with DatabaseConnection.get_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute(REAP_STALE_PREVIEWS, (max_attempts, lock_timeout))
+            reaped = cur.rowcount
+        conn.commit()
+    return reaped
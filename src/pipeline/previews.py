@@ -0,0 +1,174 @@
+import argparse
+import io
+import os
+import socket
+import threading
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+
+from dotenv import load_dotenv
+from PIL import Image
+
+from src.pipeline.jobs import (
+    claim_previews,
+    complete_preview,
+    fail_preview,
+    reap_stale_previews,
+)
+from src.storage.blob import blob_store
+from src.storage.preview import PREVIEW_QUALITY, PREVIEW_SIZES, preview_key
+from src.util import init_db
+
+
+def render_previews(data, sizes=PREVIEW_SIZES, quality=PREVIEW_QUALITY):
+    """
+    Downscales an image so its longest edge is at most each of `sizes`, and
+    returns {size: WebP bytes}. Images are never upscaled.
+    """
+    with Image.open(io.BytesIO(data)) as image:
+        # Lets the JPEG decoder scale down by up to 8x while decoding, so a
+        # full-resolution frame is never built for a small preview.
+        image.draft("RGB", (max(sizes), max(sizes)))
+        image = image.convert("RGBA" if "A" in image.getbands() else "RGB")
+
+        previews = {}
+        # Largest first, so each size is cut from the one before it.
+        for size in sorted(sizes, reverse=True):
+            image.thumbnail((size, size), Image.Resampling.LANCZOS, reducing_gap=3.0)
+            out = io.BytesIO()
+            image.save(out, "WEBP", quality=quality, method=4)
+            previews[size] = out.getvalue()
+    return previews
+
+
+def store_previews(screenshot_ref, sizes=PREVIEW_SIZES, quality=PREVIEW_QUALITY):
+    """
+    Renders and stores the previews of one blob. Runs in a pool process, so
+    only the key crosses the process boundary, never the image.
+    """
+    previews = render_previews(blob_store.read(screenshot_ref), sizes, quality)
+    for size, data in previews.items():
+        blob_store.put_as(preview_key(screenshot_ref, size), data)
+    return sum(len(data) for data in previews.values())
+
+
+class PreviewWorker:
+    """
+    Claims preview jobs in batches and renders them in a process pool.
+
+    Decoding and resizing are CPU-bound. They run in separate processes, never
+    in the web workers or this process's threads, so they use every core. Any
+    number of workers can share the queue: claims use FOR UPDATE SKIP LOCKED.
+    """
+
+    def __init__(
+        self,
+        processes=None,
+        batch_size=32,
+        poll_interval=1.0,
+        retry_backoff=5.0,
+        lock_timeout=300,
+        max_attempts=3,
+        worker_id=None,
+    ):
+        self.processes = processes or os.cpu_count()
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.retry_backoff = retry_backoff
+        self.lock_timeout = lock_timeout
+        self.max_attempts = max_attempts
+        self.worker_id = worker_id or f"{socket.gethostname()}:{uuid.uuid4().hex[:8]}"
+        self._executor = ProcessPoolExecutor(max_workers=self.processes)
+        self._stop = threading.Event()
+
+    def run_once(self):
+        """
+        Claims one batch of jobs and renders it. Returns the number of jobs
+        claimed.
+        """
+        jobs = claim_previews(self.worker_id, self.batch_size, self.retry_backoff)
+        futures = [
+            (job, self._executor.submit(store_previews, job["screenshot_ref"]))
+            for job in jobs
+        ]
+        for job, future in futures:
+            try:
+                future.result()
+            except Exception as e:
+                print(
+                    f"[previews] {job['screenshot_ref']} attempt {job['attempts']} "
+                    f"failed: {e!r}",
+                    flush=True,
+                )
+                fail_preview(job["screenshot_ref"], self.worker_id, self.max_attempts)
+            else:
+                complete_preview(job["screenshot_ref"], self.worker_id)
+        return len(jobs)
+
+    def run_forever(self):
+        reaper = threading.Thread(target=self._reap_loop, daemon=True)
+        reaper.start()
+
+        while not self._stop.is_set():
+            try:
+                claimed = self.run_once()
+            except Exception as e:
+                print(f"[previews] claim failed: {e}", flush=True)
+                claimed = 0
+
+            if claimed < self.batch_size:
+                self._stop.wait(self.poll_interval)
+
+    def stop(self):
+        self._stop.set()
+        self._executor.shutdown(wait=True)
+
+    def _reap_loop(self):
+        while not self._stop.wait(self.lock_timeout / 2):
+            try:
+                reaped = reap_stale_previews(self.lock_timeout, self.max_attempts)
+                if reaped:
+                    print(f"[previews] released {reaped} stale job(s)", flush=True)
+            except Exception as e:
+                print(f"[previews] reaper failed: {e}", flush=True)
+
+
+def main():
+    load_dotenv()
+
+    parser = argparse.ArgumentParser(description="Render capture previews.")
+    parser.add_argument(
+        "--processes", type=int, default=None, help="default: one per core"
+    )
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--poll-interval", type=float, default=1.0)
+    parser.add_argument("--retry-backoff", type=float, default=5.0)
+    parser.add_argument("--lock-timeout", type=float, default=300)
+    parser.add_argument("--max-attempts", type=int, default=3)
+    args = parser.parse_args()
+
+    if not PREVIEW_SIZES:
+        raise ValueError("PREVIEW_SIZES is empty, there is nothing to render")
+
+    init_db()
+    worker = PreviewWorker(
+        processes=args.processes,
+        batch_size=args.batch_size,
+        poll_interval=args.poll_interval,
+        retry_backoff=args.retry_backoff,
+        lock_timeout=args.lock_timeout,
+        max_attempts=args.max_attempts,
+    )
+    print(
+        f"[previews] worker {worker.worker_id} started, {worker.processes} "
+        f"process(es), sizes {', '.join(map(str, PREVIEW_SIZES))}",
+        flush=True,
+    )
+    try:
+        worker.run_forever()
+    except KeyboardInterrupt:
+        worker.stop()
+
+
+if __name__ == "__main__":
+    main()
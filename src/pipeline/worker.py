@@ -0,0 +1,187 @@
+import argparse
+import os
+import socket
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from dotenv import load_dotenv
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from src.pipeline.jobs import claim_jobs, complete_job, fail_job, reap_stale_jobs
+from src.util import init_db
+
+
+class ClassifierClient:
+    """
+    Keep-alive HTTP client for the Event Classifier Service.
+
+    Transient failures (connection errors, 502/503/504) are retried with
+    exponential backoff by urllib3 before a job attempt is counted as failed.
+    """
+
+    def __init__(self, base_url, timeout=30, retries=3, backoff=0.5, pool_size=10):
+        self.url = base_url.rstrip("/") + "/classify"
+        self.timeout = timeout
+        self.session = requests.Session()
+        retry = Retry(
+            total=retries,
+            backoff_factor=backoff,
+            status_forcelist=(502, 503, 504),
+            allowed_methods=frozenset({"POST"}),
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(
+            pool_connections=1, pool_maxsize=pool_size, max_retries=retry
+        )
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def classify(self, job):
+        response = self.session.post(
+            self.url,
+            json={
+                "job_id": job["job_id"],
+                "capture_id": job["capture_id"],
+                "game_id": job["game_id"],
+                "run_id": job["run_id"],
+                "attempt": job["attempts"],
+                "image_path": f"/api/v1/collect/{job['capture_id']}/image",
+            },
+            timeout=self.timeout,
+        )
+        response.raise_for_status()
+        return response.json() if response.content else {}
+
+    def close(self):
+        self.session.close()
+
+
+class WorkerPool:
+    """
+    Claims pipeline jobs in batches and dispatches them to the classifier.
+
+    Several pools (in one or many processes/hosts) can run against the same
+    database: claims use FOR UPDATE SKIP LOCKED, so a job is only ever held
+    by one worker at a time.
+    """
+
+    def __init__(
+        self,
+        client,
+        concurrency=8,
+        batch_size=32,
+        poll_interval=1.0,
+        retry_backoff=5.0,
+        lock_timeout=300,
+        max_attempts=5,
+        worker_id=None,
+    ):
+        self.client = client
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.retry_backoff = retry_backoff
+        self.lock_timeout = lock_timeout
+        self.max_attempts = max_attempts
+        self.worker_id = worker_id or f"{socket.gethostname()}:{uuid.uuid4().hex[:8]}"
+        self._executor = ThreadPoolExecutor(
+            max_workers=concurrency, thread_name_prefix="pipeline-worker"
+        )
+        self._stop = threading.Event()
+
+    def run_once(self):
+        """
+        Claims one batch of jobs and processes it. Returns the number of jobs
+        claimed.
+        """
+        jobs = claim_jobs(self.worker_id, self.batch_size, self.retry_backoff)
+        list(self._executor.map(self._process, jobs))
+        return len(jobs)
+
+    def run_forever(self):
+        reaper = threading.Thread(target=self._reap_loop, daemon=True)
+        reaper.start()
+
+        while not self._stop.is_set():
+            try:
+                claimed = self.run_once()
+            except Exception as e:
+                print(f"[pipeline] claim failed: {e}", flush=True)
+                claimed = 0
+
+            # Only sleep when the queue is drained, keep going while busy.
+            if claimed < self.batch_size:
+                self._stop.wait(self.poll_interval)
+
+    def stop(self):
+        self._stop.set()
+        self._executor.shutdown(wait=True)
+        self.client.close()
+
+    def _reap_loop(self):
+        while not self._stop.wait(self.lock_timeout / 2):
+            try:
+                reaped = reap_stale_jobs(self.lock_timeout, self.max_attempts)
+                if reaped:
+                    print(f"[pipeline] released {reaped} stale job(s)", flush=True)
+            except Exception as e:
+                print(f"[pipeline] reaper failed: {e}", flush=True)
+
+    def _process(self, job):
+        try:
+            result = self.client.classify(job)
+        except Exception as e:
+            print(
+                f"[pipeline] job {job['job_id']} attempt {job['attempts']} failed: {e}",
+                flush=True,
+            )
+            fail_job(job["job_id"], self.worker_id, self.max_attempts)
+            return False
+
+        complete_job(
+            job["job_id"],
+            self.worker_id,
+            pipeline_version=result.get("pipeline_version"),
+            model_version=result.get("model_version"),
+        )
+        return True
+
+
+def main():
+    load_dotenv()
+
+    parser = argparse.ArgumentParser(description="Dispatch pipeline jobs.")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--poll-interval", type=float, default=1.0)
+    parser.add_argument("--retry-backoff", type=float, default=5.0)
+    parser.add_argument("--lock-timeout", type=float, default=300)
+    parser.add_argument("--max-attempts", type=int, default=5)
+    args = parser.parse_args()
+
+    classifier_url = os.environ.get("CLASSIFIER_SERVICE_HOST_URL")
+    if not classifier_url:
+        raise ValueError("CLASSIFIER_SERVICE_HOST_URL environment variable is not set")
+
+    init_db()
+    pool = WorkerPool(
+        ClassifierClient(classifier_url, pool_size=args.concurrency),
+        concurrency=args.concurrency,
+        batch_size=args.batch_size,
+        poll_interval=args.poll_interval,
+        retry_backoff=args.retry_backoff,
+        lock_timeout=args.lock_timeout,
+        max_attempts=args.max_attempts,
+    )
+    print(f"[pipeline] worker {pool.worker_id} started", flush=True)
+    try:
+        pool.run_forever()
+    except KeyboardInterrupt:
+        pool.stop()
+
+
+if __name__ == "__main__":
+    main()
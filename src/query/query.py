@@ -0,0 +1,152 @@
+"""
+Filtered, metadata-only capture queries and the aggregates ops reads most:
+captures per minute, ingest lag percentiles and frames per run.
+
+Everything is computed in SQL over the covering indexes of
+`db/migrations/006_capture_query_indexes.sql`, and only rows of the answer
+leave the database. Every query needs a game_id, session_id or run_id, and
+is cancelled after QUERY_STATEMENT_TIMEOUT_MS.
+
+Only live captures are queried. Captures moved to the cold tier by
+`src.maintenance.archive` are left out.
+"""
+
+import os
+
+from flasgger import swag_from
+from flask import Blueprint, jsonify, request
+
+from src import repository
+from src.errors import MissingCollectorParam
+from src.ingestion.collector import _parse_int, _parse_timestamp, _to_utc_naive
+from src.util import decode_cursor, encode_cursor
+
+QUERY_STATEMENT_TIMEOUT_MS = int(os.environ.get("QUERY_STATEMENT_TIMEOUT_MS", "5000"))
+QUERY_DEFAULT_LIMIT = 100
+QUERY_MAX_LIMIT = 10000
+
+Query = Blueprint("query", __name__)
+
+
+def _filters():
+    filters = {}
+    for name in ("game_id", "session_id", "run_id"):
+        value = request.args.get(name)
+        if value:
+            filters[name] = value
+    if not filters:
+        raise MissingCollectorParam("one of game_id, session_id or run_id is required")
+
+    for arg, name in (("from", "captured_from"), ("to", "captured_to")):
+        value = _parse_timestamp(request.args.get(arg), arg, required=False)
+        if value is not None:
+            filters[name] = _to_utc_naive(value)
+
+    for name in ("from_index", "to_index"):
+        value = _parse_int(request.args.get(name), name)
+        if value is not None:
+            filters[name] = value
+    return filters
+
+
+def _limit():
+    limit = _parse_int(request.args.get("limit"), "limit")
+    if limit is None:
+        return QUERY_DEFAULT_LIMIT
+    if not 0 < limit <= QUERY_MAX_LIMIT:
+        raise MissingCollectorParam(f"limit must be between 1 and {QUERY_MAX_LIMIT}")
+    return limit
+
+
+@Query.route("/query/captures", methods=["GET"])
+@swag_from("../docs/query_captures_get.yml")
+def query_captures():
+    """
+    Pages through capture metadata, without images, in (captured_at,
+    capture_id) order. `next` is the `after` of the following page.
+    """
+    filters = _filters()
+    limit = _limit()
+    after = request.args.get("after")
+    cursor = decode_cursor(after) if after else None
+
+    params = [*(cursor or ()), limit]
+    try:
+        rows = repository.run_capture_query(
+            repository.capture_query(filters, cursor is not None),
+            filters,
+            params,
+            QUERY_STATEMENT_TIMEOUT_MS,
+        )
+    except Exception as e:
+        return jsonify(
+            {"error": "Client Side Error", "message": str(e), "type": type(e).__name__}
+        ), 400
+
+    next_cursor = None
+    if len(rows) == limit:
+        next_cursor = encode_cursor(rows[-1]["captured_at"], rows[-1]["capture_id"])
+    return jsonify({"data": rows, "next": next_cursor}), 200
+
+
+@Query.route("/query/captures/per-minute", methods=["GET"])
+@swag_from("../docs/query_captures_per_minute_get.yml")
+def captures_per_minute():
+    filters = _filters()
+    limit = _limit()
+
+    try:
+        rows = repository.run_capture_query(
+            repository.captures_per_minute_query(filters),
+            filters,
+            [limit],
+            QUERY_STATEMENT_TIMEOUT_MS,
+        )
+    except Exception as e:
+        return jsonify(
+            {"error": "Client Side Error", "message": str(e), "type": type(e).__name__}
+        ), 400
+
+    return jsonify({"data": rows}), 200
+
+
+@Query.route("/query/ingest-lag", methods=["GET"])
+@swag_from("../docs/query_ingest_lag_get.yml")
+def ingest_lag():
+    filters = _filters()
+    limit = _limit()
+
+    try:
+        rows = repository.run_capture_query(
+            repository.ingest_lag_query(filters),
+            filters,
+            [limit],
+            QUERY_STATEMENT_TIMEOUT_MS,
+        )
+    except Exception as e:
+        return jsonify(
+            {"error": "Client Side Error", "message": str(e), "type": type(e).__name__}
+        ), 400
+
+    return jsonify({"data": rows}), 200
+
+
+@Query.route("/query/runs", methods=["GET"])
+@swag_from("../docs/query_runs_get.yml")
+def run_frames():
+    filters = _filters()
+    limit = _limit()
+
+    try:
+        rows = repository.run_capture_query(
+            repository.run_frames_query(filters),
+            filters,
+            [limit],
+            QUERY_STATEMENT_TIMEOUT_MS,
+        )
+    except Exception as e:
+        return jsonify(
+            {"error": "Client Side Error", "message": str(e), "type": type(e).__name__}
+        ), 400
+
+    return jsonify({"data": rows}), 200
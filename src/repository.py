@@ -0,0 +1,782 @@
+"""
+Data-access layer: every SQL statement the routes run, and the typed rows
+they return.
+
+Statements run with `prepare=True`, so each pooled connection parses and
+plans a statement once and reuses that plan on every later call.
+Server-side (named) cursors cannot use prepared statements, so the
+/collect/stream query is only built here and executed by the route, and the
+`iter_*` readers behind the binary bulk formats run unprepared.
+
+Captures moved to the cold tier by `src.maintenance.archive` are read back
+from their segments, so callers see archived and live captures alike.
+"""
+
+import heapq
+import uuid
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any
+
+from psycopg.rows import class_row, dict_row
+from psycopg.types.json import Json
+
+from src.db import DatabaseConnection
+from src.storage.archive import archive_store
+
+# Column order and wire types for binary COPY. Binary COPY does no server-side
+# casting, so every value must already match the column type exactly.
+RAW_CAPTURE_COLUMNS = (
+    ("capture_id", "varchar"),
+    ("screenshot_ref", "varchar"),
+    ("game_id", "varchar"),
+    ("session_id", "varchar"),
+    ("captured_at", "timestamp"),
+    ("received_at", "timestamp"),
+    ("run_id", "varchar"),
+    ("mouse_x", "int4"),
+    ("mouse_y", "int4"),
+    ("screenshot_hash", "varchar"),
+    ("image_height", "int4"),
+    ("image_width", "int4"),
+    ("capture_index", "int4"),
+)
+
+_COLUMN_NAMES = ", ".join(name for name, _ in RAW_CAPTURE_COLUMNS)
+
+COPY_RAW_CAPTURE = f"COPY raw_capture ({_COLUMN_NAMES}) FROM STDIN (FORMAT BINARY)"
+INSERT_RAW_CAPTURE = (
+    f"INSERT INTO raw_capture ({_COLUMN_NAMES}) "
+    f"VALUES ({', '.join(['%s'] * len(RAW_CAPTURE_COLUMNS))})"
+)
+
+# Claims (session_id, capture_index) keys for new captures. Rows are sorted
+# so concurrent batches lock keys in the same order. Conflicting keys belong
+# to captures that are already stored, and are not returned.
+CLAIM_CAPTURE_KEYS = """INSERT INTO capture_key (session_id, capture_index, capture_id)
+    SELECT session_id, capture_index, capture_id
+    FROM unnest(%s::varchar[], %s::int4[], %s::varchar[])
+        AS capture(session_id, capture_index, capture_id)
+    ORDER BY session_id, capture_index
+    ON CONFLICT DO NOTHING
+    RETURNING capture_id;
+    """
+
+SELECT_CAPTURE_KEYS = """SELECT
+        capture_key.session_id,
+        capture_key.capture_index,
+        capture_key.capture_id
+    FROM capture_key
+    JOIN unnest(%s::varchar[], %s::int4[]) AS capture(session_id, capture_index)
+        USING (session_id, capture_index);
+    """
+
+# Adds the newly claimed keys of a batch to each session's totals and returns
+# how many indices are missing between the first and last one received.
+TRACK_CAPTURE_SESSIONS = """INSERT INTO capture_session (
+        session_id,
+        received,
+        first_index,
+        last_index
+    )
+    SELECT session_id, count(*) FILTER (WHERE is_new), min(capture_index),
+        max(capture_index)
+    FROM unnest(%s::varchar[], %s::int4[], %s::bool[])
+        AS capture(session_id, capture_index, is_new)
+    GROUP BY session_id
+    ORDER BY session_id
+    ON CONFLICT (session_id) DO UPDATE SET
+        received = capture_session.received + EXCLUDED.received,
+        first_index = LEAST(capture_session.first_index, EXCLUDED.first_index),
+        last_index = GREATEST(capture_session.last_index, EXCLUDED.last_index)
+    RETURNING session_id, last_index - first_index + 1 - received AS missing;
+    """
+
+# Adds a batch's newly stored captures to their runs' summaries, one row per
+# run. Runs are sorted so concurrent batches lock summaries in the same order.
+TRACK_RUN_CAPTURES = """INSERT INTO run_summary (
+        run_id,
+        capture_count,
+        first_captured_at,
+        last_captured_at
+    )
+    SELECT run_id, count(*), min(captured_at), max(captured_at)
+    FROM unnest(%s::varchar[], %s::timestamp[]) AS capture(run_id, captured_at)
+    GROUP BY run_id
+    ORDER BY run_id
+    ON CONFLICT (run_id) DO UPDATE SET
+        capture_count = run_summary.capture_count + EXCLUDED.capture_count,
+        first_captured_at = LEAST(
+            run_summary.first_captured_at, EXCLUDED.first_captured_at
+        ),
+        last_captured_at = GREATEST(
+            run_summary.last_captured_at, EXCLUDED.last_captured_at
+        ),
+        updated_at = now() AT TIME ZONE 'UTC';
+    """
+
+SELECT_CAPTURE_SESSION = """SELECT
+        session_id,
+        received,
+        first_index,
+        last_index
+    FROM capture_session
+    WHERE session_id = %s;
+    """
+
+# Missing index ranges, as inclusive (start, end) pairs.
+SELECT_SESSION_GAPS = """SELECT gap_start, gap_end
+    FROM (
+        SELECT
+            lag(capture_index) OVER (ORDER BY capture_index) + 1 AS gap_start,
+            capture_index - 1 AS gap_end
+        FROM capture_key
+        WHERE session_id = %s
+    ) AS gaps
+    WHERE gap_start <= gap_end
+    ORDER BY gap_start
+    LIMIT %s;
+    """
+
+SELECT_RAW_COLLECTION = """SELECT
+        captured_at,
+        game_id,
+        run_id,
+        image_data,
+        screenshot_ref,
+        image_height,
+        image_width
+    FROM raw_capture
+    WHERE game_id = %s and session_id = %s;
+    """
+
+SELECT_CAPTURE_IMAGE = """SELECT
+        screenshot_ref,
+        screenshot_hash,
+        octet_length(image_data) AS inline_size,
+        substring(image_data FROM 1 FOR %s) AS inline_header
+    FROM raw_capture
+    WHERE capture_id = %s;
+    """
+
+SELECT_CAPTURE_IMAGE_CHUNK = """SELECT substring(image_data FROM %s FOR %s)
+    FROM raw_capture
+    WHERE capture_id = %s;
+    """
+
+SELECT_ARCHIVE_SEGMENTS = """SELECT segment_id
+    FROM raw_capture_segment
+    WHERE game_id = %s AND session_id = %s
+    ORDER BY first_captured_at, segment_id;
+    """
+
+SELECT_SESSION_ARCHIVE_SEGMENTS = """SELECT segment_id
+    FROM raw_capture_segment
+    WHERE session_id = %s
+    ORDER BY first_captured_at, segment_id;
+    """
+
+SELECT_ARCHIVED_CAPTURE_SEGMENT = """SELECT segment_id
+    FROM raw_capture_archive
+    WHERE capture_id = %s;
+    """
+
+INSERT_GAME = """INSERT INTO user_game (
+        user_id,
+        game_name,
+        game_version,
+        version_date
+    )
+    VALUES (%s, %s, %s, NOW())
+    RETURNING id;
+    """
+
+SELECT_GAME = """SELECT
+        id AS game_id,
+        user_id,
+        game_name,
+        game_version,
+        version_date
+    FROM user_game
+    WHERE id = %s;
+    """
+
+# Inserting a run or a choice upserts the run's summary in the same statement.
+INSERT_RUN = """WITH new_run AS (
+        INSERT INTO run (
+            game_id,
+            duration
+        )
+        VALUES (%s, %s)
+        RETURNING id, game_id, duration
+    ), summary AS (
+        INSERT INTO run_summary (run_id, game_id, duration)
+        SELECT id::varchar, game_id, duration
+        FROM new_run
+        ON CONFLICT (run_id) DO UPDATE SET
+            game_id = EXCLUDED.game_id,
+            duration = EXCLUDED.duration,
+            updated_at = now() AT TIME ZONE 'UTC'
+    )
+    SELECT id FROM new_run;
+    """
+
+SELECT_RUN = """SELECT
+        id AS run_id,
+        game_id,
+        duration
+    FROM run
+    WHERE id = %s;
+    """
+
+_RUN_SUMMARY_COLUMNS = """run_id,
+        game_id,
+        duration,
+        choice_count,
+        capture_count,
+        first_captured_at,
+        last_captured_at,
+        updated_at"""
+
+SELECT_RUN_SUMMARY = f"""SELECT
+        {_RUN_SUMMARY_COLUMNS}
+    FROM run_summary
+    WHERE run_id = %s;
+    """
+
+SELECT_GAME_RUN_SUMMARIES = f"""SELECT
+        {_RUN_SUMMARY_COLUMNS}
+    FROM run_summary
+    WHERE game_id = %s
+    ORDER BY run_id
+    LIMIT %s;
+    """
+
+INSERT_CHOICE = """WITH new_choice AS (
+        INSERT INTO choice (
+            run_id,
+            choice_options,
+            selected
+        )
+        VALUES (%s, %s, %s)
+        RETURNING id, run_id
+    ), summary AS (
+        INSERT INTO run_summary (run_id, choice_count)
+        SELECT run_id::varchar, 1
+        FROM new_choice
+        WHERE run_id IS NOT NULL
+        ON CONFLICT (run_id) DO UPDATE SET
+            choice_count = run_summary.choice_count + 1,
+            updated_at = now() AT TIME ZONE 'UTC'
+    )
+    SELECT id FROM new_choice;
+    """
+
+SELECT_CHOICES = """SELECT
+        id AS choice_id,
+        run_id,
+        choice_options,
+        selected
+    FROM choice
+    WHERE run_id = %s;
+    """
+
+SELECT_RUNS_CHOICES = """SELECT
+        id AS choice_id,
+        run_id,
+        choice_options,
+        selected
+    FROM choice
+    WHERE run_id = ANY(%s)
+    ORDER BY run_id, id;
+    """
+
+INSERT_USER = """INSERT INTO users (username, user_password)
+    VALUES (%s, %s)
+    RETURNING id;
+    """
+
+SELECT_USER = """SELECT id, username FROM users WHERE username = %s;"""
+
+
+@dataclass(slots=True, frozen=True)
+class Game:
+    game_id: int
+    user_id: int | None
+    game_name: str
+    game_version: str
+    version_date: datetime
+
+
+@dataclass(slots=True, frozen=True)
+class Run:
+    run_id: int
+    game_id: int | None
+    duration: float
+
+
+@dataclass(slots=True, frozen=True)
+class RunSummary:
+    run_id: str
+    game_id: int | None
+    duration: float | None
+    choice_count: int
+    capture_count: int
+    first_captured_at: datetime | None
+    last_captured_at: datetime | None
+    updated_at: datetime
+
+
+@dataclass(slots=True, frozen=True)
+class Choice:
+    choice_id: int
+    run_id: int | None
+    choice_options: Any
+    selected: str
+
+
+@dataclass(slots=True, frozen=True)
+class User:
+    id: int
+    username: str | None
+
+
+@dataclass(slots=True, frozen=True)
+class RawCapture:
+    captured_at: datetime
+    game_id: str
+    run_id: str | None
+    image_data: bytes | None
+    screenshot_ref: str | None
+    image_height: int | None
+    image_width: int | None
+
+
+@dataclass(slots=True, frozen=True)
+class CaptureSession:
+    session_id: str
+    received: int
+    first_index: int
+    last_index: int
+
+
+@dataclass(slots=True, frozen=True)
+class CaptureImage:
+    screenshot_ref: str | None
+    screenshot_hash: str | None
+    inline_size: int | None
+    inline_header: bytes | None
+
+
+def _insert_returning_id(query, params):
+    with DatabaseConnection.get_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute(query, params, prepare=True)
+            new_id = cur.fetchone()[0]
+        conn.commit()
+    return new_id
+
+
+def _fetch_all(row_type, query, params):
+    with DatabaseConnection.get_connection() as conn:
+        with conn.cursor(row_factory=class_row(row_type)) as cur:
+            return cur.execute(query, params, prepare=True).fetchall()
+
+
+def _fetch_one(row_type, query, params):
+    with DatabaseConnection.get_connection() as conn:
+        with conn.cursor(row_factory=class_row(row_type)) as cur:
+            return cur.execute(query, params, prepare=True).fetchone()
+
+
+def insert_game(user_id, game_name, game_version):
+    return _insert_returning_id(INSERT_GAME, (user_id, game_name, game_version))
+
+
+def get_games(game_id):
+    return _fetch_all(Game, SELECT_GAME, (game_id,))
+
+
+def insert_run(game_id, duration):
+    return _insert_returning_id(INSERT_RUN, (game_id, duration))
+
+
+def get_run(run_id):
+    return _fetch_one(Run, SELECT_RUN, (run_id,))
+
+
+def get_run_summary(run_id):
+    return _fetch_one(RunSummary, SELECT_RUN_SUMMARY, (run_id,))
+
+
+def get_game_run_summaries(game_id, limit):
+    return _fetch_all(RunSummary, SELECT_GAME_RUN_SUMMARIES, (game_id, limit))
+
+
+def insert_choice(run_id, choice_options, selected):
+    return _insert_returning_id(INSERT_CHOICE, (run_id, Json(choice_options), selected))
+
+
+def get_choices(run_id):
+    return _fetch_all(Choice, SELECT_CHOICES, (run_id,))
+
+
+# Streamed rows stay dicts rather than dataclasses. They are merged with
+# archived rows, which are dicts, and serialized to JSON, MessagePack or Arrow
+# by column name.
+def _iter_rows(conn, name, query, params, fetch_size):
+    with conn.cursor(name=f"{name}_{uuid.uuid4().hex}", row_factory=dict_row) as cur:
+        cur.itersize = fetch_size
+        cur.execute(query, params)
+        yield from cur
+
+
+def iter_choices(conn, run_id, fetch_size):
+    """Yields the choices of a run as dicts, `fetch_size` rows per round trip."""
+    yield from _iter_rows(conn, "choices", SELECT_CHOICES, (run_id,), fetch_size)
+
+
+def insert_user(username, stored_password):
+    return _insert_returning_id(INSERT_USER, (username, stored_password))
+
+
+def get_user(username):
+    return _fetch_one(User, SELECT_USER, (username,))
+
+
+def get_raw_collection(game_id, session_id):
+    captures = _fetch_all(RawCapture, SELECT_RAW_COLLECTION, (game_id, session_id))
+    archived = [
+        RawCapture(**{field: row[field] for field in RawCapture.__slots__})
+        for row in get_archived_captures(game_id, session_id)
+    ]
+    return archived + captures
+
+
+def iter_raw_collection(conn, game_id, session_id, fetch_size):
+    """
+    Streaming counterpart of `get_raw_collection`: the same rows as dicts,
+    archived first, then live ones from a server-side cursor.
+    """
+    for row in get_archived_captures(game_id, session_id, conn):
+        yield {field: row[field] for field in RawCapture.__slots__}
+    yield from _iter_rows(
+        conn,
+        "raw_collection",
+        SELECT_RAW_COLLECTION,
+        (game_id, session_id),
+        fetch_size,
+    )
+
+
+def _capture_order(row):
+    return row["captured_at"], row["capture_id"]
+
+
+def _archive_segment_ids(conn, game_id, session_id):
+    if game_id is None:
+        query, params = SELECT_SESSION_ARCHIVE_SEGMENTS, (session_id,)
+    else:
+        query, params = SELECT_ARCHIVE_SEGMENTS, (game_id, session_id)
+    with conn.cursor() as cur:
+        cur.execute(query, params, prepare=True)
+        return [segment_id for (segment_id,) in cur.fetchall()]
+
+
+def get_archived_captures(game_id, session_id, conn=None):
+    """
+    Yields the archived rows of a session as dicts, in (captured_at,
+    capture_id) order. A `game_id` of None matches the session in any game.
+    Pass `conn` to look up the segments on a connection the caller already
+    holds.
+    """
+    if conn is None:
+        with DatabaseConnection.get_connection() as conn:
+            segment_ids = _archive_segment_ids(conn, game_id, session_id)
+    else:
+        segment_ids = _archive_segment_ids(conn, game_id, session_id)
+
+    # Segments of one session only overlap in time when late captures were
+    # archived in a later pass, so merge them instead of concatenating.
+    yield from heapq.merge(
+        *(archive_store.read_segment(segment_id) for segment_id in segment_ids),
+        key=_capture_order,
+    )
+
+
+def get_archived_capture(capture_id):
+    """Returns the archived row of a capture as a dict, or None."""
+    with DatabaseConnection.get_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute(SELECT_ARCHIVED_CAPTURE_SEGMENT, (capture_id,), prepare=True)
+            row = cur.fetchone()
+    if row is None:
+        return None
+    return archive_store.read_capture(row[0], capture_id)
+
+
+def get_capture_session(session_id):
+    return _fetch_one(CaptureSession, SELECT_CAPTURE_SESSION, (session_id,))
+
+
+def get_session_gaps(session_id, limit):
+    with DatabaseConnection.get_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute(SELECT_SESSION_GAPS, (session_id, limit), prepare=True)
+            return cur.fetchall()
+
+
+def get_capture_image(capture_id, header_size):
+    return _fetch_one(CaptureImage, SELECT_CAPTURE_IMAGE, (header_size, capture_id))
+
+
+def read_capture_image_chunk(capture_id, offset, length):
+    """Returns `length` bytes of the inline image, starting at 0-based `offset`."""
+    with DatabaseConnection.get_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                SELECT_CAPTURE_IMAGE_CHUNK,
+                (offset + 1, length, capture_id),
+                prepare=True,
+            )
+            return cur.fetchone()[0]
+
+
+def _stream_columns(include_images):
+    columns = ["capture_id", "captured_at", "capture_index", "game_id", "run_id"]
+    if include_images:
+        columns.append("image_data")
+    return columns + ["screenshot_ref", "image_height", "image_width"]
+
+
+def raw_capture_stream_query(include_images, has_after, has_limit):
+    after_clause = "AND (captured_at, capture_id) > (%s, %s)" if has_after else ""
+    limit_clause = "LIMIT %s" if has_limit else ""
+
+    return f"""SELECT
+            {", ".join(_stream_columns(include_images))}
+        FROM raw_capture
+        WHERE game_id = %s AND session_id = %s
+        {after_clause}
+        ORDER BY captured_at, capture_id
+        {limit_clause};
+        """
+
+
+def archived_capture_stream(conn, game_id, session_id, include_images, after=None):
+    """
+    Archived counterpart of `raw_capture_stream_query`: the same columns and
+    order, starting after the `(captured_at, capture_id)` cursor `after`.
+    """
+    columns = _stream_columns(include_images)
+    for row in get_archived_captures(game_id, session_id, conn):
+        if after is None or _capture_order(row) > tuple(after):
+            yield {column: row.get(column) for column in columns}
+
+
+EXPORT_COLUMNS = (
+    "capture_id",
+    "game_id",
+    "run_id",
+    "captured_at",
+    "capture_index",
+    "mouse_x",
+    "mouse_y",
+    "image_data",
+    "screenshot_ref",
+    "screenshot_hash",
+    "image_height",
+    "image_width",
+)
+
+
+def session_export_query(has_game_id, has_from_index):
+    game_clause = "AND game_id = %s" if has_game_id else ""
+    index_clause = "AND capture_index >= %s" if has_from_index else ""
+
+    return f"""SELECT
+            {", ".join(EXPORT_COLUMNS)}
+        FROM raw_capture
+        WHERE session_id = %s
+        {game_clause}
+        {index_clause}
+        ORDER BY capture_index, capture_id;
+        """
+
+
+def _export_order(row):
+    # Postgres sorts NULL capture_index values last.
+    index = row.get("capture_index")
+    return index is None, index or 0, row["capture_id"]
+
+
+def _archived_export_rows(conn, game_id, session_id, from_index):
+    """
+    Yields the archived rows of a session in (capture_index, capture_id)
+    order. Segments are written in captured_at order, so each one is read
+    once for its keys, then record by record in key order.
+    """
+
+    def ordered(segment_id):
+        keys = sorted(
+            _export_order(row)
+            for row in archive_store.read_segment(segment_id)
+            if from_index is None
+            or (
+                row.get("capture_index") is not None
+                and row["capture_index"] >= from_index
+            )
+        )
+        for _, _, capture_id in keys:
+            yield archive_store.read_capture(segment_id, capture_id)
+
+    segment_ids = _archive_segment_ids(conn, game_id, session_id)
+    yield from heapq.merge(
+        *(ordered(segment_id) for segment_id in segment_ids), key=_export_order
+    )
+
+
+def iter_session_export(conn, session_id, game_id, from_index, fetch_size):
+    """
+    Yields every capture of a session as a dict of EXPORT_COLUMNS, archived
+    and live merged in (capture_index, capture_id) order, skipping captures
+    whose capture_index is below `from_index`.
+    """
+    params = [session_id]
+    if game_id is not None:
+        params.append(game_id)
+    if from_index is not None:
+        params.append(from_index)
+    live = _iter_rows(
+        conn,
+        "session_export",
+        session_export_query(game_id is not None, from_index is not None),
+        params,
+        fetch_size,
+    )
+    archived = (
+        {column: row.get(column) for column in EXPORT_COLUMNS}
+        for row in _archived_export_rows(conn, game_id, session_id, from_index)
+    )
+    yield from heapq.merge(archived, live, key=_export_order)
+
+
+def iter_runs_choices(conn, run_ids, fetch_size):
+    """Yields the choices of the given runs as dicts, ordered by run and id."""
+    yield from _iter_rows(
+        conn, "runs_choices", SELECT_RUNS_CHOICES, (list(run_ids),), fetch_size
+    )
+
+
+# Filters of the /query endpoints, by name. Queries bind the params of the
+# filters that are set in this order.
+CAPTURE_FILTERS = {
+    "game_id": "game_id = %s",
+    "session_id": "session_id = %s",
+    "run_id": "run_id = %s",
+    "captured_from": "captured_at >= %s",
+    "captured_to": "captured_at < %s",
+    "from_index": "capture_index >= %s",
+    "to_index": "capture_index <= %s",
+}
+
+QUERY_COLUMNS = (
+    "capture_id",
+    "game_id",
+    "session_id",
+    "run_id",
+    "captured_at",
+    "received_at",
+    "capture_index",
+    "mouse_x",
+    "mouse_y",
+    "screenshot_ref",
+    "image_width",
+    "image_height",
+)
+
+SET_STATEMENT_TIMEOUT = "SELECT set_config('statement_timeout', %s, true);"
+
+
+def _filter_clause(filters):
+    return " AND ".join(
+        condition for name, condition in CAPTURE_FILTERS.items() if name in filters
+    )
+
+
+def capture_query(filters, has_after):
+    after_clause = "AND (captured_at, capture_id) > (%s, %s)" if has_after else ""
+
+    return f"""SELECT
+            {", ".join(QUERY_COLUMNS)}
+        FROM raw_capture
+        WHERE {_filter_clause(filters)}
+        {after_clause}
+        ORDER BY captured_at, capture_id
+        LIMIT %s;
+        """
+
+
+def captures_per_minute_query(filters):
+    return f"""SELECT
+            session_id,
+            date_trunc('minute', captured_at) AS minute,
+            count(*) AS captures
+        FROM raw_capture
+        WHERE {_filter_clause(filters)}
+        GROUP BY session_id, minute
+        ORDER BY session_id, minute
+        LIMIT %s;
+        """
+
+
+def ingest_lag_query(filters):
+    # Lags are in seconds. Sessions with the worst tail come first.
+    return f"""SELECT
+            session_id,
+            count(*) AS captures,
+            percentile_cont(0.5) WITHIN GROUP (ORDER BY lag) AS p50,
+            percentile_cont(0.9) WITHIN GROUP (ORDER BY lag) AS p90,
+            percentile_cont(0.99) WITHIN GROUP (ORDER BY lag) AS p99,
+            max(lag) AS max
+        FROM (
+            SELECT
+                session_id,
+                extract(epoch FROM received_at - captured_at)::float8 AS lag
+            FROM raw_capture
+            WHERE {_filter_clause(filters)}
+        ) AS lags
+        GROUP BY session_id
+        ORDER BY p99 DESC, session_id
+        LIMIT %s;
+        """
+
+
+def run_frames_query(filters):
+    return f"""SELECT
+            run_id,
+            count(*) AS frames,
+            min(captured_at) AS first_captured_at,
+            max(captured_at) AS last_captured_at
+        FROM raw_capture
+        WHERE run_id IS NOT NULL AND {_filter_clause(filters)}
+        GROUP BY run_id
+        ORDER BY first_captured_at, run_id
+        LIMIT %s;
+        """
+
+
+def run_capture_query(query, filters, params, timeout_ms):
+    """
+    Runs a query built by one of the /query builders above and returns its
+    rows as dicts, since every builder selects different columns. `filters`
+    maps filter names to values, `params` are bound after them. The query is
+    cancelled after `timeout_ms`.
+    """
+    values = [filters[name] for name in CAPTURE_FILTERS if name in filters]
+    with DatabaseConnection.get_connection() as conn:
+        with conn.cursor(row_factory=dict_row) as cur:
+            cur.execute(SET_STATEMENT_TIMEOUT, (f"{timeout_ms}ms",), prepare=True)
+            rows = cur.execute(query, values + list(params), prepare=True).fetchall()
+        conn.commit()
+    return rows
@@ -1,11 +1,15 @@
 from flasgger import swag_from
 from flask import Blueprint, jsonify, request
-from psycopg.rows import dict_row
 
-from src.db import DatabaseConnection
+from src import repository
+from src.cache import cache_response, cached_response
 from src.errors import MissingCollectorParam
+from src.ingestion.collector import _parse_int
 from src.util import validate_data
 
+RUN_SUMMARY_LIMIT = 100
+RUN_SUMMARY_MAX_LIMIT = 1000
+
 Run = Blueprint("run", __name__)
 
 
@@ -19,25 +23,7 @@ def insert_run_to_db():
     validate_data(["game_id", "duration"], data)
 
     try:
-        with DatabaseConnection.get_connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute(
-                    """
-                    INSERT INTO run(
-                        game_id,
-                        duration
-                    )
-                    VALUES(%s,%s)
-                    RETURNING id;
-                    """,
-                    (
-                        game_id,
-                        duration,
-                    ),
-                )
-                run_id = cur.fetchone()[0]
-                conn.commit()
-
+        run_id = repository.insert_run(game_id, duration)
     except Exception as e:
         return jsonify(
             {"error": "Client Side Error", "message": str(e), "type": type(e).__name__}
@@ -49,24 +35,15 @@ def insert_run_to_db():
 @Run.route("/collect/run", methods=["GET"])
 @swag_from("../docs/run_get.yml")
 def get_run():
-    run_id = request.args.get("run_id")
-    if not run_id:
-        raise MissingCollectorParam("run_id is required")
+    # Parsed, so `42` and `042` share one cache entry.
+    run_id = _parse_int(request.args.get("run_id"), "run_id", required=True)
 
-    try:
-        with DatabaseConnection.get_connection() as conn:
-            with conn.cursor(row_factory=dict_row) as cur:
-                run = cur.execute(
-                    """SELECT
-                        id AS run_id,
-                        game_id,
-                        duration
-                    FROM run
-                    WHERE id = %s;
-                    """,
-                    (run_id,),
-                ).fetchone()
+    cached = cached_response(f"run:{run_id}")
+    if cached is not None:
+        return cached
 
+    try:
+        run = repository.get_run(run_id)
     except Exception as e:
         return jsonify(
             {"error": "Client Side Error", "message": str(e), "type": type(e).__name__}
@@ -75,4 +52,36 @@ def get_run():
     if not run:
         return jsonify({"error": "Run not found"}), 404
 
-    return jsonify(run), 200
+    return cache_response(f"run:{run_id}", jsonify(run)), 200
+
+
+@Run.route("/collect/run/summary", methods=["GET"])
+@swag_from("../docs/run_summary_get.yml")
+def get_run_summary():
+    """
+    Serves the incrementally maintained run_summary: one run by run_id, or
+    the runs of a game by game_id.
+    """
+    run_id = request.args.get("run_id")
+    game_id = request.args.get("game_id")
+    if not run_id and not game_id:
+        raise MissingCollectorParam("run_id or game_id is required")
+
+    try:
+        if run_id:
+            summary = repository.get_run_summary(run_id)
+        else:
+            limit = int(request.args.get("limit", RUN_SUMMARY_LIMIT))
+            if not 0 < limit <= RUN_SUMMARY_MAX_LIMIT:
+                raise ValueError(f"limit must be between 1 and {RUN_SUMMARY_MAX_LIMIT}")
+            summaries = repository.get_game_run_summaries(int(game_id), limit)
+    except Exception as e:
+        return jsonify(
+            {"error": "Client Side Error", "message": str(e), "type": type(e).__name__}
+        ), 400
+
+    if not run_id:
+        return jsonify({"data": summaries}), 200
+    if summary is None:
+        return jsonify({"error": "Run not found"}), 404
+    return jsonify(summary), 200
@@ -1,5 +1,23 @@
+import os
+
 from flask_socketio import SocketIO
 
+# With a message queue (e.g. redis://redis:6379/0) emits and room broadcasts
+# reach clients connected to any worker, not only the emitting one.
+SOCKETIO_MESSAGE_QUEUE = os.environ.get("SOCKETIO_MESSAGE_QUEUE")
+# Shared with src/asgi.py, so both servers can run against the same queue.
+SOCKETIO_CHANNEL = os.environ.get("SOCKETIO_CHANNEL", "gamelens-socketio")
+# Long-polling sends each request of a client separately, so with more than
+# one worker they only all reach the worker holding its session behind a
+# sticky load balancer. Without one, only websocket connections are accepted.
+# Set to "polling,websocket" when running behind one.
+SOCKETIO_TRANSPORTS = os.environ.get(
+    "SOCKETIO_TRANSPORTS",
+    "websocket"
+    if int(os.environ.get("GUNICORN_WORKERS", "1")) > 1
+    else "polling,websocket",
+).split(",")
+
 socketio = SocketIO()
 
 
@@ -9,4 +27,7 @@ def init_socketio(app):
         cors_allowed_origins="*",
         logger=True,
         engineio_logger=True,
+        message_queue=SOCKETIO_MESSAGE_QUEUE,
+        channel=SOCKETIO_CHANNEL,
+        transports=SOCKETIO_TRANSPORTS,
     )
@@ -0,0 +1,194 @@
+import json
+import os
+import struct
+import tempfile
+import uuid
+import zlib
+from abc import ABC, abstractmethod
+from datetime import datetime
+from functools import lru_cache
+
+from src.util import UPLOAD_DIR
+
+ARCHIVE_STORE_BACKEND = os.environ.get("ARCHIVE_STORE", "local")
+# Next to the blob store's default root, not inside it.
+ARCHIVE_STORE_DIR = os.environ.get(
+    "ARCHIVE_STORE_DIR", os.path.join(os.path.dirname(UPLOAD_DIR), "archive")
+)
+ARCHIVE_COMPRESSION_LEVEL = int(os.environ.get("ARCHIVE_COMPRESSION_LEVEL", "6"))
+ARCHIVE_INDEX_CACHE_SIZE = int(os.environ.get("ARCHIVE_INDEX_CACHE_SIZE", "256"))
+
+SEGMENT_VERSION = 1
+
+# Each record is zlib(meta length + meta JSON + inline image bytes).
+_META_LENGTH = struct.Struct(">I")
+_DATETIME_FIELDS = ("captured_at", "received_at")
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, (bytes, memoryview)):
+        raise TypeError("binary columns other than image_data cannot be archived")
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def encode_record(row, image_data, level=ARCHIVE_COMPRESSION_LEVEL):
+    """Compresses one raw_capture row (without image_data) and its image."""
+    meta = json.dumps(
+        {**row, "inline_image": image_data is not None}, default=_json_default
+    ).encode()
+    return zlib.compress(
+        _META_LENGTH.pack(len(meta)) + meta + (image_data or b""), level
+    )
+
+
+def decode_record(data):
+    """Inverse of `encode_record`. Returns the row dict, with `image_data`."""
+    payload = memoryview(zlib.decompress(data))
+    (meta_length,) = _META_LENGTH.unpack_from(payload)
+    meta_end = _META_LENGTH.size + meta_length
+    row = json.loads(payload[_META_LENGTH.size : meta_end].tobytes())
+    for field in _DATETIME_FIELDS:
+        if row.get(field):
+            row[field] = datetime.fromisoformat(row[field])
+    row["image_data"] = (
+        payload[meta_end:].tobytes() if row.pop("inline_image") else None
+    )
+    return row
+
+
+class ArchiveStore(ABC):
+    """
+    Cold storage for captures moved out of raw_capture.
+
+    A segment is written once and never modified: records are appended, one
+    per capture and each compressed on its own, and a sidecar index maps
+    every capture_id to its record's offset and length. Reading one capture
+    is a single seek and read.
+    """
+
+    @abstractmethod
+    def write_segment(self, records):
+        """
+        Writes `(row, image_data)` pairs, in order, to a new segment and
+        returns `(segment_id, byte_size)`.
+        """
+
+    @abstractmethod
+    def read_capture(self, segment_id, capture_id):
+        """Returns the archived row of `capture_id`, or None."""
+
+    @abstractmethod
+    def read_segment(self, segment_id):
+        """Yields every archived row of a segment, in the order written."""
+
+    @abstractmethod
+    def delete_segment(self, segment_id):
+        pass
+
+
+@lru_cache(maxsize=ARCHIVE_INDEX_CACHE_SIZE)
+def _load_index(path):
+    # Segments are immutable, so an index never has to be invalidated.
+    with open(path, "rb") as f:
+        index = json.load(f)
+    if index["version"] != SEGMENT_VERSION:
+        raise ValueError(f"Unsupported segment version: {index['version']}")
+    return {
+        capture_id: (offset, length) for capture_id, offset, length in index["records"]
+    }
+
+
+def _write_atomic(directory, path, chunks):
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            for chunk in chunks:
+                f.write(chunk)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+
+class LocalArchiveStore(ArchiveStore):
+    """
+    Stores segments on the local filesystem as `<root>/ab/<id>.seg` with the
+    index next to it in `<id>.idx`.
+    """
+
+    def __init__(self, root, level=ARCHIVE_COMPRESSION_LEVEL):
+        self.root = root
+        self.level = level
+        os.makedirs(self.root, exist_ok=True)
+
+    def path(self, segment_id, suffix):
+        return os.path.join(self.root, segment_id[:2], f"{segment_id}.{suffix}")
+
+    def write_segment(self, records):
+        segment_id = uuid.uuid4().hex
+        directory = os.path.dirname(self.path(segment_id, "seg"))
+        os.makedirs(directory, exist_ok=True)
+
+        index = []
+
+        def encoded():
+            offset = 0
+            for row, image_data in records:
+                record = encode_record(row, image_data, self.level)
+                index.append((row["capture_id"], offset, len(record)))
+                offset += len(record)
+                yield record
+
+        # The segment goes into place before its index. A segment without an
+        # index is never read, and the catalog only references segments after
+        # both exist.
+        _write_atomic(directory, self.path(segment_id, "seg"), encoded())
+        _write_atomic(
+            directory,
+            self.path(segment_id, "idx"),
+            [json.dumps({"version": SEGMENT_VERSION, "records": index}).encode()],
+        )
+        return segment_id, sum(length for _, _, length in index)
+
+    def read_capture(self, segment_id, capture_id):
+        entry = _load_index(self.path(segment_id, "idx")).get(capture_id)
+        if entry is None:
+            return None
+        offset, length = entry
+        with open(self.path(segment_id, "seg"), "rb") as f:
+            f.seek(offset)
+            return decode_record(f.read(length))
+
+    def read_segment(self, segment_id):
+        # One record at a time, so merging many segments holds one record of
+        # each rather than whole segments.
+        index = _load_index(self.path(segment_id, "idx"))
+        with open(self.path(segment_id, "seg"), "rb") as f:
+            for offset, length in index.values():
+                f.seek(offset)
+                yield decode_record(f.read(length))
+
+    def delete_segment(self, segment_id):
+        for suffix in ("idx", "seg"):
+            path = self.path(segment_id, suffix)
+            if os.path.exists(path):
+                os.unlink(path)
+
+
+_BACKENDS = {
+    "local": lambda: LocalArchiveStore(ARCHIVE_STORE_DIR),
+}
+
+
+def create_archive_store(backend=ARCHIVE_STORE_BACKEND):
+    if backend not in _BACKENDS:
+        raise ValueError(f"Unknown ARCHIVE_STORE backend: {backend}")
+    return _BACKENDS[backend]()
+
+
+archive_store = create_archive_store()
@@ -0,0 +1,211 @@
+import hashlib
+import os
+import re
+import shutil
+import tempfile
+from abc import ABC, abstractmethod
+
+from src.util import UPLOAD_DIR
+
+BLOB_STORE_BACKEND = os.environ.get("BLOB_STORE", "local")
+BLOB_STORE_DIR = os.environ.get("BLOB_STORE_DIR", UPLOAD_DIR)
+
+# A sha256 key, or a preview of one (`<key>.<size>.webp`).
+_KEY_RE = re.compile(r"[0-9a-f]{64}(\.[0-9]+\.webp)?")
+_SHARD_RE = re.compile(r"[0-9a-f]{2}")
+
+
+def content_hash(data):
+    """Server-side content hash used as the blob key."""
+    return hashlib.sha256(data).hexdigest()
+
+
+class BlobStore(ABC):
+    """
+    Content-addressed storage for capture images.
+
+    Blobs are keyed by the sha256 of their content, so identical frames are
+    stored once no matter how many captures reference them. Storing a blob
+    that already exists marks it as written again, so `src.maintenance.blobs`
+    never collects a blob a new capture is about to reference.
+    """
+
+    @abstractmethod
+    def put(self, data):
+        """Store `data` and return its key."""
+
+    def put_file(self, path, key):
+        """
+        Store the finished file at `path`, whose content hash is `key`. The
+        file is left in place.
+        """
+        with open(path, "rb") as f:
+            self.put(f.read())
+
+    @abstractmethod
+    def put_as(self, key, data):
+        """
+        Store `data` under a caller-chosen `key`, for blobs derived from
+        another one, such as previews. Overwrites an existing blob.
+        """
+
+    @abstractmethod
+    def open(self, key):
+        """Return a readable binary file object for `key`."""
+
+    @abstractmethod
+    def exists(self, key):
+        """Whether a blob is stored under `key`."""
+
+    @abstractmethod
+    def iter_keys(self, written_before):
+        """Yield the key of every blob last written before `written_before`."""
+
+    @abstractmethod
+    def delete(self, key, written_before):
+        """
+        Delete `key` unless it was written again since `written_before`.
+        Returns whether it was deleted.
+        """
+
+    def read(self, key):
+        with self.open(key) as f:
+            return f.read()
+
+
+class LocalBlobStore(BlobStore):
+    """
+    Stores blobs on the local filesystem, sharded by hash prefix
+    (`<root>/ab/cd/abcd...`) to keep directories small.
+    """
+
+    def __init__(self, root, shard_depth=2):
+        self.root = root
+        self.shard_depth = shard_depth
+        os.makedirs(self.root, exist_ok=True)
+
+    def path(self, key):
+        shards = [key[i * 2 : i * 2 + 2] for i in range(self.shard_depth)]
+        return os.path.join(self.root, *shards, key)
+
+    def put(self, data):
+        key = content_hash(data)
+        if not self._touch(self.path(key)):
+            self.put_as(key, data)
+        return key
+
+    @staticmethod
+    def _touch(path):
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return False
+        return True
+
+    def put_as(self, key, data):
+        path = self.path(key)
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+
+        # Write to a temp file in the same directory and rename it into place,
+        # so readers never observe a partially written blob.
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+
+    def put_file(self, path, key):
+        target = self.path(key)
+        if self._touch(target):
+            return
+
+        directory = os.path.dirname(target)
+        os.makedirs(directory, exist_ok=True)
+        try:
+            # Same filesystem: no copy, and the link appears atomically.
+            os.link(path, target)
+        except FileExistsError:
+            pass
+        except OSError:
+            fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-")
+            try:
+                with os.fdopen(fd, "wb") as f, open(path, "rb") as src:
+                    shutil.copyfileobj(src, f, 1024 * 1024)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp_path, target)
+            except BaseException:
+                if os.path.exists(tmp_path):
+                    os.unlink(tmp_path)
+                raise
+
+    def open(self, key):
+        return open(self.path(key), "rb")
+
+    def exists(self, key):
+        return os.path.exists(self.path(key))
+
+    def iter_keys(self, written_before):
+        # Only shard directories are walked, and only files stored where
+        # their key shards to are blobs. Anything else under the root, such
+        # as archive segments or upload staging, is left alone.
+        for directory in self._shard_dirs(self.root, self.shard_depth):
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if (
+                        not _KEY_RE.fullmatch(entry.name)
+                        or not entry.is_file(follow_symlinks=False)
+                        or self.path(entry.name) != entry.path
+                    ):
+                        continue
+                    try:
+                        mtime = entry.stat(follow_symlinks=False).st_mtime
+                    except FileNotFoundError:
+                        continue
+                    if mtime < written_before:
+                        yield entry.name
+
+    def _shard_dirs(self, directory, depth):
+        if depth == 0:
+            yield directory
+            return
+        with os.scandir(directory) as entries:
+            shards = sorted(
+                entry.path
+                for entry in entries
+                if _SHARD_RE.fullmatch(entry.name)
+                and entry.is_dir(follow_symlinks=False)
+            )
+        for shard in shards:
+            yield from self._shard_dirs(shard, depth - 1)
+
+    def delete(self, key, written_before):
+        path = self.path(key)
+        try:
+            if os.stat(path).st_mtime >= written_before:
+                return False
+            os.unlink(path)
+        except FileNotFoundError:
+            return False
+        return True
+
+
+_BACKENDS = {
+    "local": lambda: LocalBlobStore(BLOB_STORE_DIR),
+}
+
+
+def create_blob_store(backend=BLOB_STORE_BACKEND):
+    if backend not in _BACKENDS:
+        raise ValueError(f"Unknown BLOB_STORE backend: {backend}")
+    return _BACKENDS[backend]()
+
+
+blob_store = create_blob_store()
@@ -0,0 +1,24 @@
+"""
+Downscaled previews of capture images.
+
+The preview worker (`python -m src.pipeline.previews`) renders a WebP for
+every size in PREVIEW_SIZES, the length of the longest edge in pixels. Each
+preview is stored in the blob store next to its original, under
+`<screenshot_ref>.<size>.webp`. Read endpoints serve previews through their
+`size` parameter.
+"""
+
+import os
+
+# An empty list turns previews off.
+PREVIEW_SIZES = tuple(
+    int(size)
+    for size in os.environ.get("PREVIEW_SIZES", "256").split(",")
+    if size.strip()
+)
+PREVIEW_QUALITY = int(os.environ.get("PREVIEW_QUALITY", "80"))
+PREVIEW_MIMETYPE = "image/webp"
+
+
+def preview_key(screenshot_ref, size):
+    return f"{screenshot_ref}.{size}.webp"
@@ -0,0 +1,250 @@
+"""
+Staging area for resumable uploads.
+
+An upload is a `<id>.part` file that grows by appended chunks, plus an
+`<id>.json` state file with its declared length. The offset is simply the
+size of the part file, so every worker sees the same state. The sha256 of
+the part is computed as chunks are written. Only a worker that did not see
+the earlier chunks rehashes the file from disk.
+
+The staging directory sits next to the blob store by default, so finished
+uploads are hard-linked into the store instead of copied.
+"""
+
+import fcntl
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from src.errors import UploadConflictError, UploadNotFoundError, UploadTooLargeError
+from src.storage.blob import BLOB_STORE_DIR
+
+# A sibling of the blob store, so finished files can be hard-linked into it,
+# but outside its root.
+UPLOAD_STAGING_DIR = os.environ.get(
+    "UPLOAD_STAGING_DIR", os.path.normpath(BLOB_STORE_DIR) + ".staging"
+)
+UPLOAD_MAX_SIZE = int(os.environ.get("UPLOAD_MAX_SIZE", str(512 * 1000 * 1000)))
+# Uploads untouched for this long are removed.
+UPLOAD_TTL = int(os.environ.get("UPLOAD_TTL", str(24 * 3600)))
+UPLOAD_HASHER_CACHE_SIZE = int(os.environ.get("UPLOAD_HASHER_CACHE_SIZE", "256"))
+
+_READ_SIZE = 64 * 1024
+_PURGE_INTERVAL = 60
+_UPLOAD_ID = re.compile(r"^[0-9a-f]{32}$")
+
+
+class Upload:
+    """
+    An upload held under its lock. Use `UploadStaging.open` to get one.
+    """
+
+    def __init__(self, staging, upload_id, state_file, state):
+        self.staging = staging
+        self.upload_id = upload_id
+        self.path = staging.path(upload_id, "part")
+        self._state_file = state_file
+        self._state = state
+
+    @property
+    def length(self):
+        return self._state.get("length")
+
+    @property
+    def capture_id(self):
+        """The capture this upload was finalized into, or None."""
+        return self._state.get("capture_id")
+
+    @property
+    def offset(self):
+        if self.capture_id:
+            return self.length
+        return os.path.getsize(self.path)
+
+    def _save(self):
+        self._state_file.seek(0)
+        self._state_file.truncate()
+        self._state_file.write(json.dumps(self._state).encode())
+        self._state_file.flush()
+        os.fsync(self._state_file.fileno())
+
+    def append(self, offset, stream):
+        """
+        Appends `stream` at `offset`, which must be the current offset, and
+        returns the new offset. Bytes written before a dropped connection
+        are kept, so the client can resume from there.
+        """
+        current = self.offset
+        if self.capture_id:
+            raise UploadConflictError("Upload is already finalized.")
+        if offset != current:
+            raise UploadConflictError(f"Upload offset is {current}, not {offset}.")
+
+        limit = self.length if self.length is not None else UPLOAD_MAX_SIZE
+        hasher = self.staging._hasher(self.upload_id, self.path, current)
+        with open(self.path, "ab") as f:
+            try:
+                while chunk := stream.read(_READ_SIZE):
+                    if current + len(chunk) > limit:
+                        # Never write past the limit, so a sealed part never changes.
+                        chunk = chunk[: limit - current]
+                        f.write(chunk)
+                        hasher.update(chunk)
+                        current += len(chunk)
+                        raise UploadTooLargeError(
+                            f"Upload is limited to {limit} bytes."
+                        )
+                    f.write(chunk)
+                    hasher.update(chunk)
+                    current += len(chunk)
+            finally:
+                f.flush()
+                os.fsync(f.fileno())
+                self.staging._keep_hasher(self.upload_id, current, hasher)
+        return current
+
+    def header(self, size):
+        with open(self.path, "rb") as f:
+            return f.read(size)
+
+    def seal(self):
+        """
+        Checks the upload is complete, fixes its length and returns the
+        sha256 of its content.
+        """
+        offset = self.offset
+        if self.length is not None and offset != self.length:
+            raise UploadConflictError(
+                f"Upload has {offset} of {self.length} bytes, it is not complete."
+            )
+        if offset == 0:
+            raise UploadConflictError("Upload is empty.")
+        if self.length is None:
+            self._state["length"] = offset
+            self._save()
+        hasher = self.staging._hasher(self.upload_id, self.path, offset)
+        # Kept, so retrying a failed finalize does not rehash the file.
+        self.staging._keep_hasher(self.upload_id, offset, hasher)
+        return hasher.hexdigest()
+
+    def complete(self, capture_id):
+        """Records the capture the upload became and drops the part file."""
+        self._state["capture_id"] = capture_id
+        self._save()
+        self.staging._drop_hasher(self.upload_id)
+        os.unlink(self.path)
+
+
+class UploadStaging:
+    def __init__(self, root):
+        self.root = root
+        os.makedirs(self.root, exist_ok=True)
+        self._hashers = OrderedDict()
+        self._hashers_lock = threading.Lock()
+        self._last_purge = 0
+
+    def path(self, upload_id, suffix):
+        return os.path.join(self.root, f"{upload_id}.{suffix}")
+
+    def create(self, length=None):
+        if length is not None and not 0 < length <= UPLOAD_MAX_SIZE:
+            raise UploadTooLargeError(
+                f"Upload length must be between 1 and {UPLOAD_MAX_SIZE} bytes."
+            )
+        self.purge_expired()
+
+        upload_id = uuid.uuid4().hex
+        open(self.path(upload_id, "part"), "xb").close()
+        with open(self.path(upload_id, "json"), "xb") as f:
+            f.write(json.dumps({"length": length}).encode())
+        return upload_id
+
+    @contextmanager
+    def open(self, upload_id):
+        """
+        Locks the upload for the duration of the block. Raises
+        UploadConflictError when another request holds it.
+        """
+        if not _UPLOAD_ID.match(upload_id):
+            raise UploadNotFoundError()
+        try:
+            state_file = open(self.path(upload_id, "json"), "r+b")
+        except FileNotFoundError:
+            raise UploadNotFoundError() from None
+
+        with state_file:
+            try:
+                # Non-blocking, so an eventlet worker never stalls on it.
+                fcntl.flock(state_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                raise UploadConflictError(
+                    "Upload is busy with another request."
+                ) from None
+            try:
+                state = json.loads(state_file.read())
+                os.utime(state_file.fileno())
+                yield Upload(self, upload_id, state_file, state)
+            finally:
+                fcntl.flock(state_file, fcntl.LOCK_UN)
+
+    def abort(self, upload_id):
+        with self.open(upload_id) as upload:
+            self._drop_hasher(upload_id)
+            for suffix in ("part", "json"):
+                try:
+                    os.unlink(self.path(upload.upload_id, suffix))
+                except FileNotFoundError:
+                    pass
+
+    def purge_expired(self, now=None):
+        """Removes uploads untouched for UPLOAD_TTL, at most once a minute."""
+        now = time.time() if now is None else now
+        if now - self._last_purge < _PURGE_INTERVAL:
+            return
+        self._last_purge = now
+
+        for name in os.listdir(self.root):
+            upload_id, _, suffix = name.partition(".")
+            if suffix != "json":
+                continue
+            try:
+                if now - os.path.getmtime(self.path(upload_id, "json")) > UPLOAD_TTL:
+                    self.abort(upload_id)
+            except (UploadConflictError, UploadNotFoundError, OSError):
+                pass
+
+    def _hasher(self, upload_id, path, offset):
+        """A sha256 of the first `offset` bytes of the part file."""
+        with self._hashers_lock:
+            cached = self._hashers.pop(upload_id, None)
+        if cached is not None and cached[0] == offset:
+            return cached[1]
+
+        # Earlier chunks went to another worker, catch up from disk.
+        hasher = hashlib.sha256()
+        remaining = offset
+        with open(path, "rb") as f:
+            while remaining and (chunk := f.read(min(_READ_SIZE, remaining))):
+                hasher.update(chunk)
+                remaining -= len(chunk)
+        return hasher
+
+    def _keep_hasher(self, upload_id, offset, hasher):
+        with self._hashers_lock:
+            self._hashers[upload_id] = (offset, hasher)
+            self._hashers.move_to_end(upload_id)
+            while len(self._hashers) > UPLOAD_HASHER_CACHE_SIZE:
+                self._hashers.popitem(last=False)
+
+    def _drop_hasher(self, upload_id):
+        with self._hashers_lock:
+            self._hashers.pop(upload_id, None)
+
+
+upload_staging = UploadStaging(UPLOAD_STAGING_DIR)
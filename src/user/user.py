@@ -2,9 +2,10 @@ import hashlib
 import secrets
 
 from flasgger import swag_from
-from flask import Blueprint, request
+from flask import Blueprint, jsonify, request
 
-from src.db import DatabaseConnection
+from src import repository
+from src.cache import cache_response, cached_response
 from src.util import validate_data
 
 User = Blueprint("user", __name__)
@@ -21,20 +22,7 @@ def insert_user():
     stored_password = f"{salt.hex()}{password_hash}"
 
     try:
-        with DatabaseConnection.get_connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute(
-                    """
-                       INSERT INTO users(username,user_password)
-                       VALUES(%s,%s)
-                       RETURNING id
-                        ;
-                    """,
-                    (data["username"], stored_password),
-                )
-                user_id = cur.fetchone()[0]
-                conn.commit()
-
+        user_id = repository.insert_user(data["username"], stored_password)
     except Exception as e:
         return {
             "error": "Client Side Error",
@@ -55,22 +43,19 @@ def get_user():
     if not username:
         return {"error": "Missing username parameter"}, 400
 
+    cached = cached_response(f"user:{username}")
+    if cached is not None:
+        return cached
+
     try:
-        with DatabaseConnection.get_connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute(
-                    """
-                       SELECT id,username FROM users WHERE username = %s
-                    """,
-                    (username,),
-                )
-                user = cur.fetchone()
-                if not user:
-                    return {"error": "User not found"}, 404
-                return {"username": user[0]}
+        user = repository.get_user(username)
     except Exception as e:
         return {
             "error": "Client Side Error",
             "message": str(e),
             "type": type(e).__name__,
         }, 400
+
+    if not user:
+        return {"error": "User not found"}, 404
+    return cache_response(f"user:{username}", jsonify({"username": user.id}))
@@ -1,10 +1,15 @@
+import base64
+import binascii
 import os
+import struct
+from dataclasses import dataclass
+from datetime import datetime
 from typing import List
 
 from src.db import DatabaseConnection
 from src.errors import MissingCollectorParam
 
-ALLOWED_EXTENSIONS = {"png", "jpg", "jpeg"}
+ALLOWED_EXTENSIONS = {"png": "image/png", "jpg": "image/jpeg", "jpeg": "image/jpeg"}
 UPLOAD_SIZE = 25 * 1000 * 1000  # 25 MB
 UPLOAD_DIR = os.path.join(os.path.dirname(__file__), "uploads")
 os.makedirs(UPLOAD_DIR, exist_ok=True)  # Creates the folder if it doesn't exist
@@ -18,8 +23,93 @@ def init_db():
     DatabaseConnection.initialize(conn_str)
 
 
-def allowed_file(filename: str):
-    return "." in filename and filename.rsplit(".", 1)[1].lower() in ALLOWED_EXTENSIONS
+def allowed_file(filename: str, mimetype: str):
+    """
+    Checks that an upload's filename has an image extension, and that it
+    agrees with the image type sniffed from its bytes.
+    """
+    if "." not in filename:
+        return False
+    return ALLOWED_EXTENSIONS.get(filename.rsplit(".", 1)[1].lower()) == mimetype
+
+
+def guess_image_mimetype(header: bytes):
+    """
+    Guesses the image content type from its leading magic bytes.
+    """
+    if header.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "image/png"
+    if header.startswith(b"\xff\xd8\xff"):
+        return "image/jpeg"
+    if header[:4] == b"RIFF" and header[8:12] == b"WEBP":
+        # Previews.
+        return "image/webp"
+    return "application/octet-stream"
+
+
+@dataclass(slots=True, frozen=True)
+class ImageInfo:
+    mimetype: str
+    # None when the header was cut off before the dimensions.
+    width: int | None
+    height: int | None
+
+
+# Enough of a file for sniff_image to get past typical EXIF and ICC segments.
+IMAGE_SNIFF_SIZE = 64 * 1024
+
+_PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+_PNG_IHDR = struct.Struct(">I4sII")
+_JPEG_SEGMENT = struct.Struct(">BBH")
+_JPEG_SOF_SIZE = struct.Struct(">HH")
+# Start-of-frame markers carry the dimensions. C4, C8 and CC share the
+# range but are DHT, JPG and DAC.
+_JPEG_SOF = frozenset(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+# Markers without a length field.
+_JPEG_STANDALONE = frozenset(range(0xD0, 0xD8)) | {0x01}
+
+
+def sniff_image(data):
+    """
+    Identifies a PNG or JPEG from its header and reads its dimensions, from
+    the IHDR chunk or the first SOF segment. Nothing is decoded or copied,
+    the header is read through a memoryview. Returns None when `data` is
+    neither format.
+    """
+    view = memoryview(data)
+    if view[:8] == _PNG_SIGNATURE:
+        if len(view) >= 8 + _PNG_IHDR.size:
+            _, chunk_type, width, height = _PNG_IHDR.unpack_from(view, 8)
+            if chunk_type == b"IHDR":
+                return ImageInfo("image/png", width, height)
+        return ImageInfo("image/png", None, None)
+
+    if view[:3] != b"\xff\xd8\xff":
+        return None
+    # Walk the segments after SOI. APPn segments (EXIF, ICC profiles) can be
+    # tens of kilobytes, they are skipped by their length.
+    offset = 2
+    while offset + _JPEG_SEGMENT.size <= len(view):
+        prefix, marker, length = _JPEG_SEGMENT.unpack_from(view, offset)
+        if prefix != 0xFF:
+            break
+        if marker == 0xFF:
+            # Fill byte before a marker.
+            offset += 1
+            continue
+        if marker in _JPEG_STANDALONE:
+            offset += 2
+            continue
+        if marker == 0xDA:
+            # Start of scan, the entropy-coded data follows.
+            break
+        if marker in _JPEG_SOF:
+            if offset + 5 + _JPEG_SOF_SIZE.size > len(view):
+                break
+            height, width = _JPEG_SOF_SIZE.unpack_from(view, offset + 5)
+            return ImageInfo("image/jpeg", width, height)
+        offset += 2 + length
+    return ImageInfo("image/jpeg", None, None)
 
 
 def validate_data(required_keys: List[str], req_data):
@@ -40,3 +130,23 @@ def validate_data(required_keys: List[str], req_data):
         raise MissingCollectorParam(
             f"Missing parameter(s): {', '.join(sorted(missing))}"
         )
+
+
+def encode_cursor(captured_at: datetime, capture_id: str):
+    """
+    Encodes a keyset position on (captured_at, capture_id) as an opaque token.
+    """
+    raw = f"{captured_at.isoformat()}|{capture_id}".encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii")
+
+
+def decode_cursor(token: str):
+    """
+    Decodes a token produced by `encode_cursor` back into (captured_at, capture_id).
+    """
+    try:
+        raw = base64.urlsafe_b64decode(token.encode("ascii")).decode("utf-8")
+        captured_at, capture_id = raw.split("|", 1)
+        return datetime.fromisoformat(captured_at), capture_id
+    except (binascii.Error, UnicodeError, ValueError) as exc:
+        raise MissingCollectorParam("after must be a valid cursor") from exc
@@ -0,0 +1,147 @@
+import os
+import uuid
+from datetime import datetime
+from pathlib import Path
+
+import psycopg
+import pytest
+
+from src import repository
+from src.ingestion import image
+from src.maintenance.archive import archive_captures
+from src.storage.archive import LocalArchiveStore
+
+MIGRATION = (
+    Path(__file__).resolve().parents[1]
+    / "db"
+    / "migrations"
+    / "002_raw_capture_archive.sql"
+)
+
+PNG_BYTES = b"\x89PNG\r\n\x1a\n" + b"pixels" * 10
+
+
+def _row(index, **overrides):
+    return {
+        "capture_id": f"c{index}",
+        "game_id": "g1",
+        "session_id": "s1",
+        "run_id": None,
+        "captured_at": datetime(2025, 1, 1, 0, 0, index),
+        "received_at": datetime(2025, 1, 1, 0, 0, index),
+        "capture_index": index,
+        "screenshot_ref": f"ref{index}",
+        "screenshot_hash": f"hash{index}",
+        "image_height": 1080,
+        "image_width": 1920,
+        **overrides,
+    }
+
+
+def test_segment_round_trip(tmp_path):
+    store = LocalArchiveStore(str(tmp_path))
+    segment_id, byte_size = store.write_segment([(_row(0), PNG_BYTES), (_row(1), None)])
+
+    assert byte_size == os.path.getsize(store.path(segment_id, "seg"))
+    assert store.read_capture(segment_id, "c0") == {**_row(0), "image_data": PNG_BYTES}
+    assert store.read_capture(segment_id, "c1") == {**_row(1), "image_data": None}
+    assert store.read_capture(segment_id, "missing") is None
+    assert [row["capture_id"] for row in store.read_segment(segment_id)] == [
+        "c0",
+        "c1",
+    ]
+
+    store.delete_segment(segment_id)
+    assert not os.path.exists(store.path(segment_id, "seg"))
+
+
+def test_image_falls_back_to_archive(monkeypatch):
+    monkeypatch.setattr(repository, "get_capture_image", lambda *args: None)
+    monkeypatch.setattr(
+        repository,
+        "get_archived_capture",
+        lambda capture_id: (
+            {**_row(0), "image_data": PNG_BYTES} if capture_id == "c0" else None
+        ),
+    )
+
+    file, size, mimetype, etag = image.open_capture_image("c0")
+
+    assert file.read() == PNG_BYTES
+    assert (size, mimetype, etag) == (len(PNG_BYTES), "image/png", "hash0")
+    assert image.open_capture_image("missing") is None
+
+
+def test_raw_collection_includes_archived_captures(monkeypatch):
+    live = repository.RawCapture(
+        datetime(2025, 1, 2), "g1", None, None, "ref9", 1080, 1920
+    )
+    monkeypatch.setattr(repository, "_fetch_all", lambda *args: [live])
+    monkeypatch.setattr(
+        repository,
+        "get_archived_captures",
+        lambda game_id, session_id: iter([{**_row(0), "image_data": PNG_BYTES}]),
+    )
+
+    captures = repository.get_raw_collection("g1", "s1")
+
+    assert [capture.screenshot_ref for capture in captures] == ["ref0", "ref9"]
+    assert captures[0].image_data == PNG_BYTES
+
+
+@pytest.fixture()
+def scratch_conn():
+    if not os.environ.get("PGSQL_CONN"):
+        pytest.skip("PGSQL_CONN is not set")
+
+    schema = f"archive_test_{uuid.uuid4().hex[:8]}"
+    with psycopg.connect(os.environ["PGSQL_CONN"], autocommit=True) as conn:
+        conn.execute(f"CREATE SCHEMA {schema}")
+        conn.execute(f"SET search_path TO {schema}")
+        try:
+            yield conn
+        finally:
+            conn.execute(f"DROP SCHEMA {schema} CASCADE")
+
+
+def test_archiver_moves_old_captures_into_segments(scratch_conn, tmp_path):
+    conn = scratch_conn
+    conn.execute(
+        """CREATE TABLE raw_capture (
+            capture_id varchar PRIMARY KEY,
+            game_id varchar NOT NULL,
+            session_id varchar NOT NULL,
+            captured_at timestamp NOT NULL,
+            image_data bytea
+        )"""
+    )
+    conn.execute(MIGRATION.read_text())
+    for index in range(3):
+        conn.execute(
+            "INSERT INTO raw_capture VALUES (%s, 'g1', 's1', %s, %s)",
+            (f"old{index}", datetime(2025, 1, 1, 0, 0, index), PNG_BYTES),
+        )
+    conn.execute(
+        "INSERT INTO raw_capture VALUES ('new', 'g1', 's1', '2025-03-01', NULL)"
+    )
+    store = LocalArchiveStore(str(tmp_path))
+
+    archived = archive_captures(
+        conn, store, older_than_days=30, max_captures=2, now=datetime(2025, 3, 1)
+    )
+
+    assert archived == 3
+    remaining = conn.execute("SELECT capture_id FROM raw_capture").fetchall()
+    assert remaining == [("new",)]
+    segments = conn.execute(
+        "SELECT segment_id, capture_count FROM raw_capture_segment "
+        "ORDER BY first_captured_at"
+    ).fetchall()
+    assert [count for _, count in segments] == [2, 1]
+
+    (segment_id,) = conn.execute(
+        "SELECT segment_id FROM raw_capture_archive WHERE capture_id = 'old2'"
+    ).fetchone()
+    row = store.read_capture(segment_id, "old2")
+    assert row["captured_at"] == datetime(2025, 1, 1, 0, 0, 2)
+    assert row["image_data"] == PNG_BYTES
@@ -0,0 +1,118 @@
+import contextlib
+import os
+
+from src.maintenance.blobs import collect_blobs
+from src.storage.blob import LocalBlobStore, content_hash
+
+
+class _FakeRefConnection:
+    """Serves live screenshot_refs and the ids of archive segments."""
+
+    def __init__(self, live, segment_ids):
+        self.live = live
+        self.segment_ids = segment_ids
+
+    def transaction(self):
+        return contextlib.nullcontext()
+
+    def cursor(self, name=None):
+        return contextlib.nullcontext(self)
+
+    def execute(self, query):
+        self._rows = self.segment_ids if "raw_capture_segment" in query else self.live
+        return self
+
+    def fetchall(self):
+        return [(value,) for value in self._rows]
+
+    def __iter__(self):
+        return iter(self.fetchall())
+
+
+class _FakeArchiveStore:
+    def __init__(self, segments):
+        self.segments = segments
+
+    def read_segment(self, segment_id):
+        yield from self.segments[segment_id]
+
+
+def test_put_is_content_addressed_and_sharded(tmp_path):
+    store = LocalBlobStore(str(tmp_path))
+
+    key = store.put(b"frame-bytes")
+
+    assert key == content_hash(b"frame-bytes")
+    assert store.path(key) == os.path.join(str(tmp_path), key[:2], key[2:4], key)
+    assert store.read(key) == b"frame-bytes"
+
+
+def test_put_deduplicates_identical_frames(tmp_path):
+    store = LocalBlobStore(str(tmp_path))
+
+    first = store.put(b"same-frame")
+    inode = os.stat(store.path(first)).st_ino
+    second = store.put(b"same-frame")
+
+    assert first == second
+    assert os.stat(store.path(second)).st_ino == inode
+
+
+def test_put_leaves_no_temp_files(tmp_path):
+    store = LocalBlobStore(str(tmp_path))
+
+    key = store.put(b"frame-bytes")
+
+    shard_dir = os.path.dirname(store.path(key))
+    assert os.listdir(shard_dir) == [key]
+
+
+def test_delete_skips_blobs_written_again(tmp_path):
+    store = LocalBlobStore(str(tmp_path))
+    old, fresh = store.put(b"old-frame"), store.put(b"fresh-frame")
+    for key in (old, fresh):
+        os.utime(store.path(key), (1000, 1000))
+
+    assert sorted(store.iter_keys(written_before=2000)) == sorted([old, fresh])
+    # A capture reuses the fresh frame after the store was listed.
+    store.put(b"fresh-frame")
+
+    assert store.delete(old, written_before=2000)
+    assert not store.delete(fresh, written_before=2000)
+    assert not store.exists(old) and store.exists(fresh)
+
+
+def test_collect_keeps_live_archived_and_recent_blobs(tmp_path):
+    store = LocalBlobStore(str(tmp_path))
+    live, archived, orphan, recent = (
+        store.put(data) for data in (b"live", b"archived", b"orphan", b"recent")
+    )
+    store.put_as(f"{live}.256.webp", b"live-preview")
+    store.put_as(f"{orphan}.256.webp", b"orphan-preview")
+    for key in (live, archived, orphan, f"{live}.256.webp", f"{orphan}.256.webp"):
+        os.utime(store.path(key), (1000, 1000))
+    conn = _FakeRefConnection([live], ["seg"])
+    archive = _FakeArchiveStore({"seg": [{"screenshot_ref": archived}]})
+
+    assert collect_blobs(conn, store, archive, 100, dry_run=True, now=2000) == 2
+    assert store.exists(orphan)
+    assert collect_blobs(conn, store, archive, 100, now=2000) == 2
+
+    assert not store.exists(orphan) and not store.exists(f"{orphan}.256.webp")
+    for key in (live, archived, recent, f"{live}.256.webp"):
+        assert store.exists(key)
+
+
+def test_only_blobs_are_listed(tmp_path):
+    store = LocalBlobStore(str(tmp_path))
+    key = store.put(b"frame")
+    store.put_as(f"{key}.256.webp", b"preview")
+    # An archive segment and an upload staging file kept under the same root.
+    segment = tmp_path / "archive" / "ab" / ("ab" + "0" * 30 + ".seg")
+    staging = tmp_path / ".staging" / ("0" * 32 + ".part")
+    misplaced = tmp_path / "ff" / "ff" / key
+    for path in (segment, staging, misplaced):
+        path.parent.mkdir(parents=True)
+        path.write_bytes(b"not a blob")
+
+    assert sorted(store.iter_keys(written_before=2**40)) == [key, f"{key}.256.webp"]
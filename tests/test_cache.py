@@ -0,0 +1,90 @@
+import fakeredis
+import pytest
+from flask import Flask
+
+from src import cache, repository
+from src.cache import MemoryCache, RedisCache
+from src.game.game import Game
+from src.repository import Game as GameRow
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_memory_cache_evicts_least_recently_used():
+    lookup_cache = MemoryCache(max_entries=2, ttl=60)
+    lookup_cache.set("game:1", b"1")
+    lookup_cache.set("game:2", b"2")
+
+    assert lookup_cache.get("game:1") == b"1"
+    lookup_cache.set("game:3", b"3")
+
+    assert lookup_cache.get("game:2") is None
+    assert lookup_cache.get("game:1") == b"1"
+    assert lookup_cache.get("game:3") == b"3"
+    assert len(lookup_cache) == 2
+
+
+def test_memory_cache_expires_entries():
+    clock = _Clock()
+    lookup_cache = MemoryCache(max_entries=10, ttl=5, clock=clock)
+    lookup_cache.set("run:1", b"1")
+
+    clock.now = 4.9
+    assert lookup_cache.get("run:1") == b"1"
+    clock.now = 5.0
+    assert lookup_cache.get("run:1") is None
+    assert len(lookup_cache) == 0
+
+
+def test_redis_cache_round_trip():
+    client = fakeredis.FakeRedis()
+    lookup_cache = RedisCache(client, ttl=30)
+
+    lookup_cache.set("user:alice", b'{"username": "alice"}')
+
+    assert lookup_cache.get("user:alice") == b'{"username": "alice"}'
+    assert 0 < client.ttl("gamelens:cache:user:alice") <= 30
+
+
+@pytest.fixture()
+def client(monkeypatch):
+    calls = []
+
+    def fake_get_games(game_id):
+        calls.append(game_id)
+        if game_id != 1:
+            return []
+        return [GameRow(1, 7, "g", "1.0", None)]
+
+    monkeypatch.setattr(repository, "get_games", fake_get_games)
+    monkeypatch.setattr(cache, "lookup_cache", MemoryCache(max_entries=10, ttl=60))
+
+    app = Flask(__name__)
+    app.config["TESTING"] = True
+    app.register_blueprint(Game, url_prefix="/api/v1")
+    test_client = app.test_client()
+    test_client.calls = calls
+    return test_client
+
+
+def test_game_lookup_is_read_through(client):
+    first = client.get("/api/v1/collect/game?game_id=1")
+    second = client.get("/api/v1/collect/game?game_id=01")
+
+    assert first.status_code == second.status_code == 200
+    assert first.get_json() == second.get_json()
+    assert client.calls == [1]
+
+
+def test_missing_game_is_not_cached(client):
+    assert client.get("/api/v1/collect/game?game_id=2").status_code == 404
+    assert client.get("/api/v1/collect/game?game_id=2").status_code == 404
+
+    assert client.calls == [2, 2]
+    assert client.get("/api/v1/collect/game?game_id=abc").status_code == 400
@@ -0,0 +1,89 @@
+import io
+
+import pytest
+from flask import Flask
+
+from src.ingestion import collector
+from src.ingestion.collector import Collector
+
+PNG_BYTES = b"\x89PNG\r\n\x1a\n" + b"pixels" * 10
+WEBP_BYTES = b"RIFF\x10\x00\x00\x00WEBPVP8 " + b"small"
+
+
+@pytest.fixture()
+def client(monkeypatch):
+    def fake_open_capture_image(capture_id):
+        if capture_id != "c1":
+            return None
+        return io.BytesIO(PNG_BYTES), len(PNG_BYTES), "image/png", "abc123"
+
+    def fake_open_capture_preview(capture_id, size):
+        if capture_id != "c1" or not rendered:
+            return None
+        return io.BytesIO(WEBP_BYTES), len(WEBP_BYTES), "image/webp", f"abc123-{size}"
+
+    rendered = []
+    monkeypatch.setattr(collector, "open_capture_image", fake_open_capture_image)
+    monkeypatch.setattr(collector, "open_capture_preview", fake_open_capture_preview)
+    monkeypatch.setattr(collector, "PREVIEW_SIZES", (256,))
+
+    app = Flask(__name__)
+    app.config["TESTING"] = True
+    app.register_blueprint(Collector, url_prefix="/api/v1")
+    client = app.test_client()
+    client.render_preview = lambda: rendered.append(True)
+    return client
+
+
+def test_image_returns_raw_bytes_with_strong_etag(client):
+    response = client.get("/api/v1/collect/c1/image")
+
+    assert response.status_code == 200
+    assert response.mimetype == "image/png"
+    assert response.headers["ETag"] == '"abc123"'
+    assert response.headers["Accept-Ranges"] == "bytes"
+    assert response.data == PNG_BYTES
+
+
+def test_image_honours_if_none_match(client):
+    response = client.get(
+        "/api/v1/collect/c1/image", headers={"If-None-Match": '"abc123"'}
+    )
+
+    assert response.status_code == 304
+    assert response.data == b""
+
+
+def test_image_serves_byte_ranges(client):
+    response = client.get("/api/v1/collect/c1/image", headers={"Range": "bytes=1-3"})
+
+    assert response.status_code == 206
+    assert response.headers["Content-Range"] == f"bytes 1-3/{len(PNG_BYTES)}"
+    assert response.data == b"PNG"
+
+
+def test_image_not_found(client):
+    response = client.get("/api/v1/collect/missing/image")
+
+    assert response.status_code == 404
+
+
+def test_preview_falls_back_to_the_original_until_rendered(client):
+    response = client.get("/api/v1/collect/c1/image?size=256")
+
+    assert response.data == PNG_BYTES
+    assert "immutable" not in response.headers["Cache-Control"]
+
+    client.render_preview()
+    response = client.get("/api/v1/collect/c1/image?size=256")
+
+    assert response.mimetype == "image/webp"
+    assert response.data == WEBP_BYTES
+    assert response.headers["ETag"] == '"abc123-256"'
+    assert "immutable" in response.headers["Cache-Control"]
+
+
+def test_only_configured_preview_sizes(client):
+    response = client.get("/api/v1/collect/c1/image?size=1000")
+
+    assert response.status_code == 400
@@ -0,0 +1,169 @@
+import os
+import threading
+from datetime import datetime
+
+import psycopg
+import pytest
+
+from src.ingestion.spool import CaptureSpool, encode_record, read_records
+from src.ingestion.writer import RAW_CAPTURE_COLUMNS, StoredCapture
+
+_COLUMNS = [name for name, _ in RAW_CAPTURE_COLUMNS]
+
+
+def _row(capture_id, capture_index=None):
+    row = [None] * len(RAW_CAPTURE_COLUMNS)
+    row[0] = capture_id
+    row[_COLUMNS.index("session_id")] = "s1"
+    row[_COLUMNS.index("captured_at")] = datetime(2026, 3, 2, 10, 30, 1, 250)
+    row[_COLUMNS.index("capture_index")] = (
+        int(capture_id[1:]) if capture_index is None else capture_index
+    )
+    return tuple(row)
+
+
+class _FakeWriter:
+    def __init__(self, bad_ids=(), down=0):
+        self.bad_ids = set(bad_ids)
+        # Number of write_batch calls that fail as if Postgres were down.
+        self.down = down
+        self.rows = []
+
+    def write_batch(self, rows):
+        if self.down:
+            self.down -= 1
+            raise psycopg.OperationalError("connection refused")
+        outcomes = []
+        for row in rows:
+            if row[0] in self.bad_ids:
+                outcomes.append(ValueError(f"bad row {row[0]}"))
+            else:
+                self.rows.append(row)
+                outcomes.append(StoredCapture(row[0], False, "s1", 0, ()))
+        return outcomes
+
+
+@pytest.fixture(autouse=True)
+def no_drainer_thread(monkeypatch):
+    # Tests drain explicitly.
+    monkeypatch.setattr(CaptureSpool, "_drain_loop", lambda self: None)
+
+
+def _spool(tmp_path, writer):
+    return CaptureSpool(str(tmp_path), writer=writer)
+
+
+def _segments(slot):
+    return [name for name in os.listdir(slot) if name.endswith(".log")]
+
+
+def test_records_round_trip_up_to_a_torn_write(tmp_path):
+    path = tmp_path / "segment.log"
+    rows = [_row("c0"), _row("c1")]
+    record = encode_record(_row("c2"))
+    path.write_bytes(b"".join(encode_record(row) for row in rows) + record[:-3])
+
+    assert list(read_records(path)) == rows
+
+
+def test_acks_once_spooled_then_drains_into_postgres(tmp_path):
+    writer = _FakeWriter()
+    spool = _spool(tmp_path, writer)
+
+    futures = spool.submit_many([_row("c0"), _row("c1")])
+
+    stored = futures[1].result(timeout=2)
+    assert stored.capture_id == "c1"
+    assert stored.spooled
+    # Whether the key is already stored is only known at replay.
+    assert stored.duplicate is None
+    assert writer.rows == []
+    spool.drain()
+    assert writer.rows == [_row("c0"), _row("c1")]
+    assert _segments(spool.slot) == []
+
+
+def test_segments_are_kept_while_the_database_is_down(tmp_path):
+    writer = _FakeWriter(down=1)
+    spool = _spool(tmp_path, writer)
+    spool.submit(_row("c0")).result(timeout=2)
+
+    with pytest.raises(psycopg.OperationalError):
+        spool.drain()
+    assert len(_segments(spool.slot)) == 1
+
+    spool.drain()
+    assert writer.rows == [_row("c0")]
+
+
+def test_segments_left_by_a_crash_are_replayed(tmp_path):
+    # Slot 0 is this process's after a restart. No process holds slot 3, its
+    # worker did not come back.
+    for slot, row in (("0", _row("c0")), ("3", _row("c3"))):
+        (tmp_path / slot).mkdir()
+        (tmp_path / slot / "00000000000000000001.log").write_bytes(
+            encode_record(row) + encode_record(_row("c9"))[:5]
+        )
+    writer = _FakeWriter()
+    spool = _spool(tmp_path, writer)
+
+    spool.start()
+    spool.drain()
+
+    assert spool.slot == str(tmp_path / "0")
+    assert sorted(writer.rows) == [_row("c0"), _row("c3")]
+    assert _segments(tmp_path / "0") == _segments(tmp_path / "3") == []
+
+
+def test_recently_spooled_keys_ack_their_first_capture_id(tmp_path):
+    writer = _FakeWriter()
+    spool = CaptureSpool(str(tmp_path), writer=writer, recent_keys=2)
+    spool.submit_many([_row("c0"), _row("c1")])[1].result(timeout=2)
+
+    # Retried in a later batch, and twice within one.
+    futures = spool.submit_many([_row("r1", 1), _row("c2"), _row("r2", 2)])
+    acks = [(f.result(timeout=2).capture_id, f.result().duplicate) for f in futures]
+    assert acks == [("c1", True), ("c2", None), ("c2", True)]
+    # Only the last two keys are remembered, c0's is forgotten.
+    assert spool.submit(_row("r0", 0)).result(timeout=2).capture_id == "r0"
+
+    spool.drain()
+    assert [row[0] for row in writer.rows] == ["c0", "c1", "c2", "r0"]
+
+
+def test_rejected_rows_are_set_aside(tmp_path):
+    writer = _FakeWriter(bad_ids={"c1"})
+    spool = _spool(tmp_path, writer)
+    for future in spool.submit_many([_row("c0"), _row("c1"), _row("c2")]):
+        future.result(timeout=2)
+
+    spool.drain()
+
+    assert writer.rows == [_row("c0"), _row("c2")]
+    assert list(read_records(os.path.join(spool.slot, "rejected.log"))) == [_row("c1")]
+
+
+def test_draining_while_appending_loses_no_acked_row(tmp_path):
+    writer = _FakeWriter()
+    # A tiny segment size rotates segments while the drain runs.
+    spool = CaptureSpool(str(tmp_path), writer=writer, segment_size=64, sync_delay=0)
+    spool.start()
+    done = threading.Event()
+
+    def drain():
+        while not done.is_set():
+            spool.drain()
+
+    drainer = threading.Thread(target=drain)
+    drainer.start()
+    try:
+        futures = [spool.submit(_row(f"c{i}")) for i in range(500)]
+        for future in futures:
+            future.result(timeout=5)
+    finally:
+        done.set()
+        drainer.join()
+    spool.drain()
+
+    assert sorted(row[0] for row in writer.rows) == sorted(f"c{i}" for i in range(500))
+    assert _segments(spool.slot) == []
@@ -0,0 +1,206 @@
+import pytest
+
+from src.db import DatabaseConnection
+from src.ingestion.writer import RAW_CAPTURE_COLUMNS, CaptureWriter, StoredCapture
+
+
+class _FakeCopy:
+    def __init__(self, conn):
+        self._conn = conn
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def set_types(self, types):
+        pass
+
+    def write_row(self, row):
+        if row[0] in self._conn.bad_ids:
+            raise ValueError(f"bad row {row[0]}")
+        self._conn.copied.append(row)
+
+
+class _FakeCursor:
+    def __init__(self, conn):
+        self._conn = conn
+        self._rows = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def copy(self, statement):
+        self._conn.copies += 1
+        return _FakeCopy(self._conn)
+
+    def execute(self, query, params, prepare=None):
+        keys = {**self._conn.keys, **self._conn.claimed}
+        if "pipeline_job" in query:
+            self._conn.jobs.extend(params[0])
+        elif "preview_job" in query:
+            self._conn.previews.extend(params[0])
+        elif "INSERT INTO run_summary" in query:
+            self._conn.run_captures.extend(zip(params[0], params[1]))
+        elif "INSERT INTO capture_key" in query:
+            self._rows = []
+            for key, capture_id in zip(zip(params[0], params[1]), params[2]):
+                if key not in keys:
+                    self._conn.claimed[key] = capture_id
+                    self._rows.append((capture_id,))
+        elif "FROM capture_key\n    JOIN" in query:
+            self._rows = [(*key, keys[key]) for key in zip(params[0], params[1])]
+        elif "INSERT INTO capture_session" in query:
+            self._rows = []
+            for session_id in sorted(set(params[0])):
+                indices = [index for sid, index in keys if sid == session_id]
+                missing = max(indices) - min(indices) + 1 - len(indices)
+                self._rows.append((session_id, missing))
+        elif "gap_start" in query:
+            indices = sorted(index for sid, index in keys if sid == params[0])
+            self._rows = [
+                (a + 1, b - 1) for a, b in zip(indices, indices[1:]) if b - a > 1
+            ]
+        else:
+            if params[0] in self._conn.bad_ids:
+                raise ValueError(f"bad row {params[0]}")
+            self._conn.inserted.append(params)
+
+    def fetchall(self):
+        return self._rows
+
+
+class _FakeConnection:
+    def __init__(self, bad_ids=()):
+        self.bad_ids = set(bad_ids)
+        self.copies = 0
+        self.copied = []
+        self.inserted = []
+        self.jobs = []
+        self.previews = []
+        self.run_captures = []
+        self.commits = 0
+        self.keys = {}
+        self.claimed = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        # Claims of a transaction that did not commit are rolled back.
+        self.claimed = {}
+        return False
+
+    def cursor(self, *args, **kwargs):
+        return _FakeCursor(self)
+
+    def commit(self):
+        self.commits += 1
+        self.keys.update(self.claimed)
+        self.claimed = {}
+
+
+_COLUMNS = [name for name, _ in RAW_CAPTURE_COLUMNS]
+
+
+def _row(capture_id, capture_index=None, run_id=None):
+    row = [None] * len(RAW_CAPTURE_COLUMNS)
+    row[0] = capture_id
+    row[_COLUMNS.index("run_id")] = run_id
+    row[_COLUMNS.index("session_id")] = "s1"
+    row[_COLUMNS.index("capture_index")] = (
+        int(capture_id[1:]) if capture_index is None else capture_index
+    )
+    return tuple(row)
+
+
+def _use_connection(monkeypatch, fake_conn):
+    monkeypatch.setattr(
+        DatabaseConnection,
+        "get_connection",
+        classmethod(lambda cls: fake_conn),
+    )
+
+
+def test_writer_flushes_rows_in_a_single_copy(monkeypatch):
+    fake_conn = _FakeConnection()
+    _use_connection(monkeypatch, fake_conn)
+    writer = CaptureWriter(batch_size=3, batch_delay=1)
+
+    futures = [writer.submit(_row(f"c{i}")) for i in range(3)]
+
+    assert [f.result(timeout=2).capture_id for f in futures] == ["c0", "c1", "c2"]
+    assert fake_conn.copies == 1
+    assert fake_conn.commits == 1
+    assert len(fake_conn.copied) == 3
+    # Pipeline jobs are queued in the same transaction as the captures.
+    assert fake_conn.jobs == ["c0", "c1", "c2"]
+
+
+def test_writer_flushes_partial_batch_after_delay(monkeypatch):
+    fake_conn = _FakeConnection()
+    _use_connection(monkeypatch, fake_conn)
+    writer = CaptureWriter(batch_size=200, batch_delay=0.01)
+
+    assert writer.submit(_row("c0")).result(timeout=2).capture_id == "c0"
+    assert fake_conn.copies == 1
+
+
+def test_writer_isolates_bad_row_when_copy_fails(monkeypatch):
+    fake_conn = _FakeConnection(bad_ids={"c1"})
+    _use_connection(monkeypatch, fake_conn)
+    writer = CaptureWriter(batch_size=3, batch_delay=1)
+
+    futures = [writer.submit(_row(f"c{i}")) for i in range(3)]
+
+    assert futures[0].result(timeout=2).capture_id == "c0"
+    assert futures[2].result(timeout=2).capture_id == "c2"
+    with pytest.raises(ValueError, match="bad row c1"):
+        futures[1].result(timeout=2)
+    assert [row[0] for row in fake_conn.inserted] == ["c0", "c2"]
+
+
+def test_repeated_capture_index_acks_the_original_capture(monkeypatch):
+    fake_conn = _FakeConnection()
+    _use_connection(monkeypatch, fake_conn)
+    writer = CaptureWriter(batch_size=2, batch_delay=1)
+
+    first, retry = [writer.submit(_row(c, capture_index=0)) for c in ("c0", "r0")]
+
+    assert first.result(timeout=2) == StoredCapture("c0", False, "s1", 0, ())
+    assert retry.result(timeout=2) == StoredCapture("c0", True, "s1", 0, ())
+    # A retry in a later batch resolves to the stored capture too.
+    writer = CaptureWriter(batch_size=1, batch_delay=1)
+    assert writer.submit(_row("r1", capture_index=0)).result(timeout=2).duplicate
+    assert [row[0] for row in fake_conn.copied] == ["c0"]
+    assert fake_conn.jobs == ["c0"]
+
+
+def test_acks_report_missing_indices(monkeypatch):
+    fake_conn = _FakeConnection()
+    _use_connection(monkeypatch, fake_conn)
+    writer = CaptureWriter(batch_size=3, batch_delay=1)
+
+    futures = [writer.submit(_row(c)) for c in ("c0", "c3", "c4")]
+
+    stored = futures[-1].result(timeout=2)
+    assert stored.missing == 2
+    assert stored.gaps == ((1, 2),)
+
+
+def test_only_new_captures_are_added_to_run_summaries(monkeypatch):
+    fake_conn = _FakeConnection()
+    _use_connection(monkeypatch, fake_conn)
+    writer = CaptureWriter(batch_size=3, batch_delay=1)
+
+    futures = [
+        writer.submit(_row(c, capture_index=i, run_id=run_id))
+        for c, i, run_id in (("c0", 0, "7"), ("r0", 0, "7"), ("c1", 1, None))
+    ]
+
+    assert [f.result(timeout=2).duplicate for f in futures] == [False, True, False]
+    assert [run_id for run_id, _ in fake_conn.run_captures] == ["7"]
@@ -0,0 +1,143 @@
+import json
+from datetime import datetime
+
+import pytest
+from flask import Flask, jsonify
+
+from src.db import DatabaseConnection
+from src.errors import MissingCollectorParam
+from src.ingestion.collector import Collector
+from src.util import decode_cursor, encode_cursor
+
+
+class _FakeNamedCursor:
+    def __init__(self, conn, name):
+        self._conn = conn
+        if name:
+            self._conn.cursor_name = name
+        self.itersize = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def execute(self, query, params, prepare=None):
+        self._conn.executed.append((query, params))
+
+    def fetchall(self):
+        # No archived segments.
+        return []
+
+    def __iter__(self):
+        return iter([dict(row) for row in self._conn.rows])
+
+
+class _FakeConnection:
+    def __init__(self, rows):
+        self.rows = rows
+        self.executed = []
+        self.cursor_name = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def cursor(self, name=None, **kwargs):
+        return _FakeNamedCursor(self, name)
+
+    def commit(self):
+        pass
+
+
+ROWS = [
+    {
+        "capture_id": f"c{i}",
+        "captured_at": datetime(2025, 1, 1, 0, 0, i),
+        "capture_index": i,
+        "game_id": "g1",
+        "run_id": None,
+        "screenshot_ref": None,
+        "image_height": None,
+        "image_width": None,
+    }
+    for i in range(3)
+]
+
+
+@pytest.fixture()
+def app():
+    app = Flask(__name__)
+    app.config["TESTING"] = True
+    app.register_blueprint(Collector, url_prefix="/api/v1")
+
+    @app.errorhandler(MissingCollectorParam)
+    def handle_collection_error(e):
+        return jsonify({"error": e.name, "message": e.description}), e.code
+
+    return app
+
+
+@pytest.fixture()
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture()
+def fake_conn(monkeypatch):
+    fake_conn = _FakeConnection(ROWS)
+    monkeypatch.setattr(
+        DatabaseConnection,
+        "get_connection",
+        classmethod(lambda cls: fake_conn),
+    )
+    return fake_conn
+
+
+def test_cursor_round_trip():
+    captured_at = datetime(2025, 1, 1, 12, 30)
+
+    assert decode_cursor(encode_cursor(captured_at, "c1")) == (captured_at, "c1")
+
+
+def test_stream_emits_ndjson_rows_with_cursors(fake_conn, client):
+    response = client.get(
+        "/api/v1/collect/stream?game_id=g1&session_id=s1&include_images=false"
+    )
+
+    assert response.status_code == 200
+    assert response.mimetype == "application/x-ndjson"
+    lines = [json.loads(line) for line in response.data.splitlines()]
+    assert [line["capture_id"] for line in lines] == ["c0", "c1", "c2"]
+    assert decode_cursor(lines[-1]["cursor"]) == (ROWS[-1]["captured_at"], "c2")
+    assert fake_conn.cursor_name is not None
+
+
+def test_stream_without_images_never_selects_bytea(fake_conn, client):
+    client.get("/api/v1/collect/stream?game_id=g1&session_id=s1&include_images=false")
+
+    query, params = fake_conn.executed[0]
+    assert "image_data" not in query
+    assert params == ["g1", "s1"]
+
+
+def test_stream_applies_keyset_and_limit(fake_conn, client):
+    after = encode_cursor(ROWS[0]["captured_at"], "c0")
+
+    client.get(
+        f"/api/v1/collect/stream?game_id=g1&session_id=s1&after={after}&limit=2"
+    ).get_data()
+
+    query, params = fake_conn.executed[0]
+    assert "(captured_at, capture_id) > (%s, %s)" in query
+    assert params == ["g1", "s1", ROWS[0]["captured_at"], "c0", 2]
+
+
+def test_stream_rejects_invalid_cursor(fake_conn, client):
+    response = client.get("/api/v1/collect/stream?game_id=g1&session_id=s1&after=zz")
+
+    assert response.status_code == 400
+    assert fake_conn.executed == []
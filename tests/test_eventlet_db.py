@@ -0,0 +1,100 @@
+import os
+import socket
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import pytest
+import socketio
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+
+# Runs the Socket.IO app under eventlet, like gunicorn's eventlet worker, and
+# starts a slow query as soon as a client connects.
+SERVER_SCRIPT = """
+import eventlet
+
+eventlet.monkey_patch()
+
+import os
+import sys
+
+from flask import Flask
+
+import src.ingestion.capture  # noqa: F401
+from src.db import DatabaseConnection
+from src.socketio_ext import init_socketio, socketio
+
+app = Flask(__name__)
+init_socketio(app)
+DatabaseConnection.initialize(os.environ["PGSQL_CONN"])
+
+
+def slow_query():
+    with DatabaseConnection.get_connection() as conn:
+        conn.execute("SELECT pg_sleep(%s)", (float(sys.argv[2]),))
+
+
+@socketio.on("connect")
+def start_slow_query():
+    eventlet.spawn(slow_query)
+
+
+socketio.run(app, host="127.0.0.1", port=int(sys.argv[1]))
+"""
+
+SLEEP_SECONDS = 2.0
+
+pytestmark = pytest.mark.skipif(
+    not os.environ.get("PGSQL_CONN"), reason="PGSQL_CONN is not set"
+)
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@pytest.fixture()
+def server_url():
+    port = _free_port()
+    process = subprocess.Popen(
+        [sys.executable, "-c", SERVER_SCRIPT, str(port), str(SLEEP_SECONDS)],
+        cwd=PROJECT_ROOT,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    deadline = time.monotonic() + 15
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.2).close()
+            break
+        except OSError:
+            time.sleep(0.1)
+
+    yield f"http://127.0.0.1:{port}"
+
+    process.terminate()
+    process.wait(timeout=10)
+
+
+def test_socket_events_flow_while_pg_sleep_runs(server_url):
+    client = socketio.Client()
+    client.connect(server_url, transports=["websocket"])
+
+    round_trips = []
+    try:
+        end = time.monotonic() + SLEEP_SECONDS
+        while time.monotonic() < end:
+            started = time.monotonic()
+            client.call("hello_world", {"msg": "ping"}, timeout=SLEEP_SECONDS * 2)
+            round_trips.append(time.monotonic() - started)
+            time.sleep(0.05)
+    finally:
+        client.disconnect()
+
+    # A blocked hub would stall one of these calls for the full pg_sleep.
+    assert len(round_trips) > 10
+    assert max(round_trips) < SLEEP_SECONDS / 4
@@ -0,0 +1,204 @@
+import io
+import json
+import tarfile
+from datetime import datetime
+
+import pytest
+from flask import Flask, jsonify
+
+from src import repository
+from src.db import DatabaseConnection
+from src.errors import MissingCollectorParam
+from src.export import export
+
+PNG_BYTES = b"\x89PNG\r\n\x1a\n" + b"pixels" * 10
+JPEG_BYTES = b"\xff\xd8\xff" + b"pixels" * 10
+
+CAPTURES = [
+    {
+        "capture_id": f"c{i}",
+        "game_id": "g1",
+        "run_id": "7",
+        "captured_at": datetime(2025, 1, 1, 0, 0, i),
+        "capture_index": i,
+        "mouse_x": i,
+        "mouse_y": -i,
+        "image_data": image,
+        "screenshot_ref": None,
+        "screenshot_hash": f"hash{i}",
+        "image_height": 1080,
+        "image_width": 1920,
+    }
+    for i, image in enumerate([PNG_BYTES, JPEG_BYTES, None])
+]
+
+CHOICES = [{"choice_id": 1, "run_id": 7, "choice_options": ["a"], "selected": "a"}]
+
+
+class _FakeCursor:
+    def __init__(self, conn):
+        self._conn = conn
+        self._rows = []
+        self.itersize = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def execute(self, query, params, prepare=None):
+        self._conn.executed.append((query, params))
+        if "FROM choice" in query:
+            self._rows = CHOICES
+        elif "FROM raw_capture_segment" in query:
+            self._rows = [(segment_id,) for segment_id in self._conn.segments]
+        else:
+            self._rows = self._conn.captures
+
+    def fetchall(self):
+        return list(self._rows)
+
+    def __iter__(self):
+        return iter([dict(row) for row in self._rows])
+
+
+class _FakeConnection:
+    def __init__(self, captures, segments=()):
+        self.captures = captures
+        self.segments = segments
+        self.executed = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def cursor(self, name=None, **kwargs):
+        return _FakeCursor(self)
+
+    def commit(self):
+        pass
+
+
+@pytest.fixture()
+def client():
+    app = Flask(__name__)
+    app.config["TESTING"] = True
+    app.register_blueprint(export.Export, url_prefix="/api/v1")
+
+    @app.errorhandler(MissingCollectorParam)
+    def handle_collection_error(e):
+        return jsonify({"error": e.name, "message": e.description}), e.code
+
+    return app.test_client()
+
+
+class _FakeArchiveStore:
+    def __init__(self, segments):
+        self.segments = segments
+
+    def read_segment(self, segment_id):
+        yield from (dict(row) for row in self.segments[segment_id])
+
+    def read_capture(self, segment_id, capture_id):
+        for row in self.segments[segment_id]:
+            if row["capture_id"] == capture_id:
+                return dict(row)
+
+
+def _use_captures(monkeypatch, captures, segments=()):
+    conn = _FakeConnection(captures, segments)
+    monkeypatch.setattr(
+        DatabaseConnection, "get_connection", classmethod(lambda cls: conn)
+    )
+    return conn
+
+
+def test_export_streams_frames_and_manifests(monkeypatch, client):
+    _use_captures(monkeypatch, CAPTURES)
+    # Small chunks, so frames are copied in several pieces.
+    monkeypatch.setattr(export, "EXPORT_CHUNK_SIZE", 7)
+
+    response = client.get("/api/v1/export/session/s1")
+
+    assert response.status_code == 200
+    assert response.mimetype == "application/x-tar"
+    archive = tarfile.open(fileobj=io.BytesIO(response.data))
+    assert archive.getnames() == [
+        "frames/00000000_c0.png",
+        "frames/00000001_c1.jpg",
+        "manifest.jsonl",
+        "choices.jsonl",
+    ]
+    assert archive.extractfile("frames/00000000_c0.png").read() == PNG_BYTES
+
+    manifest = [
+        json.loads(line) for line in archive.extractfile("manifest.jsonl").readlines()
+    ]
+    assert [line["file"] for line in manifest] == [
+        "frames/00000000_c0.png",
+        "frames/00000001_c1.jpg",
+        None,
+    ]
+    assert manifest[1]["mouse_y"] == -1
+    assert manifest[1]["captured_at"] == "2025-01-01T00:00:01"
+
+    choices = archive.extractfile("choices.jsonl").read().decode().splitlines()
+    assert [json.loads(line) for line in choices] == CHOICES
+
+
+def test_resume_filters_on_capture_index(monkeypatch, client):
+    conn = _use_captures(monkeypatch, CAPTURES[1:])
+
+    response = client.get("/api/v1/export/session/s1?game_id=g1&from_index=1")
+
+    assert response.status_code == 200
+    [(query, params)] = [
+        (query, params) for query, params in conn.executed if "image_data" in query
+    ]
+    assert "capture_index >= %s" in query
+    assert params == ["s1", "g1", 1]
+
+
+def test_archived_and_live_captures_are_merged_by_index(monkeypatch, client):
+    def capture(index, second):
+        return {
+            **CAPTURES[0],
+            "capture_id": f"c{index}",
+            "captured_at": datetime(2025, 1, 1, 0, 0, second),
+            "capture_index": index,
+        }
+
+    # Segments are written in captured_at order, which is not index order.
+    segment = [capture(3, 0), capture(1, 1), capture(5, 2)]
+    monkeypatch.setattr(repository, "archive_store", _FakeArchiveStore({"a": segment}))
+    _use_captures(monkeypatch, [capture(2, 9), capture(4, 3)], segments=["a"])
+
+    response = client.get("/api/v1/export/session/s1?from_index=2")
+
+    archive = tarfile.open(fileobj=io.BytesIO(response.data))
+    manifest = archive.extractfile("manifest.jsonl").readlines()
+    assert [json.loads(line)["capture_index"] for line in manifest] == [2, 3, 4, 5]
+
+
+def test_resume_past_the_end_is_an_empty_export(monkeypatch, client):
+    _use_captures(monkeypatch, [])
+
+    response = client.get("/api/v1/export/session/s1?from_index=10")
+
+    archive = tarfile.open(fileobj=io.BytesIO(response.data))
+    assert archive.getnames() == ["manifest.jsonl", "choices.jsonl"]
+
+
+def test_unknown_session_is_not_found(monkeypatch, client):
+    _use_captures(monkeypatch, [])
+
+    assert client.get("/api/v1/export/session/s1").status_code == 404
+
+
+def test_invalid_from_index(monkeypatch, client):
+    _use_captures(monkeypatch, CAPTURES)
+
+    assert client.get("/api/v1/export/session/s1?from_index=x").status_code == 400
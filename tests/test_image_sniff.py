@@ -0,0 +1,72 @@
+import struct
+import zlib
+
+import pytest
+
+from src.errors import InvalidMediaFormatError, MissingCollectorParam
+from src.ingestion import collector
+from src.storage.blob import LocalBlobStore
+from src.util import ImageInfo, allowed_file, sniff_image
+
+
+def _png(width, height):
+    ihdr = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)
+    chunk = b"IHDR" + ihdr
+    return (
+        b"\x89PNG\r\n\x1a\n"
+        + struct.pack(">I", len(ihdr))
+        + chunk
+        + struct.pack(">I", zlib.crc32(chunk))
+    )
+
+
+def _jpeg(width, height, exif_size=0):
+    exif = b"\xff\xe1" + struct.pack(">H", exif_size + 2) + b"\0" * exif_size
+    sof = b"\xff\xc2" + struct.pack(">HBHHB", 17, 8, height, width, 3) + b"\0" * 9
+    # A fill byte before SOF is allowed.
+    return b"\xff\xd8" + exif + b"\xff" + sof + b"\xff\xda"
+
+
+def test_reads_png_dimensions():
+    assert sniff_image(_png(1920, 1080)) == ImageInfo("image/png", 1920, 1080)
+
+
+def test_reads_jpeg_dimensions_past_app_segments():
+    data = bytearray(_jpeg(1280, 720, exif_size=40000))
+
+    assert sniff_image(data) == ImageInfo("image/jpeg", 1280, 720)
+    # Cut off before the SOF segment.
+    assert sniff_image(data[:1000]) == ImageInfo("image/jpeg", None, None)
+
+
+def test_unknown_formats_are_not_images():
+    assert sniff_image(b"GIF89a\x01\x00") is None
+    assert sniff_image(b"") is None
+
+
+def test_extension_must_agree_with_the_bytes():
+    assert allowed_file("frame.JPG", "image/jpeg")
+    assert not allowed_file("frame", "image/png")
+    assert not allowed_file("frame.png", "image/jpeg")
+    assert not allowed_file("frame.gif", "image/png")
+
+
+def test_capture_rows_take_dimensions_from_the_header(monkeypatch, tmp_path):
+    monkeypatch.setattr(collector, "blob_store", LocalBlobStore(str(tmp_path)))
+    data = {
+        "session_id": "s1",
+        "game_id": "g1",
+        "captured_at": "2026-03-02T10:30:00Z",
+        "capture_index": 1,
+        "image_width": 1,
+        "image_height": 1,
+    }
+
+    row = collector.build_capture_row(data, _jpeg(640, 480))
+
+    assert (row[10], row[11]) == (480, 640)
+    with pytest.raises(InvalidMediaFormatError):
+        collector.build_capture_row(data, b"not an image")
+    # PNG dimensions are u32, int4 columns cannot hold all of them.
+    with pytest.raises(MissingCollectorParam, match="image_width is out of range"):
+        collector.build_capture_row(data, _png(2**31, 1))
@@ -0,0 +1,151 @@
+import pytest
+from flask import Flask
+from prometheus_client import REGISTRY
+
+from src import cache, metrics
+from src.db import DatabaseConnection
+from src.game.game import Game
+
+
+class _FakeCursor:
+    def __init__(self, error=None):
+        self._error = error
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def execute(self, query, params, prepare=None):
+        if self._error:
+            raise self._error
+        return self
+
+    def fetchall(self):
+        return [{"game_id": 1, "game_name": "g"}]
+
+
+class _FakeConnection:
+    def __init__(self, error=None):
+        self._error = error
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def cursor(self, *args, **kwargs):
+        return _FakeCursor(self._error)
+
+
+class _FakePool:
+    def __init__(self, error=None):
+        self._error = error
+
+    def connection(self):
+        return _FakeConnection(self._error)
+
+    def pop_stats(self):
+        return {
+            "pool_size": 4,
+            "pool_available": 3,
+            "pool_max": 25,
+            "requests_waiting": 2,
+            "requests_num": 7,
+        }
+
+
+def _sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+@pytest.fixture()
+def use_pool(monkeypatch):
+    def use(pool):
+        monkeypatch.setattr(DatabaseConnection, "_pool", pool)
+
+    return use
+
+
+@pytest.fixture()
+def client(monkeypatch):
+    monkeypatch.setattr(cache, "lookup_cache", cache.NullCache())
+    app = Flask(__name__)
+    app.config["TESTING"] = True
+    app.register_blueprint(Game, url_prefix="/api/v1")
+    metrics.init_metrics(app)
+    return app.test_client()
+
+
+def test_route_latency_is_split_into_phases(use_pool, client):
+    use_pool(_FakePool())
+    labels = {"transport": "http", "handler": "game.get_game"}
+    before = {
+        phase: _sample(
+            "gamelens_request_phase_duration_seconds_count", phase=phase, **labels
+        )
+        for phase in (metrics.PHASE_DB, metrics.PHASE_SERIALIZATION)
+    }
+    requests_before = _sample(
+        "gamelens_request_duration_seconds_count", status="200", **labels
+    )
+
+    response = client.get("/api/v1/collect/game?game_id=1")
+
+    assert response.status_code == 200
+    assert (
+        _sample("gamelens_request_duration_seconds_count", status="200", **labels)
+        == requests_before + 1
+    )
+    for phase, count in before.items():
+        assert (
+            _sample(
+                "gamelens_request_phase_duration_seconds_count", phase=phase, **labels
+            )
+            == count + 1
+        )
+
+
+def test_error_responses_are_counted_by_type(use_pool, client):
+    use_pool(_FakePool(error=RuntimeError("boom")))
+    labels = {"transport": "http", "handler": "game.get_game", "type": "RuntimeError"}
+    before = _sample("gamelens_errors_total", **labels)
+
+    response = client.get("/api/v1/collect/game?game_id=1")
+
+    assert response.status_code == 400
+    assert _sample("gamelens_errors_total", **labels) == before + 1
+
+
+def test_metrics_endpoint_exports_pool_stats(monkeypatch, client):
+    monkeypatch.setitem(metrics._pools, "test", _FakePool())
+
+    response = client.get("/metrics")
+
+    assert response.status_code == 200
+    assert response.mimetype == "text/plain"
+    body = response.get_data(as_text=True)
+    assert 'gamelens_db_pool_size{pool="test"} 4.0' in body
+    assert 'gamelens_db_pool_requests_waiting{pool="test"} 2.0' in body
+    assert 'gamelens_db_pool_requests_total{pool="test"} 7.0' in body
+
+
+def test_instrumented_event_records_ack_errors():
+    @metrics.instrument_event("test_event")
+    def handler(json):
+        return {"status": "error", "type": "MissingCollectorParam"}
+
+    labels = {"transport": "socketio", "handler": "test_event"}
+    errors_before = _sample(
+        "gamelens_errors_total", type="MissingCollectorParam", **labels
+    )
+
+    handler({})
+
+    assert (
+        _sample("gamelens_errors_total", type="MissingCollectorParam", **labels)
+        == errors_before + 1
+    )
+    assert _sample("gamelens_request_duration_seconds_count", status="error", **labels)
@@ -0,0 +1,9 @@
+from benchmarks.micro import benchmark_cases
+
+
+def test_every_benchmark_case_succeeds():
+    # Keeps the fakes in step with the routes, so a case never ends up timing
+    # an error response.
+    with benchmark_cases() as cases:
+        for case in cases:
+            assert case.check(case.run()), case.name
@@ -0,0 +1,189 @@
+import os
+import uuid
+from datetime import datetime
+from pathlib import Path
+
+import psycopg
+import pytest
+
+from src.maintenance import partitions
+
+MIGRATION = (
+    Path(__file__).resolve().parents[1]
+    / "db"
+    / "migrations"
+    / "001_partition_raw_capture.sql"
+)
+
+LEGACY_RAW_CAPTURE = """CREATE TABLE raw_capture (
+    capture_id varchar PRIMARY KEY,
+    game_id varchar NOT NULL,
+    session_id varchar NOT NULL,
+    run_id varchar,
+    captured_at timestamp NOT NULL,
+    received_at timestamp NOT NULL,
+    screenshot_ref varchar,
+    image_width integer,
+    image_height integer
+);
+CREATE INDEX raw_capture_game_id_idx ON raw_capture (game_id);
+"""
+
+INSERT_CAPTURE = """INSERT INTO raw_capture
+    (capture_id, game_id, session_id, captured_at, received_at)
+    VALUES (%s, 'g1', 's1', %s, %s)
+"""
+
+
+def test_parse_bounds():
+    assert partitions.parse_bounds(
+        "FOR VALUES FROM ('2025-01-01 00:00:00') TO ('2025-02-01 00:00:00')"
+    ) == (datetime(2025, 1, 1), datetime(2025, 2, 1))
+    assert partitions.parse_bounds(
+        "FOR VALUES FROM (MINVALUE) TO ('2025-02-01 00:00:00')"
+    ) == (None, datetime(2025, 2, 1))
+    assert partitions.parse_bounds("DEFAULT") is None
+
+
+def test_intervals_and_names():
+    assert partitions.next_interval(datetime(2025, 12, 1), "month") == datetime(
+        2026, 1, 1
+    )
+    assert partitions.next_interval(datetime(2025, 1, 31), "day") == datetime(
+        2025, 2, 1
+    )
+    start = partitions.interval_start(datetime(2025, 3, 14, 15, 9), "month")
+    assert partitions.partition_name(start, "month") == "raw_capture_p202503"
+    start = partitions.interval_start(datetime(2025, 3, 14, 15, 9), "day")
+    assert partitions.partition_name(start, "day") == "raw_capture_p20250314"
+    with pytest.raises(ValueError):
+        partitions.interval_start(datetime(2025, 3, 14), "week")
+
+
+@pytest.fixture()
+def scratch_conn():
+    if not os.environ.get("PGSQL_CONN"):
+        pytest.skip("PGSQL_CONN is not set")
+
+    schema = f"partitions_test_{uuid.uuid4().hex[:8]}"
+    with psycopg.connect(os.environ["PGSQL_CONN"], autocommit=True) as conn:
+        conn.execute(f"CREATE SCHEMA {schema}")
+        conn.execute(f"SET search_path TO {schema}")
+        try:
+            yield conn
+        finally:
+            conn.execute(f"DROP SCHEMA {schema} CASCADE")
+
+
+def _partition_of(conn, capture_id):
+    return conn.execute(
+        "SELECT tableoid::regclass::text FROM raw_capture WHERE capture_id = %s",
+        (capture_id,),
+    ).fetchone()[0]
+
+
+def test_migration_and_maintenance(scratch_conn):
+    conn = scratch_conn
+    conn.execute(LEGACY_RAW_CAPTURE)
+    old = datetime(2020, 1, 15)
+    conn.execute(INSERT_CAPTURE, ("old", old, old))
+
+    conn.execute(MIGRATION.read_text())
+    # Running it again is a no-op.
+    conn.execute(MIGRATION.read_text())
+
+    assert _partition_of(conn, "old") == "raw_capture_legacy"
+
+    # A capture from a clock far ahead lands in the default partition, and is
+    # moved out once its month's partition is created.
+    now = datetime.now()
+    future = datetime(now.year + 1, now.month, 1)
+    conn.execute(INSERT_CAPTURE, ("skewed", future, now))
+    assert _partition_of(conn, "skewed") == "raw_capture_default"
+
+    created = partitions.ensure_partitions(conn, ahead=12, interval="month")
+    assert partitions.partition_name(future, "month") in created
+    assert _partition_of(conn, "skewed") == partitions.partition_name(future, "month")
+    assert partitions.ensure_partitions(conn, ahead=12, interval="month") == []
+
+    # The legacy partition reaches up to next month, so nothing expires yet.
+    assert partitions.expire_partitions(conn, retention_days=365, now=now) == []
+
+    later = datetime(now.year + 1, now.month, 1)
+    expired = partitions.expire_partitions(
+        conn, retention_days=1, detach=True, now=later
+    )
+    assert "raw_capture_legacy" in expired
+    assert (
+        conn.execute(
+            "SELECT count(*) FROM raw_capture WHERE capture_id = 'old'"
+        ).fetchone()[0]
+        == 0
+    )
+    assert (
+        conn.execute(
+            "SELECT count(*) FROM raw_capture_legacy WHERE capture_id = 'old'"
+        ).fetchone()[0]
+        == 1
+    )
+
+    much_later = datetime(now.year + 3, 1, 1)
+    expired = partitions.expire_partitions(conn, retention_days=1, now=much_later)
+    assert partitions.partition_name(future, "month") in expired
+    assert list(partitions.list_partitions(conn)) == []
+
+
+PARTITIONED_RAW_CAPTURE = """CREATE TABLE raw_capture (
+    capture_id varchar NOT NULL,
+    game_id varchar NOT NULL,
+    session_id varchar NOT NULL,
+    capture_index integer,
+    captured_at timestamp NOT NULL,
+    received_at timestamp NOT NULL
+) PARTITION BY RANGE (captured_at);
+CREATE TABLE raw_capture_p202001 PARTITION OF raw_capture
+    FOR VALUES FROM ('2020-01-01') TO ('2020-02-01');
+CREATE TABLE raw_capture_default PARTITION OF raw_capture DEFAULT;
+"""
+
+CAPTURE_LEDGER = (
+    Path(__file__).resolve().parents[1] / "db" / "migrations" / "004_capture_key.sql"
+)
+
+
+@pytest.mark.parametrize("detach", [False, True])
+def test_expiry_forgets_ledger_keys(scratch_conn, detach):
+    conn = scratch_conn
+    conn.execute(PARTITIONED_RAW_CAPTURE)
+    old, now = datetime(2020, 1, 15), datetime.now()
+    for capture_id, session_id, index, captured_at in (
+        ("s1-0", "s1", 0, old),
+        ("s1-1", "s1", 1, now),
+        ("s2-0", "s2", 0, old),
+    ):
+        conn.execute(
+            "INSERT INTO raw_capture VALUES (%s, 'g1', %s, %s, %s, %s)",
+            (capture_id, session_id, index, captured_at, captured_at),
+        )
+    conn.execute(CAPTURE_LEDGER.read_text())
+    # An archived capture keeps its key, it is still in its segment.
+    conn.execute(
+        "INSERT INTO capture_key (session_id, capture_index, capture_id)"
+        " VALUES ('s1', 2, 'archived')"
+    )
+    conn.execute(
+        "UPDATE capture_session SET received = 3, last_index = 2"
+        " WHERE session_id = 's1'"
+    )
+
+    expired = partitions.expire_partitions(
+        conn, retention_days=1, detach=detach, now=now
+    )
+
+    assert expired == ["raw_capture_p202001"]
+    keys = conn.execute(
+        "SELECT session_id, capture_index, capture_id FROM capture_key ORDER BY 1, 2"
+    ).fetchall()
+    assert keys == [("s1", 1, "s1-1"), ("s1", 2, "archived")]
+    sessions = conn.execute("SELECT * FROM capture_session").fetchall()
+    assert sessions == [("s1", 2, 1, 2)]
@@ -0,0 +1,107 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from src.pipeline import worker
+from src.pipeline.worker import ClassifierClient, WorkerPool
+
+
+class _StubClassifier(BaseHTTPRequestHandler):
+    # Status codes to return, in order, before falling back to 200.
+    statuses = []
+    requests = []
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        type(self).requests.append(body)
+        status = type(self).statuses.pop(0) if type(self).statuses else 200
+        payload = json.dumps({"model_version": "m1"}).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture()
+def classifier_url():
+    _StubClassifier.statuses = []
+    _StubClassifier.requests = []
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _StubClassifier)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_port}"
+    server.shutdown()
+
+
+@pytest.fixture()
+def queue(monkeypatch):
+    state = {"pending": [], "completed": [], "failed": []}
+
+    def fake_claim_jobs(worker_id, limit, backoff):
+        claimed, state["pending"] = state["pending"][:limit], state["pending"][limit:]
+        return claimed
+
+    monkeypatch.setattr(worker, "claim_jobs", fake_claim_jobs)
+    monkeypatch.setattr(
+        worker,
+        "complete_job",
+        lambda job_id, worker_id, **versions: state["completed"].append(
+            (job_id, versions["model_version"])
+        ),
+    )
+    monkeypatch.setattr(
+        worker,
+        "fail_job",
+        lambda job_id, worker_id, max_attempts: state["failed"].append(job_id),
+    )
+    return state
+
+
+def _job(job_id):
+    return {
+        "job_id": job_id,
+        "capture_id": f"capture-{job_id}",
+        "game_id": "1",
+        "run_id": None,
+        "attempts": 1,
+    }
+
+
+def test_worker_dispatches_claimed_jobs(classifier_url, queue):
+    queue["pending"] = [_job("j1"), _job("j2"), _job("j3")]
+    pool = WorkerPool(ClassifierClient(classifier_url), batch_size=2)
+
+    assert pool.run_once() == 2
+    assert pool.run_once() == 1
+
+    assert sorted(queue["completed"]) == [("j1", "m1"), ("j2", "m1"), ("j3", "m1")]
+    assert queue["failed"] == []
+    assert _StubClassifier.requests[0]["image_path"].endswith("/image")
+
+
+def test_worker_marks_job_failed_on_classifier_error(classifier_url, queue):
+    _StubClassifier.statuses = [500]
+    queue["pending"] = [_job("j1")]
+    pool = WorkerPool(ClassifierClient(classifier_url, retries=0))
+
+    pool.run_once()
+
+    assert queue["failed"] == ["j1"]
+    assert queue["completed"] == []
+
+
+def test_client_retries_transient_errors(classifier_url, queue):
+    _StubClassifier.statuses = [503, 503]
+    queue["pending"] = [_job("j1")]
+    pool = WorkerPool(ClassifierClient(classifier_url, retries=3, backoff=0))
+
+    pool.run_once()
+
+    assert queue["completed"] == [("j1", "m1")]
+    assert len(_StubClassifier.requests) == 3
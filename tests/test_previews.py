@@ -0,0 +1,35 @@
+import io
+
+import pytest
+
+from src.storage.blob import LocalBlobStore
+from src.storage.preview import preview_key
+
+Image = pytest.importorskip("PIL.Image")
+
+from src.pipeline import previews  # noqa: E402
+
+
+def _jpeg(width, height):
+    out = io.BytesIO()
+    Image.new("RGB", (width, height), (200, 40, 40)).save(out, "JPEG")
+    return out.getvalue()
+
+
+def test_previews_keep_the_aspect_ratio_and_never_upscale():
+    rendered = previews.render_previews(_jpeg(1920, 1080), sizes=(256, 4096))
+
+    sizes = {size: Image.open(io.BytesIO(data)).size for size, data in rendered.items()}
+    assert sizes == {256: (256, 144), 4096: (1920, 1080)}
+    assert all(data[8:12] == b"WEBP" for data in rendered.values())
+
+
+def test_previews_are_stored_next_to_the_original(monkeypatch, tmp_path):
+    blobs = LocalBlobStore(str(tmp_path))
+    monkeypatch.setattr(previews, "blob_store", blobs)
+    ref = blobs.put(_jpeg(640, 480))
+
+    previews.store_previews(ref, sizes=(128,))
+
+    assert blobs.path(preview_key(ref, 128)).startswith(blobs.path(ref))
+    assert Image.open(blobs.open(preview_key(ref, 128))).size == (128, 96)
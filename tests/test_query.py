@@ -0,0 +1,175 @@
+from datetime import datetime
+
+import psycopg
+import pytest
+from flask import Flask, jsonify
+
+from src.db import DatabaseConnection
+from src.errors import MissingCollectorParam
+from src.query import query
+from src.util import decode_cursor
+
+CAPTURES = [
+    {
+        "capture_id": f"c{i}",
+        "game_id": "g1",
+        "session_id": "s1",
+        "run_id": "7",
+        "captured_at": datetime(2026, 3, 2, 10, 30, i),
+        "received_at": datetime(2026, 3, 2, 10, 30, i + 1),
+        "capture_index": i,
+        "mouse_x": i,
+        "mouse_y": i,
+        "screenshot_ref": f"ref{i}",
+        "image_width": 1920,
+        "image_height": 1080,
+    }
+    for i in range(3)
+]
+
+
+class _FakeCursor:
+    def __init__(self, conn):
+        self._conn = conn
+        self._rows = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def execute(self, query, params, prepare=None):
+        self._conn.executed.append((query, params))
+        if self._conn.error and "set_config" not in query:
+            raise self._conn.error
+        self._rows = self._conn.rows
+        return self
+
+    def fetchall(self):
+        return list(self._rows)
+
+
+class _FakeConnection:
+    def __init__(self, rows, error=None):
+        self.rows = rows
+        self.error = error
+        self.executed = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def cursor(self, name=None, **kwargs):
+        return _FakeCursor(self)
+
+    def commit(self):
+        pass
+
+
+@pytest.fixture()
+def client():
+    app = Flask(__name__)
+    app.config["TESTING"] = True
+    app.register_blueprint(query.Query, url_prefix="/api/v1")
+
+    @app.errorhandler(MissingCollectorParam)
+    def handle_collection_error(e):
+        return jsonify({"error": e.name, "message": e.description}), e.code
+
+    return app.test_client()
+
+
+def _use_rows(monkeypatch, rows, error=None):
+    conn = _FakeConnection(rows, error)
+    monkeypatch.setattr(
+        DatabaseConnection, "get_connection", classmethod(lambda cls: conn)
+    )
+    return conn
+
+
+def test_filters_are_bound_in_clause_order(monkeypatch, client):
+    conn = _use_rows(monkeypatch, CAPTURES[:2])
+
+    response = client.get(
+        "/api/v1/query/captures?to_index=9&session_id=s1&from=2026-03-02T12:30:00%2B02:00"
+        "&limit=2"
+    )
+
+    assert response.status_code == 200
+    timeout, (sql, params) = conn.executed
+    assert timeout[1] == ("5000ms",)
+    assert "session_id = %s AND captured_at >= %s AND capture_index <= %s" in sql
+    assert "image_data" not in sql
+    # Aware times are compared as naive UTC, like the stored columns.
+    assert params == ["s1", datetime(2026, 3, 2, 10, 30), 9, 2]
+    # A full page links to the next one.
+    assert decode_cursor(response.json["next"]) == (
+        CAPTURES[1]["captured_at"],
+        "c1",
+    )
+
+
+def test_cursor_continues_after_the_last_row(monkeypatch, client):
+    conn = _use_rows(monkeypatch, CAPTURES[:2])
+    after = client.get("/api/v1/query/captures?game_id=g1&limit=2").json["next"]
+    conn.rows = CAPTURES[2:]
+
+    response = client.get(f"/api/v1/query/captures?game_id=g1&after={after}")
+
+    _, (sql, params) = conn.executed[-2:]
+    assert "(captured_at, capture_id) > (%s, %s)" in sql
+    assert params == ["g1", CAPTURES[1]["captured_at"], "c1", 100]
+    assert response.json["next"] is None
+
+
+@pytest.mark.parametrize(
+    "path, builder",
+    [
+        ("captures/per-minute", "date_trunc('minute', captured_at)"),
+        ("ingest-lag", "percentile_cont(0.99)"),
+        ("runs", "run_id IS NOT NULL AND run_id = %s"),
+    ],
+)
+def test_aggregates_run_in_sql(monkeypatch, client, path, builder):
+    rows = [{"session_id": "s1", "captures": 3}]
+    conn = _use_rows(monkeypatch, rows)
+
+    response = client.get(f"/api/v1/query/{path}?run_id=7&limit=5")
+
+    assert response.status_code == 200
+    assert response.json == {"data": rows}
+    _, (sql, params) = conn.executed
+    assert builder in sql
+    assert params == ["7", 5]
+
+
+@pytest.mark.parametrize(
+    "args",
+    [
+        "",
+        "from=2026-03-02T10:30:00Z",
+        "session_id=s1&limit=0",
+        "session_id=s1&from_index=x",
+        "session_id=s1&to=yesterday",
+        "session_id=s1&after=!!",
+    ],
+)
+def test_invalid_queries_are_rejected(monkeypatch, client, args):
+    conn = _use_rows(monkeypatch, [])
+
+    response = client.get(f"/api/v1/query/captures?{args}")
+
+    assert response.status_code == 400
+    assert conn.executed == []
+
+
+def test_cancelled_query_is_a_client_error(monkeypatch, client):
+    _use_rows(monkeypatch, [], psycopg.errors.QueryCanceled("statement timeout"))
+
+    response = client.get("/api/v1/query/ingest-lag?game_id=g1")
+
+    assert response.status_code == 400
+    assert response.json["type"] == "QueryCanceled"
@@ -0,0 +1,220 @@
+import io
+import json
+from datetime import datetime, timezone
+
+import msgpack
+import pyarrow as pa
+import pytest
+from flask import Flask, jsonify
+
+from src.choice.choice import Choice
+from src.db import DatabaseConnection
+from src.errors import UnsupportedResponseFormatError
+from src.formats import ARROW_STREAM, MSGPACK
+from src.ingestion import collector
+from src.ingestion.collector import Collector
+from src.storage.blob import LocalBlobStore
+from src.storage.preview import preview_key
+
+PNG_BYTES = b"\x89PNG\r\n\x1a\n" + b"pixels" * 10
+
+CAPTURES = [
+    {
+        "captured_at": datetime(2025, 1, 1, 0, 0, i),
+        "game_id": "g1",
+        "run_id": None,
+        "image_data": PNG_BYTES + bytes([i]),
+        "screenshot_ref": None,
+        "image_height": 1080,
+        "image_width": 1920,
+    }
+    for i in range(3)
+]
+
+CHOICES = [
+    {"choice_id": 1, "run_id": 7, "choice_options": ["a", "b"], "selected": "a"},
+    {"choice_id": 2, "run_id": 7, "choice_options": {"x": 1}, "selected": "x"},
+]
+
+
+class _FakeCursor:
+    def __init__(self, conn, name):
+        self._conn = conn
+        self._name = name
+        self.itersize = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def execute(self, query, params, prepare=None):
+        self._conn.executed.append((self._name, query, params))
+
+    def fetchall(self):
+        # No archived segments.
+        return []
+
+    def __iter__(self):
+        return iter([dict(row) for row in self._conn.rows])
+
+
+class _FakeConnection:
+    def __init__(self, rows):
+        self.rows = rows
+        self.executed = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def cursor(self, name=None, **kwargs):
+        return _FakeCursor(self, name)
+
+    def commit(self):
+        pass
+
+
+@pytest.fixture()
+def client():
+    app = Flask(__name__)
+    app.config["TESTING"] = True
+    app.register_blueprint(Collector, url_prefix="/api/v1")
+    app.register_blueprint(Choice, url_prefix="/api/v1")
+
+    @app.errorhandler(UnsupportedResponseFormatError)
+    def handle_format_error(e):
+        return jsonify({"error": e.name, "message": e.description}), e.code
+
+    return app.test_client()
+
+
+def _use_rows(monkeypatch, rows):
+    conn = _FakeConnection(rows)
+    monkeypatch.setattr(
+        DatabaseConnection, "get_connection", classmethod(lambda cls: conn)
+    )
+    return conn
+
+
+def test_collect_as_msgpack_keeps_raw_image_bytes(monkeypatch, client):
+    conn = _use_rows(monkeypatch, CAPTURES)
+
+    response = client.get(
+        "/api/v1/collect?game_id=g1&session_id=s1", headers={"Accept": MSGPACK}
+    )
+
+    assert response.status_code == 200
+    assert response.mimetype == MSGPACK
+    rows = list(msgpack.Unpacker(io.BytesIO(response.data), timestamp=3))
+    assert [row["image_data"] for row in rows] == [c["image_data"] for c in CAPTURES]
+    assert rows[0]["captured_at"] == CAPTURES[0]["captured_at"].replace(
+        tzinfo=timezone.utc
+    )
+    # Read through a server-side cursor, not fetched in one go.
+    assert any(name is not None for name, _, _ in conn.executed)
+
+
+def test_collect_as_arrow_stream(monkeypatch, client):
+    _use_rows(monkeypatch, CAPTURES)
+
+    response = client.get(
+        "/api/v1/collect?game_id=g1&session_id=s1", headers={"Accept": ARROW_STREAM}
+    )
+
+    assert response.status_code == 200
+    table = pa.ipc.open_stream(response.data).read_all()
+    assert table.schema.field("image_data").type == pa.large_binary()
+    assert table.column("image_data").to_pylist() == [c["image_data"] for c in CAPTURES]
+    assert table.column("captured_at").to_pylist() == [
+        c["captured_at"] for c in CAPTURES
+    ]
+
+
+def test_previews_are_never_replaced_by_the_original(monkeypatch, client, tmp_path):
+    blobs = LocalBlobStore(str(tmp_path))
+    rendered, pending = blobs.put(b"rendered"), blobs.put(b"pending")
+    blobs.put_as(preview_key(rendered, 256), b"webp")
+    monkeypatch.setattr(collector, "blob_store", blobs)
+    monkeypatch.setattr(collector, "PREVIEW_SIZES", (256,))
+    # An inline image, and two blob-store images of which one has a preview.
+    rows = [
+        CAPTURES[0],
+        {**CAPTURES[1], "image_data": None, "screenshot_ref": rendered},
+        {**CAPTURES[2], "image_data": None, "screenshot_ref": pending},
+    ]
+    _use_rows(monkeypatch, rows)
+
+    response = client.get(
+        "/api/v1/collect?game_id=g1&session_id=s1&size=256",
+        headers={"Accept": ARROW_STREAM},
+    )
+
+    table = pa.ipc.open_stream(response.data).read_all()
+    assert table.column("image_data").to_pylist() == [None, b"webp", None]
+    assert table.column("preview").to_pylist() == [False, True, False]
+
+
+def test_empty_arrow_stream_still_carries_the_schema(monkeypatch, client):
+    _use_rows(monkeypatch, [])
+
+    response = client.get(
+        "/api/v1/collect?game_id=g1&session_id=s1", headers={"Accept": ARROW_STREAM}
+    )
+
+    table = pa.ipc.open_stream(response.data).read_all()
+    assert table.num_rows == 0
+    assert "image_data" in table.schema.names
+
+
+def test_choices_as_arrow_encode_options_as_json(monkeypatch, client):
+    _use_rows(monkeypatch, CHOICES)
+
+    response = client.get(
+        "/api/v1/collect/choice?run_id=7", headers={"Accept": ARROW_STREAM}
+    )
+
+    table = pa.ipc.open_stream(response.data).read_all()
+    options = table.column("choice_options").to_pylist()
+    assert [json.loads(value) for value in options] == [
+        c["choice_options"] for c in CHOICES
+    ]
+
+
+def test_choices_as_msgpack(monkeypatch, client):
+    _use_rows(monkeypatch, CHOICES)
+
+    response = client.get(
+        "/api/v1/collect/choice?run_id=7", headers={"Accept": "application/x-msgpack"}
+    )
+
+    assert response.mimetype == "application/x-msgpack"
+    assert list(msgpack.Unpacker(io.BytesIO(response.data))) == CHOICES
+
+
+def test_query_failure_is_a_json_error(monkeypatch, client):
+    def broken(cls):
+        raise RuntimeError("pool closed")
+
+    monkeypatch.setattr(DatabaseConnection, "get_connection", classmethod(broken))
+
+    response = client.get(
+        "/api/v1/collect/choice?run_id=7", headers={"Accept": MSGPACK}
+    )
+
+    assert response.status_code == 400
+    assert response.json["type"] == "RuntimeError"
+
+
+def test_unsupported_accept_is_rejected(monkeypatch, client):
+    conn = _use_rows(monkeypatch, CHOICES)
+
+    response = client.get(
+        "/api/v1/collect/choice?run_id=7", headers={"Accept": "text/csv"}
+    )
+
+    assert response.status_code == 406
+    assert conn.executed == []
@@ -0,0 +1,172 @@
+import hashlib
+import io
+from concurrent.futures import Future
+
+import pytest
+from flask import Flask, jsonify
+
+from src.errors import (
+    FileUploadError,
+    MissingCollectorParam,
+    UploadConflictError,
+    UploadNotFoundError,
+    UploadTooLargeError,
+)
+from src.ingestion import collector, upload
+from src.ingestion.writer import StoredCapture
+from src.storage.blob import LocalBlobStore
+from src.storage.upload import UploadStaging
+
+PNG_BYTES = b"\x89PNG\r\n\x1a\n" + bytes(range(256)) * 40
+
+METADATA = {
+    "session_id": "s1",
+    "game_id": "g1",
+    "captured_at": "2026-03-02T10:30:00Z",
+    "capture_index": 3,
+}
+
+
+class _ImmediateWriter:
+    def __init__(self):
+        self.rows = []
+
+    def submit(self, row):
+        self.rows.append(row)
+        future = Future()
+        future.set_result(StoredCapture(row[0], False, row[3], 0, ()))
+        return future
+
+
+@pytest.fixture()
+def staging(tmp_path):
+    return UploadStaging(str(tmp_path / "staging"))
+
+
+@pytest.fixture()
+def blobs(tmp_path):
+    return LocalBlobStore(str(tmp_path / "blobs"))
+
+
+@pytest.fixture()
+def writer(monkeypatch, staging, blobs):
+    writer = _ImmediateWriter()
+    monkeypatch.setattr(upload, "upload_staging", staging)
+    monkeypatch.setattr(upload, "blob_store", blobs)
+    monkeypatch.setattr(collector, "capture_writer", writer)
+    return writer
+
+
+@pytest.fixture()
+def client():
+    app = Flask(__name__)
+    app.config["TESTING"] = True
+    app.register_blueprint(upload.Uploads, url_prefix="/api/v1")
+
+    @app.errorhandler(MissingCollectorParam)
+    @app.errorhandler(FileUploadError)
+    @app.errorhandler(UploadNotFoundError)
+    @app.errorhandler(UploadConflictError)
+    @app.errorhandler(UploadTooLargeError)
+    def handle_error(e):
+        return jsonify({"error": e.name, "message": e.description}), e.code
+
+    return app.test_client()
+
+
+def test_append_resumes_from_the_stored_offset(staging):
+    upload_id = staging.create(len(PNG_BYTES))
+
+    with staging.open(upload_id) as pending:
+        assert pending.append(0, io.BytesIO(PNG_BYTES[:1000])) == 1000
+    with staging.open(upload_id) as pending:
+        with pytest.raises(UploadConflictError):
+            pending.append(0, io.BytesIO(PNG_BYTES))
+        pending.append(1000, io.BytesIO(PNG_BYTES[1000:]))
+        assert pending.seal() == hashlib.sha256(PNG_BYTES).hexdigest()
+
+
+def test_hash_catches_up_when_chunks_went_to_another_worker(staging):
+    upload_id = staging.create()
+    with staging.open(upload_id) as pending:
+        pending.append(0, io.BytesIO(PNG_BYTES[:500]))
+
+    # A second process sharing the directory has no hasher for this upload.
+    other = UploadStaging(staging.root)
+    with other.open(upload_id) as pending:
+        pending.append(500, io.BytesIO(PNG_BYTES[500:]))
+        assert pending.seal() == hashlib.sha256(PNG_BYTES).hexdigest()
+        assert pending.length == len(PNG_BYTES)
+
+
+def test_chunks_never_go_past_the_declared_length(staging):
+    upload_id = staging.create(10)
+
+    with staging.open(upload_id) as pending:
+        with pytest.raises(UploadTooLargeError):
+            pending.append(0, io.BytesIO(b"x" * 25))
+        assert pending.offset == 10
+
+
+def test_busy_upload_is_a_conflict(staging):
+    upload_id = staging.create()
+
+    with staging.open(upload_id):
+        with pytest.raises(UploadConflictError):
+            with staging.open(upload_id):
+                pass
+
+
+def test_expired_uploads_are_purged(staging):
+    upload_id = staging.create()
+
+    staging.purge_expired(now=10**12)
+
+    with pytest.raises(UploadNotFoundError):
+        with staging.open(upload_id):
+            pass
+
+
+def test_chunked_upload_round_trip(writer, blobs, client):
+    created = client.post("/api/v1/uploads", json={"length": len(PNG_BYTES)})
+    assert created.status_code == 201
+    location = created.headers["Location"]
+
+    offset = 0
+    for start in range(0, len(PNG_BYTES), 4096):
+        response = client.patch(
+            location,
+            data=PNG_BYTES[start : start + 4096],
+            headers={"Upload-Offset": str(offset)},
+        )
+        offset = int(response.headers["Upload-Offset"])
+    assert client.head(location).headers["Upload-Offset"] == str(len(PNG_BYTES))
+
+    finalized = client.post(f"{location}/finalize", json=METADATA)
+
+    assert finalized.status_code == 200
+    [row] = writer.rows
+    assert row[0] == finalized.json["capture_id"]
+    assert blobs.read(row[1]) == PNG_BYTES
+    # Retrying a finalize whose response was lost stores nothing new.
+    again = client.post(f"{location}/finalize", json=METADATA)
+    assert again.json["capture_id"] == row[0]
+    assert len(writer.rows) == 1
+
+
+def test_finalize_rejects_incomplete_and_non_image_uploads(writer, client):
+    location = client.post("/api/v1/uploads", json={"length": 100}).headers["Location"]
+    client.patch(location, data=b"\x89PNG", headers={"Upload-Offset": "0"})
+    assert client.post(f"{location}/finalize", json=METADATA).status_code == 409
+
+    location = client.post("/api/v1/uploads").headers["Location"]
+    client.patch(location, data=b"plain text", headers={"Upload-Offset": "0"})
+    assert client.post(f"{location}/finalize", json=METADATA).status_code == 415
+    assert writer.rows == []
+
+
+def test_patch_requires_an_offset(writer, client):
+    location = client.post("/api/v1/uploads").headers["Location"]
+
+    assert client.patch(location, data=b"x").status_code == 400
+    assert client.patch("/api/v1/uploads/../x", data=b"x").status_code == 404
@@ -0,0 +1,152 @@
+from datetime import datetime
+
+import pytest
+from flask import Flask, jsonify
+
+from src.db import DatabaseConnection
+from src.errors import MissingCollectorParam
+from src.maintenance import run_summary
+from src.repository import RunSummary
+from src.run import run
+
+SUMMARY = {
+    "run_id": "7",
+    "game_id": 1,
+    "duration": 42.5,
+    "choice_count": 2,
+    "capture_count": 3,
+    "first_captured_at": datetime(2026, 3, 2, 10, 30),
+    "last_captured_at": datetime(2026, 3, 2, 10, 31),
+    "updated_at": datetime(2026, 3, 2, 10, 32),
+}
+
+
+class _FakeCursor:
+    def __init__(self, conn):
+        self._conn = conn
+        self._rows = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def execute(self, query, params, prepare=None):
+        self._conn.executed.append((query, params))
+        self._rows = [RunSummary(**row) for row in self._conn.rows]
+        return self
+
+    def fetchone(self):
+        return self._rows[0] if self._rows else None
+
+    def fetchall(self):
+        return self._rows
+
+
+class _FakeConnection:
+    def __init__(self, rows):
+        self.rows = rows
+        self.executed = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def cursor(self, *args, **kwargs):
+        return _FakeCursor(self)
+
+
+class _FakeArchiveStore:
+    def __init__(self, segments):
+        self.segments = segments
+
+    def read_segment(self, segment_id):
+        yield from self.segments[segment_id]
+
+
+class _FakeSegmentConnection:
+    def __init__(self, segment_ids):
+        self.segment_ids = segment_ids
+
+    def execute(self, query):
+        assert "raw_capture_segment" in query
+        return self
+
+    def fetchall(self):
+        return [(segment_id,) for segment_id in self.segment_ids]
+
+
+@pytest.fixture()
+def client():
+    app = Flask(__name__)
+    app.config["TESTING"] = True
+    app.register_blueprint(run.Run, url_prefix="/api/v1")
+
+    @app.errorhandler(MissingCollectorParam)
+    def handle_collection_error(e):
+        return jsonify({"error": e.name, "message": e.description}), e.code
+
+    return app.test_client()
+
+
+def _use_rows(monkeypatch, rows):
+    conn = _FakeConnection(rows)
+    monkeypatch.setattr(
+        DatabaseConnection, "get_connection", classmethod(lambda cls: conn)
+    )
+    return conn
+
+
+def test_summary_is_a_point_lookup(monkeypatch, client):
+    conn = _use_rows(monkeypatch, [SUMMARY])
+
+    response = client.get("/api/v1/collect/run/summary?run_id=7")
+
+    assert response.status_code == 200
+    assert response.json["capture_count"] == 3
+    assert response.json["choice_count"] == 2
+    [(sql, params)] = conn.executed
+    assert "FROM run_summary" in sql and "WHERE run_id = %s" in sql
+    assert params == ("7",)
+
+
+def test_game_summaries_and_missing_runs(monkeypatch, client):
+    conn = _use_rows(monkeypatch, [SUMMARY])
+    response = client.get("/api/v1/collect/run/summary?game_id=1&limit=5")
+    assert response.json["data"][0]["run_id"] == "7"
+    assert conn.executed[0][1] == (1, 5)
+
+    _use_rows(monkeypatch, [])
+    assert client.get("/api/v1/collect/run/summary?run_id=8").status_code == 404
+    assert client.get("/api/v1/collect/run/summary").status_code == 400
+    assert client.get("/api/v1/collect/run/summary?game_id=x").status_code == 400
+
+
+def test_rebuild_counts_archived_captures_per_run():
+    first, last = datetime(2026, 1, 1), datetime(2026, 1, 2)
+    store = _FakeArchiveStore(
+        {
+            "a": [
+                {"run_id": "7", "captured_at": last},
+                {"run_id": None, "captured_at": first},
+            ],
+            "b": [
+                {"run_id": "7", "captured_at": first},
+                {"run_id": "run-x", "captured_at": first},
+            ],
+        }
+    )
+
+    archived = run_summary.archived_run_captures(
+        _FakeSegmentConnection(["a", "b"]), store
+    )
+
+    assert archived == {"7": (2, first, last), "run-x": (1, first, first)}
+    params = run_summary._rebuild_params(("7", "8", "run-x"), archived)
+    # Only ids that can be a run.id are matched against run and choice.
+    assert params["numeric_ids"] == [7, 8]
+    assert params["archived_run_ids"] == ["7", "run-x"]
+    assert params["archived_captures"] == [2, 1]
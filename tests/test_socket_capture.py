@@ -1,6 +1,13 @@
+import socket
+import threading
+import time
+
 import pytest
+import socketio as socketio_client
+import uvicorn
 from flask import Flask
 
+from src import asgi
 from src.ingestion import capture
 from src.socketio_ext import init_socketio, socketio
 
@@ -13,16 +20,77 @@ def app():
     return app
 
 
+class _AsgiTestClient:
+    """Gives a real client of the ASGI server the Flask test client's emit()."""
+
+    def __init__(self, url):
+        self._client = socketio_client.Client()
+        self._client.connect(url, transports=["websocket"])
+
+    def emit(self, event, data, callback=False):
+        if callback:
+            return self._client.call(event, data, timeout=5)
+        self._client.emit(event, data)
+
+    def disconnect(self):
+        self._client.disconnect()
+
+
+@pytest.fixture(scope="module")
+def asgi_url():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+
+    # No startup hook: the tests replace the collectors, so no database is used.
+    config = uvicorn.Config(
+        socketio_client.ASGIApp(asgi.sio),
+        host="127.0.0.1",
+        port=port,
+        log_level="error",
+    )
+    server = uvicorn.Server(config)
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.01)
+
+    yield f"http://127.0.0.1:{port}"
+
+    server.should_exit = True
+    thread.join(timeout=5)
+
+
+@pytest.fixture(params=["flask", "asgi"])
+def client(request, app):
+    if request.param == "flask":
+        yield socketio.test_client(app)
+        return
+
+    client = _AsgiTestClient(request.getfixturevalue("asgi_url"))
+    yield client
+    client.disconnect()
+
+
 @pytest.fixture()
-def client(app):
-    return socketio.test_client(app)
+def use_collector(monkeypatch):
+    """Replaces a collector function in both the Flask and the ASGI server."""
 
+    def use(name, fake):
+        async def async_fake(*args, **kwargs):
+            return fake(*args, **kwargs)
 
-def test_capture_event_success(monkeypatch, client):
+        monkeypatch.setattr(capture, name, fake)
+        monkeypatch.setattr(asgi, name, async_fake)
+
+    return use
+
+
+def test_capture_event_success(use_collector, client):
     def fake_collect_capture(data, image_bytes):
         return {"message": "ok"}, 200
 
-    monkeypatch.setattr(capture, "collect_capture", fake_collect_capture)
+    use_collector("collect_capture", fake_collect_capture)
 
     # 1. Capture the return value of emit by setting callback=True
     response = client.emit(
@@ -58,11 +126,11 @@ def test_capture_event_missing_image_data_emits_error(client):
     assert "image_data is required" in response["message"]
 
 
-def test_capture_event_collect_capture_error(monkeypatch, client):
+def test_capture_event_collect_capture_error(use_collector, client):
     def fake_collect_capture(data, image_bytes):
         return {"error": "Client Side Error", "message": "bad data"}, 400
 
-    monkeypatch.setattr(capture, "collect_capture", fake_collect_capture)
+    use_collector("collect_capture", fake_collect_capture)
 
     response = client.emit(
         "capture_event",
@@ -78,3 +146,63 @@ def test_capture_event_collect_capture_error(monkeypatch, client):
     assert response is not None
     assert response["status"] == "error"
     assert response["error"] == "Client Side Error"
+
+
+def test_capture_batch_reports_per_item_status(use_collector, client):
+    def fake_collect_capture_batch(items):
+        return [
+            ({"message": "ok", "capture_id": "c0"}, 200),
+            ({"error": "Bad Request", "message": "capture_index is required"}, 400),
+        ]
+
+    use_collector("collect_capture_batch", fake_collect_capture_batch)
+
+    response = client.emit(
+        "capture_batch",
+        {
+            "captures": [
+                {
+                    "session_id": "s1",
+                    "game_id": "g1",
+                    "captured_at": "2025-01-01T00:00:00Z",
+                    "capture_index": 0,
+                    "image_data": b"fake-bytes",
+                },
+                {
+                    "session_id": "s1",
+                    "game_id": "g1",
+                    "captured_at": "2025-01-01T00:00:01Z",
+                    "image_data": b"fake-bytes",
+                },
+            ]
+        },
+        callback=True,
+    )
+
+    assert response["status"] == "partial"
+    assert response["stored"] == 1
+    assert response["failed"] == 1
+    assert response["results"][0] == {"index": 0, "status": "ok", "capture_id": "c0"}
+    assert response["results"][1]["status"] == "error"
+    assert response["results"][1]["code"] == 400
+    assert "capture_index is required" in response["results"][1]["message"]
+
+
+def test_capture_batch_rejects_empty_batch(client):
+    response = client.emit("capture_batch", {"captures": []}, callback=True)
+
+    assert response["status"] == 400
+    assert "captures must be a non-empty list" in response["message"]
+
+
+def test_join_session_acks_room(client):
+    response = client.emit("join_session", {"session_id": "s1"}, callback=True)
+
+    assert response == {"status": "ok", "room": "session:s1"}
+
+
+def test_join_session_requires_session_id(client):
+    response = client.emit("join_session", {}, callback=True)
+
+    assert response["status"] == 400
+    assert "session_id is required" in response["message"]
@@ -0,0 +1,190 @@
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+
+import pytest
+import socketio
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+
+# One eventlet worker, like gunicorn's eventlet worker, on the shared message
+# queue. Captures are faked so no database is needed.
+WORKER_SCRIPT = """
+import eventlet
+
+eventlet.monkey_patch()
+
+import sys
+
+from flask import Flask
+
+from src.ingestion import capture
+from src.socketio_ext import init_socketio, socketio
+
+capture.collect_capture = lambda data, image_bytes: (
+    {"message": "ok", "capture_id": f"capture-{data['capture_index']}"},
+    200,
+)
+
+app = Flask(__name__)
+init_socketio(app)
+socketio.run(app, host="127.0.0.1", port=int(sys.argv[1]))
+"""
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _wait_for_port(port, timeout=15):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.2).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise TimeoutError(f"nothing listening on port {port}")
+
+
+@pytest.fixture(scope="module")
+def redis_url():
+    # Point SOCKETIO_TEST_REDIS_URL at an existing server to reuse it.
+    if os.environ.get("SOCKETIO_TEST_REDIS_URL"):
+        yield os.environ["SOCKETIO_TEST_REDIS_URL"]
+        return
+
+    if not shutil.which("redis-server"):
+        pytest.skip("redis-server is not installed")
+
+    port = _free_port()
+    process = subprocess.Popen(
+        ["redis-server", "--port", str(port), "--save", "", "--appendonly", "no"],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    _wait_for_port(port)
+    yield f"redis://127.0.0.1:{port}/0"
+    process.terminate()
+    process.wait(timeout=10)
+
+
+@pytest.fixture(scope="module")
+def worker_urls(redis_url):
+    env = {
+        **os.environ,
+        "SOCKETIO_MESSAGE_QUEUE": redis_url,
+        "SOCKETIO_CHANNEL": f"gamelens-test-{os.getpid()}",
+    }
+    ports = [_free_port(), _free_port()]
+    processes = [
+        subprocess.Popen(
+            [sys.executable, "-c", WORKER_SCRIPT, str(port)],
+            cwd=PROJECT_ROOT,
+            env=env,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        for port in ports
+    ]
+    for port in ports:
+        _wait_for_port(port)
+
+    yield [f"http://127.0.0.1:{port}" for port in ports]
+
+    for process in processes:
+        process.terminate()
+        process.wait(timeout=10)
+
+
+class _Listener:
+    def __init__(self, url, event):
+        self.received = []
+        self._event = threading.Event()
+        self.client = socketio.Client()
+        self.client.on(event, self._on_event)
+        self.client.connect(url, transports=["websocket"])
+
+    def _on_event(self, data):
+        self.received.append(data)
+        self._event.set()
+
+    def wait(self, timeout=5):
+        return self._event.wait(timeout)
+
+
+def test_broadcast_reaches_clients_on_every_worker(worker_urls):
+    listeners = [_Listener(url, "response") for url in worker_urls]
+    try:
+        listeners[0].client.call("hello_world", {"msg": "ping"}, timeout=5)
+
+        for listener in listeners:
+            assert listener.wait(), "broadcast did not reach every worker"
+            assert listener.received[0]["message"] == "got message: ping"
+    finally:
+        for listener in listeners:
+            listener.client.disconnect()
+
+
+def test_session_room_receives_captures_from_other_worker(worker_urls):
+    watcher = _Listener(worker_urls[0], "capture_stored")
+    bystander = _Listener(worker_urls[0], "capture_stored")
+    sender = socketio.Client()
+    sender.connect(worker_urls[1], transports=["websocket"])
+    try:
+        ack = watcher.client.call("join_session", {"session_id": "s1"}, timeout=5)
+        assert ack == {"status": "ok", "room": "session:s1"}
+
+        ack = sender.call(
+            "capture_event",
+            {
+                "session_id": "s1",
+                "game_id": "g1",
+                "captured_at": "2025-01-01T00:00:00Z",
+                "capture_index": 3,
+                "image_data": b"fake-bytes",
+            },
+            timeout=5,
+        )
+        assert ack["status"] == "ok"
+
+        assert watcher.wait()
+        assert watcher.received == [{"session_id": "s1", "capture_ids": ["capture-3"]}]
+        assert not bystander.wait(timeout=0.5)
+    finally:
+        for client in (watcher.client, bystander.client, sender):
+            client.disconnect()
+
+
+def test_several_workers_accept_only_websocket():
+    # Polling requests would be spread across workers without sticky sessions.
+    script = (
+        "from flask import Flask\n"
+        "from src.socketio_ext import init_socketio, socketio\n"
+        "app = Flask(__name__)\n"
+        "init_socketio(app)\n"
+        "response = app.test_client().get('/socket.io/?EIO=4&transport=polling')\n"
+        "print(socketio.server.eio.transports, response.status_code)\n"
+    )
+    outputs = []
+    for workers in ("1", "4"):
+        env = {**os.environ, "GUNICORN_WORKERS": workers}
+        env.pop("SOCKETIO_TRANSPORTS", None)
+        result = subprocess.run(
+            [sys.executable, "-c", script],
+            cwd=PROJECT_ROOT,
+            env=env,
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        outputs.append(result.stdout.splitlines()[-1])
+
+    assert outputs == ["['polling', 'websocket'] 200", "['websocket'] 400"]